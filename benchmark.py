@@ -0,0 +1,406 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+from fake_server import BlackHolePort, FakeMinecraftServer
+from targets import int_to_ip, ip_to_int
+
+# 服务器农场中的服务器类型：
+#   responding - 正常响应的 Server List Ping 服务器
+#   blackhole  - 丢弃连接请求的端口（connect 超时）
+#   rst        - 没有监听的地址（立即 RST，拒绝连接）
+#   silent     - 接受连接但从不响应（状态查询超时）
+#   slowloris  - 每隔一段时间才发送一个字节
+#   malformed  - 状态响应不是有效的 JSON
+FARM_KINDS = ("responding", "blackhole", "rst", "silent", "slowloris", "malformed")
+DEFAULT_FARM = "responding=500,blackhole=100,rst=1000,silent=50,slowloris=50,malformed=100"
+SCENARIOS = ("range", "multiple", "save_results", "process_results")
+# 与基准结果比较时显示的指标：(场景指标名, 数值越大越好)
+HEADLINE_METRICS = (("probes_per_second", True), ("records_per_second", True), ("latency_p50_ms", False),
+                    ("latency_p99_ms", False), ("peak_rss_kb", False), ("cpu_ms_per_hit", False))
+
+Layout = List[Tuple[str, str]]
+
+
+def parse_farm(spec: str) -> Dict[str, int]:
+    """解析农场配置，例如 responding=500,rst=1000"""
+    farm = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        kind, _, count = item.partition("=")
+        kind = kind.strip()
+        if kind not in FARM_KINDS:
+            raise argparse.ArgumentTypeError(f"未知的服务器类型: {kind}（可选: {', '.join(FARM_KINDS)}）")
+        try:
+            farm[kind] = int(count)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"服务器数量无效: {item}")
+    return farm
+
+
+def farm_layout(farm: Dict[str, int], base_ip: str = "127.1.0.1", seed: int = 0) -> Layout:
+    """给每个服务器分配一个回环地址，类型按固定种子打乱，返回 [(IP, 类型), ...]"""
+    kinds = [kind for kind, count in farm.items() for _ in range(count)]
+    random.Random(seed).shuffle(kinds)
+    base = ip_to_int(base_ip)
+    return [(int_to_ip(base + i), kind) for i, kind in enumerate(kinds)]
+
+
+def raise_file_limit():
+    """每个服务器和每个并发探测都占用一个文件描述符"""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+async def _serve_farm(layout: Layout, port: int, slowloris_delay: float, ready, stop):
+    servers = []
+    for ip, kind in layout:
+        if kind == "rst":
+            continue
+        if kind == "blackhole":
+            server = BlackHolePort(ip, port)
+        else:
+            server = FakeMinecraftServer(ip, port, mode="modern" if kind == "responding" else kind,
+                                         delay=slowloris_delay)
+        await server.start()
+        servers.append(server)
+    ready.set()
+    try:
+        while not stop.is_set():
+            await asyncio.sleep(0.1)
+    finally:
+        for server in servers:
+            await server.stop()
+
+
+def _farm_main(layout: Layout, port: int, slowloris_delay: float, ready, stop):
+    raise_file_limit()
+    asyncio.run(_serve_farm(layout, port, slowloris_delay, ready, stop))
+
+
+class ServerFarm:
+    """在独立进程中运行的假服务器农场，每个服务器监听一个 127.x 回环地址的同一端口
+
+    农场和扫描器分别在不同进程中，扫描器的 CPU 和内存统计不包含服务器端的开销。
+    （Linux 上整个 127.0.0.0/8 都路由到回环接口，不需要额外配置。）
+    """
+
+    def __init__(self, layout: Layout, port: int = 25565, slowloris_delay: float = 0.2):
+        self.layout = layout
+        self.port = port
+        self.slowloris_delay = slowloris_delay
+        self._context = multiprocessing.get_context("spawn")
+        self._ready = self._context.Event()
+        self._stop = self._context.Event()
+        self._process = None
+
+    def start(self, timeout: float = 60):
+        self._process = self._context.Process(
+            target=_farm_main, args=(self.layout, self.port, self.slowloris_delay, self._ready, self._stop),
+            daemon=True)
+        self._process.start()
+        if not self._ready.wait(timeout):
+            self.stop()
+            raise RuntimeError("服务器农场启动失败")
+
+    def stop(self):
+        self._stop.set()
+        if self._process:
+            self._process.join(10)
+            if self._process.is_alive():
+                self._process.terminate()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def synthetic_records(count: int, seed: int = 0):
+    """生成类似真实扫描结果的记录（save_results / process_results 场景使用）"""
+    rng = random.Random(seed)
+    countries = [{"code": code, "name": name, "name_zh": name_zh} for code, name, name_zh in (
+        ("US", "United States", "美国"), ("DE", "Germany", "德国"), ("CN", "China", "中国"),
+        ("FR", "France", "法国"), ("BR", "Brazil", "巴西"), ("JP", "Japan", "日本"))]
+    versions = ["1.20.4", "Paper 1.20.4", "1.8.8", "Spigot 1.12.2", "Velocity 3.3.0", "1.19.4"]
+    motds = ["A Minecraft Server", "§aSkyBlock §7| §bJoin now!", "§6Survival §fserver"] + \
+        [f"§{i % 10}Server number {i}" for i in range(500)]
+    start = datetime(2024, 1, 1)
+    for i in range(count):
+        record = {
+            "host": int_to_ip(rng.randrange(0x01000000, 0xDF000000)),
+            "port": 25565,
+            "online": True,
+            "edition": "java",
+            "version": rng.choice(versions),
+            "protocol": 765,
+            "players_online": rng.randrange(100),
+            "players_max": rng.choice((20, 100, 500)),
+            "description": rng.choice(motds),
+            "latency": rng.random() * 300,
+            "timestamp": (start + timedelta(seconds=i)).isoformat(),
+            "country": rng.choice(countries),
+        }
+        if rng.random() < 0.3:
+            record["player_list"] = [f"player{rng.randrange(10000)}" for _ in range(rng.randrange(1, 6))]
+        yield record
+
+
+def _configure_scanner(options: Dict):
+    from mc_scanner import MinecraftServerScanner
+
+    scanner = MinecraftServerScanner()
+    scanner.excludes = []  # 农场使用回环地址
+    scanner.configure_stages(concurrency=options["concurrency"], connect_timeout=options["connect_timeout"],
+                             status_concurrency=options["concurrency"], status_timeout=options["timeout"])
+    # 记录每次探测（scan_server 调用）的耗时
+    latencies = []
+    scan_server = scanner.scan_server
+
+    async def timed_scan_server(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await scan_server(*args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    scanner.scan_server = timed_scan_server
+    return scanner, latencies
+
+
+def scenario_range(layout: Layout, options: Dict) -> Dict:
+    """IP范围模式：按地址扫描整个农场（包含端口预检）"""
+    scanner, latencies = _configure_scanner(options)
+    asyncio.run(scanner.scan_ip_range(layout[0][0], layout[-1][0], (options["port"], options["port"])))
+    return _scan_metrics(scanner, latencies, layout)
+
+
+def scenario_multiple(layout: Layout, options: Dict) -> Dict:
+    """多服务器模式：给定 (IP, 端口) 列表（不需要 DNS）"""
+    scanner, latencies = _configure_scanner(options)
+    asyncio.run(scanner.scan_multiple_servers([(ip, options["port"]) for ip, _ in layout]))
+    return _scan_metrics(scanner, latencies, layout)
+
+
+def _scan_metrics(scanner, latencies: List[float], layout: Layout) -> Dict:
+    elapsed = time.time() - scanner.start_time
+    return {
+        "targets": len(layout),
+        "probes": scanner.scan_count,
+        "hits": scanner.found_count,
+        "expected_hits": sum(1 for _, kind in layout if kind == "responding"),
+        "elapsed_seconds": round(elapsed, 3),
+        "probes_per_second": round(scanner.scan_count / elapsed, 1) if elapsed > 0 else None,
+        "latency_p50_ms": _ms(percentile(latencies, 0.5)),
+        "latency_p90_ms": _ms(percentile(latencies, 0.9)),
+        "latency_p99_ms": _ms(percentile(latencies, 0.99)),
+        "latency_max_ms": _ms(max(latencies, default=None)),
+        "counters": dict(scanner.telemetry.counters),
+    }
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return round(seconds * 1000, 3) if seconds is not None else None
+
+
+def scenario_save_results(layout: Layout, options: Dict) -> Dict:
+    """把 records 条结果保存为 JSON 文件"""
+    from mc_scanner import MinecraftServerScanner
+
+    scanner = MinecraftServerScanner()
+    for record in synthetic_records(options["records"], options["seed"]):
+        scanner.results.append(record)
+    with tempfile.TemporaryDirectory() as directory:
+        scanner.output_file = os.path.join(directory, "results.json")
+        start = time.perf_counter()
+        scanner.save_results()
+        elapsed = time.perf_counter() - start
+        size = os.path.getsize(scanner.output_file)
+    return {"records": options["records"], "elapsed_seconds": round(elapsed, 3),
+            "records_per_second": round(options["records"] / elapsed, 1), "file_bytes": size}
+
+
+def scenario_process_results(layout: Layout, options: Dict) -> Dict:
+    """Web 界面加载 records 条结果（JSON Lines）并生成分组和统计信息"""
+    import web
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "results.jsonl")
+        with open(path, "w", encoding="utf-8") as f:
+            for record in synthetic_records(options["records"], options["seed"]):
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        web.RESULT_FILES[:] = [path]
+        start = time.perf_counter()
+        servers_by_country, stats = web.process_results()
+        elapsed = time.perf_counter() - start
+    return {"records": stats["total_servers"], "countries": len(servers_by_country),
+            "elapsed_seconds": round(elapsed, 3), "records_per_second": round(stats["total_servers"] / elapsed, 1)}
+
+
+SCENARIO_FUNCTIONS: Dict[str, Callable[[Layout, Dict], Dict]] = {
+    "range": scenario_range,
+    "multiple": scenario_multiple,
+    "save_results": scenario_save_results,
+    "process_results": scenario_process_results,
+}
+
+
+def _scenario_main(name: str, layout: Layout, options: Dict, channel):
+    """在新进程中运行一个场景，峰值内存和 CPU 时间只属于这个场景"""
+    sys.stdout = open(os.devnull, "w")
+    raise_file_limit()
+    try:
+        before = resource.getrusage(resource.RUSAGE_SELF)
+        metrics = SCENARIO_FUNCTIONS[name](layout, options)
+        after = resource.getrusage(resource.RUSAGE_SELF)
+        cpu = (after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime)
+        metrics["cpu_seconds"] = round(cpu, 3)
+        if metrics.get("hits"):
+            metrics["cpu_ms_per_hit"] = round(cpu * 1000 / metrics["hits"], 3)
+        metrics["peak_rss_kb"] = after.ru_maxrss
+        channel.send(("ok", metrics))
+    except BaseException as e:
+        channel.send(("error", f"{type(e).__name__}: {e}"))
+
+
+def run_scenario(name: str, layout: Layout, options: Dict) -> Dict:
+    context = multiprocessing.get_context("spawn")
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=_scenario_main, args=(name, layout, options, sender))
+    process.start()
+    sender.close()
+    try:
+        status, payload = receiver.recv()
+    except EOFError:
+        status, payload = "error", f"进程异常退出（退出码 {process.exitcode}）"
+    process.join()
+    if status != "ok":
+        raise RuntimeError(f"场景 {name} 失败: {payload}")
+    return payload
+
+
+def median_run(runs: List[Dict]) -> Dict:
+    """多次运行中耗时居中的一次"""
+    return sorted(runs, key=lambda run: run["elapsed_seconds"])[len(runs) // 2]
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: Dict, baseline: Dict):
+    """打印与基准结果相比的变化"""
+    print(f"\n与基准结果比较（{baseline.get('meta', {}).get('revision')} -> {results['meta']['revision']}）:")
+    for name, metrics in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        for metric, higher_is_better in HEADLINE_METRICS:
+            old, new = previous.get(metric), metrics.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old * 100
+            better = change >= 0 if higher_is_better else change <= 0
+            print(f"  {name:16} {metric:20} {old:>12,.3f} -> {new:>12,.3f}  {change:+7.1f}% "
+                  f"{'' if abs(change) < 5 else ('↑' if better else '↓ 退步')}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='扫描器基准测试：在本地假服务器农场上运行各扫描模式')
+    parser.add_argument('--farm', type=parse_farm, default=parse_farm(DEFAULT_FARM),
+                        help=f'各类服务器的数量（默认: {DEFAULT_FARM}）')
+    parser.add_argument('--base-ip', default='127.1.0.1', help='农场的起始回环地址')
+    parser.add_argument('--port', type=int, default=25565, help='农场服务器的端口')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help=f'要运行的场景，逗号分隔（可选: {", ".join(SCENARIOS)}）')
+    parser.add_argument('--concurrency', type=int, default=500, help='扫描并发数')
+    parser.add_argument('--connect-timeout', type=float, default=0.5, help='端口预检超时（秒）')
+    parser.add_argument('--timeout', type=float, default=1.0, help='状态查询超时（秒）')
+    parser.add_argument('--slowloris-delay', type=float, default=0.2, help='slowloris 服务器每个字节的间隔（秒）')
+    parser.add_argument('--records', type=int, default=100000,
+                        help='save_results / process_results 场景的结果数量')
+    parser.add_argument('--repeat', type=int, default=1, help='每个场景运行次数，报告耗时居中的一次')
+    parser.add_argument('--seed', type=int, default=0, help='农场布局和合成结果的随机种子')
+    parser.add_argument('--output', default='benchmark_results.json', help='结果 JSON 文件')
+    parser.add_argument('--baseline', help='与之前的结果 JSON 比较')
+    args = parser.parse_args()
+
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"未知的场景: {', '.join(sorted(unknown))}")
+
+    raise_file_limit()
+    layout = farm_layout(args.farm, args.base_ip, args.seed)
+    options = {"port": args.port, "concurrency": args.concurrency, "connect_timeout": args.connect_timeout,
+               "timeout": args.timeout, "records": args.records, "seed": args.seed}
+    results = {
+        "meta": {
+            "revision": git_revision(),
+            "timestamp": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "farm": args.farm,
+            "options": dict(options, slowloris_delay=args.slowloris_delay, repeat=args.repeat),
+        },
+        "scenarios": {},
+    }
+
+    needs_farm = any(name in ("range", "multiple") for name in scenarios)
+    farm = ServerFarm(layout, args.port, args.slowloris_delay) if needs_farm and layout else None
+    if farm:
+        print(f"启动服务器农场: {len(layout):,} 个地址 {layout[0][0]} - {layout[-1][0]}")
+        farm.start()
+    try:
+        for name in scenarios:
+            if name in ("range", "multiple") and not farm:
+                continue
+            runs = [run_scenario(name, layout, options) for _ in range(args.repeat)]
+            metrics = median_run(runs)
+            if args.repeat > 1:
+                metrics["runs_elapsed_seconds"] = [run["elapsed_seconds"] for run in runs]
+            results["scenarios"][name] = metrics
+            summary = ", ".join(f"{metric}={metrics[metric]}" for metric, _ in HEADLINE_METRICS
+                                if metrics.get(metric) is not None)
+            print(f"{name}: {summary}")
+    finally:
+        if farm:
+            farm.stop()
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"结果已写入 {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            compare(results, json.load(f))
+
+if __name__ == "__main__":
+    main()
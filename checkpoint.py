@@ -0,0 +1,45 @@
+import hashlib
+import json
+import os
+from datetime import datetime
+from typing import Dict, Optional
+
+
+class Checkpoint:
+    """扫描检查点：记录扫描位置、计数器和配置哈希，用于中断后继续扫描"""
+
+    def __init__(self, path: str = "scan_checkpoint.json", interval: float = 5.0):
+        self.path = path
+        self.interval = interval
+
+    @staticmethod
+    def config_hash(config: Dict) -> str:
+        """扫描配置的哈希，配置不同的检查点不能用于继续扫描"""
+        data = json.dumps(config, sort_keys=True, ensure_ascii=False).encode("utf-8")
+        return hashlib.sha256(data).hexdigest()[:16]
+
+    def load(self) -> Optional[Dict]:
+        """读取检查点，不存在或损坏时返回 None"""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        return state if isinstance(state, dict) else None
+
+    def save(self, config: Dict, cursor: Optional[int], counters: Dict, completed: bool = False):
+        """原子地写入检查点：先写临时文件再替换，避免中途崩溃留下损坏的文件"""
+        state = {
+            "config": config,
+            "config_hash": self.config_hash(config),
+            "cursor": cursor,
+            "completed": completed,
+            "saved_at": datetime.now().isoformat(),
+        }
+        state.update(counters)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
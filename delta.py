@@ -0,0 +1,156 @@
+import itertools
+import json
+import os
+import re
+import zlib
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from targets import Interval, TargetSpace, ip_to_int, merge_intervals, subtract_intervals
+
+ServerKey = Tuple[str, int]
+PREFIX_COUNT = 1 << 24  # IPv4 /24 网段数量
+_POPCOUNT = bytes(bin(i).count("1") for i in range(256))  # 每个字节值中 1 的个数（int.bit_count 需要 3.10）
+
+# 这些字段变化时认为服务器发生了变化（在线人数每次都不同，不算）
+CHANGE_FIELDS = ("version", "protocol", "players_max", "description")
+
+
+class ResponsiveMap:
+    """每个 /24 网段一位的位图，记录该网段是否出现过响应的服务器（共 2MB）"""
+
+    def __init__(self, bits: Optional[bytes] = None):
+        self.bits = bytearray(bits) if bits else bytearray(PREFIX_COUNT // 8)
+
+    def mark(self, ip: int):
+        prefix = ip >> 8
+        self.bits[prefix >> 3] |= 1 << (prefix & 7)
+
+    def __contains__(self, prefix: int) -> bool:
+        return bool(self.bits[prefix >> 3] & (1 << (prefix & 7)))
+
+    def __len__(self) -> int:
+        return sum(self.bits.translate(_POPCOUNT))
+
+    def prefixes(self) -> Iterable[int]:
+        """按顺序返回所有标记过的 /24 网段"""
+        for match in re.finditer(rb"[^\x00]", self.bits):
+            byte, index = match.group()[0], match.start()
+            for bit in range(8):
+                if byte & (1 << bit):
+                    yield index * 8 + bit
+
+    def expanded(self, radius: int) -> "ResponsiveMap":
+        """标记过的网段加上前后各 radius 个相邻网段"""
+        result = ResponsiveMap()
+        for prefix in self.prefixes():
+            for neighbor in range(max(0, prefix - radius), min(PREFIX_COUNT, prefix + radius + 1)):
+                result.bits[neighbor >> 3] |= 1 << (neighbor & 7)
+        return result
+
+    def intervals(self) -> List[Interval]:
+        """标记过的网段对应的整数IP区间（已合并）"""
+        return merge_intervals((prefix << 8, (prefix << 8) | 0xFF) for prefix in self.prefixes())
+
+    @classmethod
+    def load(cls, path: str) -> "ResponsiveMap":
+        """读取位图文件，文件不存在或损坏时返回空位图"""
+        try:
+            with open(path, "rb") as f:
+                bits = zlib.decompress(f.read())
+            if len(bits) == PREFIX_COUNT // 8:
+                return cls(bits)
+        except (OSError, zlib.error):
+            pass
+        return cls()
+
+    def save(self, path: str):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(zlib.compress(bytes(self.bits)))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+
+def intersect_intervals(a: List[Interval], b: List[Interval]) -> List[Interval]:
+    return subtract_intervals(a, subtract_intervals(a, b))
+
+
+def incremental_targets(space: TargetSpace, port: int, known: Iterable[int], covered: ResponsiveMap,
+                        cold_rate: float, seed: int) -> Tuple[Iterable[Tuple[int, int]], int]:
+    """增量扫描的目标顺序，返回 (目标生成器, 目标数量)
+
+    1. 上次发现的服务器；
+    2. 热点网段（出现过服务器的 /24 及其相邻网段）中的其余地址；
+    3. 其余冷空间按伪随机顺序只扫描 cold_rate 比例（换一个种子就会抽到另一部分）。
+    """
+    known = sorted(ip for ip in set(known) if ip in space)
+    known_set = set(known)
+    hot_space = TargetSpace(intersect_intervals(covered.intervals(), space.intervals), [])
+    cold_count = int(len(space) * cold_rate)
+
+    def generate():
+        for ip in known:
+            yield ip, port
+        for ip in hot_space:
+            if ip not in known_set:
+                yield ip, port
+        for ip in itertools.islice(space.permuted(seed), cold_count):
+            if (ip >> 8) not in covered:
+                yield ip, port
+
+    total = len(known) + len(hot_space) - sum(1 for ip in known if ip in hot_space) + cold_count
+    return generate(), total
+
+
+class DeltaTracker:
+    """把本次扫描结果和上次的结果比较，记录新增、消失和变化的服务器"""
+
+    def __init__(self, previous: Dict[ServerKey, Dict], path: str,
+                 responsive: Optional[ResponsiveMap] = None):
+        self.previous = previous
+        self.path = path
+        self.responsive = responsive
+        self.seen = set()  # 本次响应的服务器
+        self.attempted = set()  # 本次复查过的已知服务器
+        self.counts = Counter()
+        self._file = open(path, "a", encoding="utf-8")
+        self._started = datetime.now().isoformat()
+
+    def _emit(self, change: str, host: str, port: int, **fields):
+        self.counts[change] += 1
+        event = {"change": change, "host": host, "port": port, "timestamp": datetime.now().isoformat(),
+                 "run_started": self._started}
+        event.update(fields)
+        self._file.write(json.dumps(event, ensure_ascii=False) + "\n")
+
+    def observe(self, record: Dict) -> bool:
+        """记录一条本次发现的服务器，返回它相对上次是否是新的或者有变化"""
+        key = (record["host"], record["port"])
+        self.seen.add(key)
+        if self.responsive is not None:
+            try:
+                self.responsive.mark(ip_to_int(record["host"]))
+            except OSError:
+                pass
+        previous = self.previous.get(key)
+        if previous is None:
+            self._emit("new", *key, record=record)
+            return True
+        changed = {field: [previous.get(field), record.get(field)] for field in CHANGE_FIELDS
+                   if previous.get(field) != record.get(field)}
+        if changed:
+            self._emit("changed", *key, fields=changed, record=record)
+            return True
+        self.counts["unchanged"] += 1
+        return False
+
+    def finish(self) -> Set[ServerKey]:
+        """扫描结束：复查过但没有响应的已知服务器记为消失，返回这些服务器"""
+        gone = self.attempted - self.seen
+        for host, port in sorted(gone):
+            self._emit("gone", host, port, last_seen=self.previous[(host, port)].get("timestamp"))
+        self._file.close()
+        return gone
@@ -0,0 +1,308 @@
+import asyncio
+import json
+import socket
+import struct
+from typing import Dict, Optional
+
+from raknet import MAGIC, UNCONNECTED_PING, pack_pong
+from resolver import RCODE_NXDOMAIN, DNSError, pack_response, unpack_name
+from slp import pack_packet, pack_string, read_varint, unpack_varint
+
+# 默认返回的状态 JSON
+DEFAULT_STATUS = {
+    "version": {"name": "1.20.4", "protocol": 765},
+    "players": {
+        "online": 3,
+        "max": 20,
+        "sample": [{"name": "Steve", "id": "00000000-0000-0000-0000-000000000001"}],
+    },
+    "description": {"text": "A Minecraft Server", "color": "green", "extra": [{"text": "!", "bold": True}]},
+}
+
+# 假基岩版服务器默认返回的信息
+DEFAULT_BEDROCK_STATUS = {
+    "motd": "A Bedrock Server",
+    "sub_motd": "Bedrock level",
+    "protocol": 622,
+    "version": "1.20.40",
+    "online": 2,
+    "max": 10,
+    "gamemode": "Survival",
+}
+
+
+class FakeMinecraftServer:
+    """本地的假 Minecraft 服务器，用于测试和基准测试
+
+    mode 可选：
+      modern  - 1.7+ Server List Ping（握手 + 状态 + ping）
+      legacy  - 只支持 1.4 - 1.6 的旧版 ping（0xFE 0x01）
+      beta    - 只支持 1.4 之前的旧版 ping（0xFE）
+
+    以下模式模拟异常的服务器（基准测试用）：
+      silent    - 接受连接但从不响应
+      slowloris - 正常响应，但每隔 delay 秒才发送一个字节
+      malformed - 状态响应的数据包格式正确，但内容不是有效的 JSON
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, mode: str = "modern",
+                 status: Optional[Dict] = None, delay: float = 0.2):
+        self.host = host
+        self.port = port
+        self.mode = mode
+        self.status = status or DEFAULT_STATUS
+        self.delay = delay
+        self.connections = 0
+        self.server = None
+        self._writers = set()
+
+    async def start(self) -> int:
+        """启动服务器，返回实际监听的端口"""
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def stop(self):
+        if self.server:
+            self.server.close()
+            # 不响应的连接不会自己结束，先关掉
+            for writer in list(self._writers):
+                writer.close()
+            await self.server.wait_closed()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        self._writers.add(writer)
+        try:
+            if self.mode == "silent":
+                await reader.read()
+                return
+            first = await reader.readexactly(1)
+            if first == b"\xfe":
+                await self._handle_legacy(reader, writer)
+            elif self.mode in ("modern", "slowloris", "malformed"):
+                await self._handle_modern(first[0], reader, writer)
+            else:
+                # 旧版服务器不认识新协议的握手包，回复踢出包后断开
+                writer.write(self._kick("Protocol error"))
+            await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _send_status(self, writer: asyncio.StreamWriter, data: bytes):
+        if self.mode != "slowloris":
+            writer.write(data)
+            return
+        for i in range(len(data)):
+            writer.write(data[i:i + 1])
+            await writer.drain()
+            await asyncio.sleep(self.delay)
+
+    async def _read_packet(self, reader: asyncio.StreamReader, first: Optional[int] = None):
+        if first is None:
+            length = await read_varint(reader)
+        elif first & 0x80:
+            length = (first & 0x7F) | (await read_varint(reader)) << 7
+        else:
+            length = first
+        data = await reader.readexactly(length)
+        packet_id, offset = unpack_varint(data)
+        return packet_id, data[offset:]
+
+    async def _handle_modern(self, first: int, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        packet_id, _ = await self._read_packet(reader, first)  # 握手包
+        if packet_id != 0x00:
+            return
+        packet_id, _ = await self._read_packet(reader)  # 状态请求
+        if packet_id != 0x00:
+            return
+        if self.mode == "malformed":
+            body = '{"version": {"name": "1.20.4", "protocol": 765}, "players": {"online": '
+        else:
+            body = json.dumps(self.status)
+        await self._send_status(writer, pack_packet(0x00, pack_string(body)))
+        await writer.drain()
+        packet_id, payload = await self._read_packet(reader)  # 可选的 ping
+        if packet_id == 0x01:
+            writer.write(pack_packet(0x01, payload[:8]))
+
+    async def _handle_legacy(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        if self.mode not in ("legacy", "beta"):
+            return
+        # 把客户端发来的剩余数据读掉（旧版服务器不关心具体内容）
+        try:
+            await asyncio.wait_for(reader.read(1024), timeout=0.05)
+        except asyncio.TimeoutError:
+            pass
+        players = self.status["players"]
+        if self.mode == "legacy":
+            text = "\x00".join(["§1", str(self.status["version"]["protocol"]), self.status["version"]["name"],
+                                "A Minecraft Server", str(players["online"]), str(players["max"])])
+        else:
+            text = "§".join(["A Minecraft Server", str(players["online"]), str(players["max"])])
+        writer.write(self._kick(text))
+
+    @staticmethod
+    def _kick(text: str) -> bytes:
+        """旧版协议的踢出包：0xFF + 字符数 + UTF-16BE 文本"""
+        return b"\xff" + struct.pack(">H", len(text)) + text.encode("utf-16-be")
+
+
+class BlackHolePort:
+    """不接受连接的监听端口：积压队列占满后，新的 SYN 被丢弃，客户端只能等到超时"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.host = host
+        self.port = port
+        self.sock = None
+        self._filler = None
+
+    async def start(self) -> int:
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((self.host, self.port))
+        self.sock.listen(0)
+        self.port = self.sock.getsockname()[1]
+        # 自己先连上一个占满积压队列，之后的连接请求都会被丢弃
+        self._filler = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._filler.setblocking(False)
+        self._filler.connect_ex((self.host, self.port))
+        return self.port
+
+    async def stop(self):
+        if self.sock:
+            self._filler.close()
+            self.sock.close()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+
+class FakeBedrockServer(asyncio.DatagramProtocol):
+    """本地的假基岩版服务器：只响应 RakNet Unconnected Ping"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, status: Optional[Dict] = None,
+                 guid: int = 0x1234567890ABCDEF):
+        self.host = host
+        self.port = port
+        self.status = status or DEFAULT_BEDROCK_STATUS
+        self.guid = guid
+        self.pings = 0
+        self.transport = None
+
+    async def start(self) -> int:
+        """启动服务器，返回实际监听的端口"""
+        loop = asyncio.get_running_loop()
+        self.transport, _ = await loop.create_datagram_endpoint(lambda: self, local_addr=(self.host, self.port))
+        self.port = self.transport.get_extra_info("sockname")[1]
+        return self.port
+
+    async def stop(self):
+        if self.transport:
+            self.transport.close()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    def pong_text(self) -> str:
+        s = self.status
+        return ";".join(["MCPE", s["motd"], str(s["protocol"]), s["version"], str(s["online"]), str(s["max"]),
+                         str(self.guid), s["sub_motd"], s["gamemode"], "1", str(self.port), str(self.port + 1), ""])
+
+    def datagram_received(self, data: bytes, addr):
+        if len(data) < 33 or data[0] != UNCONNECTED_PING or data[9:25] != MAGIC:
+            return
+        self.pings += 1
+        token = struct.unpack_from(">q", data, 1)[0]
+        self.transport.sendto(pack_pong(token, self.guid, self.pong_text()), addr)
+
+
+class FakeDNSServer(asyncio.DatagramProtocol):
+    """本地的假DNS服务器，按 records 回答查询
+
+    records: {(域名, 类型): [(TTL, 值), ...]}，没有的域名返回 NXDOMAIN；
+    queries 记录收到的每个查询 (域名, 类型)，用于检查缓存和去重是否生效。
+    """
+
+    def __init__(self, records: Dict, host: str = "127.0.0.1", port: int = 0):
+        self.records = {(name.lower(), rtype): answers for (name, rtype), answers in records.items()}
+        self.host = host
+        self.port = port
+        self.queries = []
+        self.transport = None
+
+    async def start(self) -> int:
+        """启动服务器，返回实际监听的端口"""
+        loop = asyncio.get_running_loop()
+        self.transport, _ = await loop.create_datagram_endpoint(lambda: self, local_addr=(self.host, self.port))
+        self.port = self.transport.get_extra_info("sockname")[1]
+        return self.port
+
+    async def stop(self):
+        if self.transport:
+            self.transport.close()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    def datagram_received(self, data: bytes, addr):
+        try:
+            query_id = struct.unpack_from(">H", data)[0]
+            name, offset = unpack_name(data, 12)
+            rtype = struct.unpack_from(">H", data, offset)[0]
+        except (DNSError, struct.error):
+            return
+        self.queries.append((name, rtype))
+        answers = self.records.get((name, rtype))
+        if answers is None and not any(key[0] == name for key in self.records):
+            self.transport.sendto(pack_response(query_id, name, rtype, [], RCODE_NXDOMAIN), addr)
+            return
+        self.transport.sendto(pack_response(query_id, name, rtype,
+                                            [(name, rtype, ttl, value) for ttl, value in answers or ()]), addr)
+
+
+async def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='本地假 Minecraft 服务器')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=25565)
+    parser.add_argument('--mode', choices=['modern', 'legacy', 'beta', 'silent', 'slowloris', 'malformed', 'bedrock'],
+                        default='modern')
+    args = parser.parse_args()
+
+    if args.mode == 'bedrock':
+        server = FakeBedrockServer(args.host, args.port)
+        port = await server.start()
+        print(f"假基岩版服务器已启动: {args.host}:{port} (UDP)")
+        await asyncio.Event().wait()
+        return
+
+    server = FakeMinecraftServer(args.host, args.port, args.mode)
+    port = await server.start()
+    print(f"假服务器已启动: {args.host}:{port} ({args.mode})")
+    await server.server.serve_forever()
+
+if __name__ == "__main__":
+    asyncio.run(main())
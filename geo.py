@@ -0,0 +1,148 @@
+import argparse
+import functools
+import json
+import os
+import socket
+from typing import Dict, List, Optional
+
+import geoip2.database
+import geoip2.errors
+import maxminddb
+
+from result_sink import iter_results, rewrite_results
+from targets import Interval, ip_to_int, int_to_ip, merge_intervals
+
+UNKNOWN_COUNTRY = {"code": "UN", "name": "Unknown", "name_zh": "未知"}
+
+
+class GeoLookup:
+    """长期打开的 GeoIP 查询器：数据库以内存映射方式打开，按 /24 网段缓存查询结果"""
+
+    def __init__(self, db_path: str = "GeoLite2-Country.mmdb", cache_size: int = 65536):
+        self.reader = geoip2.database.Reader(db_path, mode=geoip2.database.MODE_MMAP)
+        self._lookup_prefix = functools.lru_cache(maxsize=cache_size)(self._lookup_prefix)
+
+    def _lookup_prefix(self, prefix: int) -> Dict:
+        return self._lookup(int_to_ip(prefix << 8))
+
+    def _lookup(self, ip: str) -> Dict:
+        try:
+            country = self.reader.country(ip).country
+        except (geoip2.errors.AddressNotFoundError, ValueError):
+            return UNKNOWN_COUNTRY
+        if not country.iso_code:
+            return UNKNOWN_COUNTRY
+        return {
+            "code": country.iso_code,
+            "name": country.name,
+            "name_zh": country.names.get("zh-CN", country.name),
+        }
+
+    def lookup(self, host: str) -> Dict:
+        """查询IP所属国家；域名和无法识别的地址返回未知"""
+        try:
+            return self._lookup_prefix(ip_to_int(host) >> 8)
+        except OSError:
+            pass
+        try:
+            socket.inet_pton(socket.AF_INET6, host)
+        except OSError:
+            return UNKNOWN_COUNTRY
+        return self._lookup(host)
+
+    def close(self):
+        self.reader.close()
+
+
+def country_ranges_cache_path(db_path: str) -> str:
+    """国家IP段缓存文件路径，与数据库文件放在一起"""
+    return os.path.splitext(db_path)[0] + ".country-ranges.json"
+
+
+def build_country_ranges(db_path: str) -> Dict:
+    """遍历一次 MaxMind 数据库，提取每个国家合并后的IPv4整数区间"""
+    countries = {}
+    with maxminddb.open_database(db_path) as reader:
+        build_epoch = reader.metadata().build_epoch
+        for network, record in reader:
+            if network.version != 4 or not isinstance(record, dict):
+                continue
+            country = record.get("country")
+            if not country or not country.get("iso_code"):
+                continue
+            entry = countries.get(country["iso_code"])
+            if entry is None:
+                names = country.get("names", {})
+                entry = countries[country["iso_code"]] = {
+                    "name": names.get("en", country["iso_code"]),
+                    "name_zh": names.get("zh-CN", names.get("en", country["iso_code"])),
+                    "ranges": [],
+                }
+            entry["ranges"].append((int(network.network_address), int(network.broadcast_address)))
+
+    for entry in countries.values():
+        entry["ranges"] = merge_intervals(entry["ranges"])
+    return {"build_epoch": build_epoch, "countries": countries}
+
+
+def load_country_ranges(db_path: str, cache_path: Optional[str] = None) -> Dict:
+    """读取国家IP段；缓存与数据库的构建时间一致时直接使用缓存，否则重新提取"""
+    cache_path = cache_path or country_ranges_cache_path(db_path)
+    with maxminddb.open_database(db_path) as reader:
+        build_epoch = reader.metadata().build_epoch
+
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+        if cached.get("build_epoch") == build_epoch:
+            return cached
+    except (FileNotFoundError, ValueError):
+        pass
+
+    data = build_country_ranges(db_path)
+    tmp_path = cache_path + ".tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        # 缓存写不进去只影响下次启动速度
+        pass
+    return data
+
+
+def country_intervals(data: Dict, country_code: str) -> List[Interval]:
+    """返回某个国家的IP区间列表"""
+    entry = data["countries"].get(country_code.upper())
+    return [tuple(r) for r in entry["ranges"]] if entry else []
+
+
+def backfill(path: str, geo: GeoLookup, overwrite: bool = False) -> int:
+    """为已有结果文件中的服务器补充国家信息，返回补充的条数"""
+    records = list(iter_results(path))
+    updated = 0
+    for record in records:
+        if overwrite or not record.get("country"):
+            record["country"] = geo.lookup(record["host"])
+            updated += 1
+    if updated:
+        rewrite_results(path, records)
+    return updated
+
+
+def main():
+    parser = argparse.ArgumentParser(description='GeoIP 工具')
+    parser.add_argument('files', nargs='+', help='要补充国家信息的结果文件（.json / .jsonl / .db）')
+    parser.add_argument('--db', default='GeoLite2-Country.mmdb', help='GeoIP数据库路径')
+    parser.add_argument('--overwrite', action='store_true', help='重新查询已有国家信息的结果')
+    args = parser.parse_args()
+
+    geo = GeoLookup(args.db)
+    try:
+        for path in args.files:
+            print(f"{path}: 补充了 {backfill(path, geo, args.overwrite)} 条结果的国家信息")
+    finally:
+        geo.close()
+
+if __name__ == "__main__":
+    main()
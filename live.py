@@ -0,0 +1,161 @@
+import json
+import os
+import queue
+import socket
+import stat
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+# 扫描器和 Web 界面默认使用的事件套接字（与默认结果文件一样放在当前目录）
+DEFAULT_EVENTS_SOCKET = "scan_events.sock"
+MAX_EVENT_SIZE = 1 << 17  # 单个事件（一个服务器的结果）的最大长度
+
+
+class EventPublisher:
+    """扫描器一侧：把发现和更新的服务器作为 Unix 数据报发给 Web 界面
+
+    发送是非阻塞的，没有 Web 界面在接收、接收方处理不过来或者结果过大时直接丢弃，
+    不影响扫描（结果仍然会写入结果文件，Web 界面读取文件时会补上）。
+    """
+
+    def __init__(self, path: str = DEFAULT_EVENTS_SOCKET):
+        self.path = path
+        self.sent = 0
+        self.dropped = 0
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sock.setblocking(False)
+
+    def publish(self, kind: str, server: Dict):
+        """kind 为 "hit"（完整结果）或 "update"（已有服务器变化的字段）"""
+        try:
+            data = json.dumps({"type": kind, "server": server}, ensure_ascii=False).encode("utf-8")
+            self._sock.sendto(data, self.path)
+            self.sent += 1
+        except (OSError, TypeError, ValueError):
+            self.dropped += 1
+
+    def close(self):
+        self._sock.close()
+
+
+class EventListener:
+    """Web 界面一侧：在后台线程中接收扫描器发布的事件，每隔 interval 秒把收到的一批交给 handler
+
+    没有收到事件时也会调用 handler（参数为空列表），可以顺便检查结果文件的变化；
+    path 为 None 时不接收事件，只定期调用 handler。
+    """
+
+    def __init__(self, path: Optional[str], handler: Callable[[List[Dict]], None], interval: float = 0.5):
+        self.path = path
+        self.handler = handler
+        self.interval = interval
+        self._sock = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        if self.path is None:
+            self._thread = threading.Thread(target=self._poll, name="scan-events", daemon=True)
+            self._thread.start()
+            return
+        try:
+            if stat.S_ISSOCK(os.stat(self.path).st_mode):
+                # 上次没有正常退出留下的套接字文件
+                os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sock.bind(self.path)
+        self._thread = threading.Thread(target=self._run, name="scan-events", daemon=True)
+        self._thread.start()
+
+    def _poll(self):
+        while not self._stop.wait(self.interval):
+            self._handle([])
+
+    def _handle(self, events: List[Dict]):
+        try:
+            self.handler(events)
+        except Exception:
+            # 单批事件处理失败不影响后续事件
+            pass
+
+    def _run(self):
+        while not self._stop.is_set():
+            events = []
+            deadline = time.monotonic() + self.interval
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._sock.settimeout(remaining)
+                try:
+                    data = self._sock.recv(MAX_EVENT_SIZE)
+                except socket.timeout:
+                    break
+                except OSError:
+                    continue
+                try:
+                    event = json.loads(data)
+                except ValueError:
+                    continue
+                if isinstance(event, dict) and isinstance(event.get("server"), dict):
+                    events.append(event)
+            self._handle(events)
+
+    def close(self):
+        self._stop.set()
+        if self._thread:
+            # 接收线程最多等待 interval 秒就会检查一次是否需要退出
+            self._thread.join()
+        if self._sock:
+            self._sock.close()
+        if self.path is not None:
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+
+class EventBroadcaster:
+    """Server-Sent Events 广播：每个连接的浏览器一个有界队列，处理不过来的连接丢弃消息
+
+    每条消息都带有完整的统计信息，丢掉几条消息的浏览器在下一条消息时就会恢复正确的统计。
+    """
+
+    def __init__(self, max_queue: int = 256):
+        self.max_queue = max_queue
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def format(event: str, data: Dict, event_id: Optional[str] = None) -> str:
+        lines = [f"event: {event}"]
+        if event_id is not None:
+            lines.append(f"id: {event_id}")
+        lines.append("data: " + json.dumps(data, ensure_ascii=False))
+        return "\n".join(lines) + "\n\n"
+
+    def subscribe(self) -> queue.Queue:
+        subscriber = queue.Queue(self.max_queue)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: queue.Queue):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, event: str, data: Dict, event_id: Optional[str] = None):
+        message = self.format(event, data, event_id)
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(message)
+            except queue.Full:
+                pass
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
@@ -1,32 +1,84 @@
 import asyncio
 import json
 from datetime import datetime
-from mcstatus import JavaServer
 import aiohttp
 from typing import Dict, Optional, List, Generator, Set, Tuple
 import ipaddress
 import socket
 import random
+import itertools
 import time
 import geoip2.database
 import os
+import struct
 from pathlib import Path
+from checkpoint import Checkpoint
+from delta import DeltaTracker, ResponsiveMap, incremental_targets
+from geo import GeoLookup, country_intervals, load_country_ranges
+from result_sink import ResultSink, ResultSinkError, load_results, open_sink
+from result_table import ResultTable
+from scan_engine import ScanEngine
+from probes import PROBES, PROTOCOL_ERRORS, Probe
+from live import EventPublisher
+from profiling import profiler
+from resolver import Resolver, parse_server_address
+from rate_control import AIMDController, TokenBucket
+from telemetry import Reporter, Telemetry
+from targets import (DEFAULT_EXCLUDES, DEFAULT_EXCLUDES_V6, BloomFilter, CyclicPermutation, ExcludeSet, TargetFile,
+                     TargetSpace, int_to_ip, ip_to_int, is_ip_literal)
 
 class MinecraftServerScanner:
     def __init__(self):
-        self.results = []
+        self.results = ResultTable()  # 未设置结果写入器时，结果按列保存在内存中
+        self.sink = None  # 结果写入器，设置后每条结果直接追加到文件，不再保存在内存中
+        self.events = None  # 事件发布器，设置后发现的服务器同时实时发给 Web 界面
+        self.output_file = "scan_results.json"
+        self.found_count = 0
+        self.telemetry = Telemetry()  # 超时、拒绝连接、协议错误等计数和各阶段延迟
+        self.reporting = False  # 定时进度任务运行期间，探测协程不再逐条打印状态
+        self.progress_interval = 0.5  # 进度行刷新间隔（秒）
+        self.stats_file = None  # 定期写入 JSON 统计信息的文件
+        self.metrics_port = None  # Prometheus /metrics 端口
         self.default_port_range = (25565, 25565)
         self.default_timeout = 2  # 超时时间（秒）
+        self.connect_timeout = 0.5  # 端口预检（TCP connect）超时时间（秒）
+        self.prefilter = True  # 是否先用TCP connect检查端口是否开放
+        self.measure_ping = False  # 是否额外发送ping包测量延迟（否则使用状态请求的往返时间）
         self.scan_count = 0
+        self.open_count = 0  # 通过端口预检的目标数
         self.start_time = None
         self.last_save_time = time.time()
         self.last_status = ""
-        self.semaphore = asyncio.Semaphore(1000)  # 限制并发连接数
+        self.total_targets = None  # 当前扫描的目标总数（用于进度显示）
+        self.concurrency = 1000  # 工作协程数量（即端口预检阶段的并发数）
+        self.status_concurrency = 1000  # 状态查询阶段的并发数
+        self.seed = None  # 伪随机扫描顺序的种子，多个分片必须使用相同的种子
+        self.shard = (0, 1)  # 分片 (编号, 总数)
+        self.checkpoint = None  # 扫描检查点，设置后全IPv4/国家扫描会定期记录扫描位置
+        self.resume = False  # 是否从检查点继续扫描
+        self.engine = None
+        self.fanout = 1  # 引擎中每个目标包含的探测次数（设置了 port_set 时按主机扫描为 len(port_set)）
+        self.pacer = None  # 令牌桶限速器，设置后限制每秒发起的探测数
+        self.controller = None  # AIMD 控制器，设置后根据超时率和往返时间自动调节并发数和超时
+        self.control_interval = 1.0  # 自动调节周期（秒）
+        self.semaphore = asyncio.Semaphore(self.status_concurrency)  # 限制状态查询的并发连接数
+        self.probes = {}  # 版本 -> 探测插件（按需创建）
+        self.nameservers = None  # 多服务器模式使用的DNS服务器（默认读取 /etc/resolv.conf）
+        self.dns_concurrency = 256  # 同时进行的DNS查询数
+        self.port_set = None  # 每个主机要探测的 (版本, 端口) 集合，设置后全IPv4/国家/随机/范围扫描按主机一次探测所有端口
+        self.incremental = False  # 增量扫描：先复查已知服务器和热点网段，其余空间只抽样
+        self.cold_rate = 0.05  # 增量扫描时冷空间的抽样比例
+        self.neighbor_radius = 1  # 热点网段包括有服务器的 /24 前后各多少个 /24
+        self.responsive_map_path = "scan_responsive.bin"  # 按 /24 记录曾经响应过的网段
+        self.delta_output = "scan_delta.jsonl"  # 增量扫描的变化记录（新增、消失、变化）
+        self.delta = None
         
         # IP数据库路径
         self.db_path = "GeoLite2-Country.mmdb"
+        self.geo = None  # GeoIP 查询器，打开后每条结果在记录时补充国家信息
+        self.country_ranges = None  # 从数据库提取的各国家IP段
         
-        # 国家代码映射
+        # 常用国家名称到代码的映射（也可以直接使用ISO国家代码）
         self.country_codes = {
             "china": "CN",
             "usa": "US",
@@ -39,15 +91,70 @@ class MinecraftServerScanner:
         }
 
         # 排除的私有IP范围
-        self.excluded_networks = [
-            ipaddress.ip_network("10.0.0.0/8"),
-            ipaddress.ip_network("172.16.0.0/12"),
-            ipaddress.ip_network("192.168.0.0/16"),
-            ipaddress.ip_network("127.0.0.0/8"),
-            ipaddress.ip_network("169.254.0.0/16"),  # 链路本地地址
-            ipaddress.ip_network("224.0.0.0/4"),     # 多播地址
-            ipaddress.ip_network("240.0.0.0/4"),     # 保留地址
-        ]
+        self.excludes = list(DEFAULT_EXCLUDES)
+        self.public_space = TargetSpace(excludes=self.excludes)
+        # IPv6 排除网段（只用于目标列表文件），与 IPv4 的一起预编译成区间
+        self.excludes_v6 = list(DEFAULT_EXCLUDES_V6)
+        self.exclude_set = ExcludeSet(self.excludes + self.excludes_v6)
+
+    def configure_stages(self, concurrency: int = None, connect_timeout: float = None,
+                         status_concurrency: int = None, status_timeout: float = None):
+        """设置端口预检和状态查询两个阶段各自的并发数与超时时间"""
+        if concurrency:
+            self.concurrency = concurrency
+        if connect_timeout:
+            self.connect_timeout = connect_timeout
+        if status_timeout:
+            self.default_timeout = status_timeout
+        if status_concurrency:
+            self.status_concurrency = status_concurrency
+            self.semaphore = asyncio.Semaphore(status_concurrency)
+
+    def configure_rate(self, rate: float = None, adaptive: bool = False,
+                       min_concurrency: int = None, max_concurrency: int = None):
+        """设置探测速率上限（每秒探测数）和是否自动调节并发数与超时时间"""
+        self.pacer = TokenBucket(rate) if rate else None
+        if adaptive:
+            self.controller = AIMDController(self.telemetry,
+                                             min_concurrency=min(min_concurrency or 50, self.concurrency),
+                                             max_concurrency=max(max_concurrency or self.concurrency * 8,
+                                                                 self.concurrency))
+        else:
+            self.controller = None
+
+    def set_output(self, path: str):
+        """设置结果输出文件；.jsonl / SQLite 文件逐条追加，.json 文件沿用整体保存"""
+        self.close_sink()
+        self.output_file = path
+        self.sink = open_sink(path)
+
+    def close_sink(self):
+        """写完剩余结果并关闭结果写入器"""
+        if self.sink:
+            self.sink.close()
+            self.sink = None
+
+    def set_events(self, path: Optional[str]):
+        """设置事件套接字（Web 界面的 --events-socket），None 表示不发布"""
+        self.close_events()
+        self.events = EventPublisher(path) if path else None
+
+    def close_events(self):
+        if self.events:
+            self.events.close()
+            self.events = None
+
+    def publish(self, kind: str, server: Dict):
+        """把发现（hit）或变化（update）的服务器发给 Web 界面"""
+        if self.events:
+            self.events.publish(kind, server)
+
+    def add_excludes(self, cidrs: List[str]):
+        """追加用户自定义的排除网段（例如从CIDR文件读取），可以同时包含IPv4和IPv6网段"""
+        for cidr in cidrs:
+            (self.excludes_v6 if ":" in cidr else self.excludes).append(cidr)
+        self.public_space = TargetSpace(excludes=self.excludes)
+        self.exclude_set = ExcludeSet(self.excludes + self.excludes_v6)
 
     def download_geoip_db(self):
         """下载GeoIP数据库（这里需要你自己获取数据库文件）"""
@@ -56,41 +163,107 @@ class MinecraftServerScanner:
             self.update_status("你可以从 https://dev.maxmind.com/geoip/geolite2-free-geolocation-data 获取")
             raise FileNotFoundError("缺少GeoIP数据库文件")
 
+    def open_geo(self) -> bool:
+        """打开 GeoIP 数据库用于结果的国家信息，数据库不存在时返回 False"""
+        if self.geo is None and os.path.exists(self.db_path):
+            self.geo = GeoLookup(self.db_path)
+        return self.geo is not None
+
     def is_ip_in_country(self, ip: str, country_code: str) -> bool:
         """检查IP是否属于指定国家"""
         try:
-            with geoip2.database.Reader(self.db_path) as reader:
-                response = reader.country(ip)
-                return response.country.iso_code == country_code.upper()
+            return self.open_geo() and self.geo.lookup(ip)["code"] == country_code.upper()
         except:
             return False
 
-    def get_country_ip_count(self, country_code: str) -> Tuple[int, List[str]]:
-        """获取指定国家的IP数量和IP范围"""
-        ip_ranges = []
-        total_ips = 0
-        
+    def get_country_data(self) -> Dict:
+        """读取各国家的IP段（按数据库构建时间缓存在磁盘上）"""
+        if self.country_ranges is None:
+            self.country_ranges = load_country_ranges(self.db_path)
+        return self.country_ranges
+
+    def resolve_country_code(self, country: str) -> Optional[str]:
+        """把国家名称或ISO代码转换为数据库中存在的ISO代码"""
+        code = self.country_codes.get(country.lower(), country).upper()
+        return code if code in self.get_country_data()["countries"] else None
+
+    def get_country_ip_count(self, country_code: str) -> Tuple[int, List[Tuple[int, int]]]:
+        """获取指定国家的IP数量和IP范围（整数闭区间，已排除私有IP范围）"""
         try:
-            with geoip2.database.Reader(self.db_path) as reader:
-                # 遍历所有可能的IP（按照/8网段）
-                for first_octet in range(1, 256):
-                    try:
-                        # 检查每个/8网段的第一个IP
-                        ip = f"{first_octet}.0.0.0"
-                        response = reader.country(ip)
-                        if response.country.iso_code == country_code:
-                            network = f"{first_octet}.0.0.0/8"
-                            # 排除私有IP范围
-                            if not any(ipaddress.ip_network(network).overlaps(excluded) for excluded in self.excluded_networks):
-                                ip_ranges.append(network)
-                                total_ips += 2**24  # 一个/8网段包含2^24个IP
-                    except:
-                        continue
+            intervals = country_intervals(self.get_country_data(), country_code)
         except Exception as e:
             print(f"获取国家IP信息时出错: {str(e)}")
             return 0, []
-            
-        return total_ips, ip_ranges
+        space = TargetSpace(intervals, self.excludes)
+        return len(space), space.intervals
+
+    def get_seed(self) -> int:
+        """获取扫描顺序种子，未指定时随机生成一个"""
+        if self.seed is None:
+            self.seed = random.getrandbits(32)
+        return self.seed
+
+    def permuted_targets(self, space: TargetSpace, port: int, start: int = 0):
+        """按当前种子和分片以伪随机顺序生成 (断点位置, 目标)"""
+        shard, shards = self.shard
+        permutation = CyclicPermutation(space.size, self.get_seed(), shard, shards)
+        for position, index in permutation.iter_from(start):
+            yield position, (space.nth(index), port)
+
+    def shard_targets(self, targets, total: int):
+        """从按固定顺序生成的目标中挑出属于当前分片的部分，返回 (目标, 目标数量)"""
+        shard, shards = self.shard
+        if shards == 1:
+            return targets, total
+        return itertools.islice(targets, shard, None, shards), len(range(shard, total, shards))
+
+    def load_checkpoint(self) -> Optional[Dict]:
+        """继续扫描时读取检查点；未指定种子时沿用检查点中的种子"""
+        if not (self.checkpoint and self.resume):
+            return None
+        state = self.checkpoint.load()
+        if state is None:
+            print(f"未找到检查点 {self.checkpoint.path}，将从头开始扫描")
+            return None
+        if self.seed is None:
+            self.seed = state["config"].get("seed")
+        return state
+
+    def resume_from(self, state: Optional[Dict], config: Dict) -> int:
+        """校验检查点与当前配置一致，恢复计数器并返回继续扫描的位置"""
+        if state is None:
+            return 0
+        if state.get("config_hash") != Checkpoint.config_hash(config):
+            raise ValueError(f"检查点 {self.checkpoint.path} 与当前扫描参数不一致，无法继续扫描")
+        self.scan_count = state.get("scan_count", 0)
+        self.open_count = state.get("open_count", 0)
+        self.found_count = state.get("found_count", 0)
+        self.start_time = time.time() - state.get("elapsed", 0)
+        if state.get("completed"):
+            print("检查点显示该扫描已经完成")
+        print(f"从检查点继续扫描: 位置 {state.get('cursor') or 0:,}，已扫描 {self.scan_count:,} 个IP")
+        return state.get("cursor") or 0
+
+    def save_checkpoint(self, config: Dict, completed: bool = False):
+        """记录当前扫描位置和计数器"""
+        if not (self.checkpoint and self.engine):
+            return
+        counters = {
+            "scan_count": self.scan_count,
+            "open_count": self.open_count,
+            "found_count": self.found_count,
+            "elapsed": time.time() - self.start_time,
+        }
+        try:
+            self.checkpoint.save(config, self.engine.cursor(), counters, completed)
+        except OSError as e:
+            self.update_status(f"保存检查点出错: {str(e)}")
+
+    async def _autocheckpoint(self, config: Dict):
+        """扫描过程中定期保存检查点"""
+        while True:
+            await asyncio.sleep(self.checkpoint.interval)
+            self.save_checkpoint(config)
 
     async def scan_country(self, country: str, port: int = 25565, batch_size: int = 1000):
         """扫描指定国家的服务器"""
@@ -100,9 +273,13 @@ class MinecraftServerScanner:
         # 确保GeoIP数据库存在
         self.download_geoip_db()
         
-        country_code = self.country_codes.get(country.lower())
+        country_code = self.resolve_country_code(country)
         if not country_code:
-            raise ValueError(f"不支持的国家: {country}. 支持的国家: {', '.join(self.country_codes.keys())}")
+            supported = sorted(self.get_country_data()["countries"])
+            raise ValueError(f"不支持的国家: {country}. 可以使用 {', '.join(self.country_codes.keys())} "
+                             f"或数据库中的ISO代码: {', '.join(supported)}")
+        
+        state = self.load_checkpoint()
         
         # 获取国家的IP数量和范围
         total_ips, ip_ranges = self.get_country_ip_count(country_code)
@@ -114,34 +291,26 @@ class MinecraftServerScanner:
         print(f"IP范围数量: {len(ip_ranges)}")
         print(f"总IP数量: {total_ips:,}")
         print(f"使用端口: {port}")
-        print(f"批处理大小: {batch_size}")
-        print(f"并发连接数: {self.semaphore._value}")
-        print(f"超时设置: {self.default_timeout}秒")
+        print(f"队列大小: {batch_size}")
+        print(f"并发连接数: 端口预检 {self.concurrency} / 状态查询 {self.status_concurrency}")
+        print(f"超时设置: 端口预检 {self.connect_timeout}秒 / 状态查询 {self.default_timeout}秒")
         print("按 Ctrl+C 可以随时中断扫描，已扫描的结果会被保存\n")
         
+        space = TargetSpace(ip_ranges, self.excludes)
+        print(f"扫描顺序种子: {self.get_seed()}，分片: {self.shard[0]}/{self.shard[1]}")
+        config = {"mode": "country", "country": country_code, "db_build_epoch": self.get_country_data()["build_epoch"],
+                  "port": port, "seed": self.get_seed(), "shard": list(self.shard), "excludes": self.excludes}
+        if self.port_set:
+            config["ports"] = self.port_set
+        start = self.resume_from(state, config)
+        
         try:
-            for ip_range in ip_ranges:
-                network = ipaddress.ip_network(ip_range)
-                tasks = []
-                
-                for ip in network.hosts():
-                    ip_str = str(ip)
-                    tasks.append(self.scan_server(ip_str, port))
-                    
-                    if len(tasks) >= batch_size:
-                        await asyncio.gather(*tasks)
-                        current_time = time.time()
-                        if current_time - self.last_save_time >= 300:  # 每5分钟保存一次
-                            self.save_results()
-                            self.last_save_time = current_time
-                        tasks = []
-                    
-                    self.print_progress(total_ips)
-                
-                # 处理剩余的任务
-                if tasks:
-                    await asyncio.gather(*tasks)
-                    
+            if self.incremental:
+                await self.run_incremental(space, port, batch_size, save_interval=300)
+            else:
+                await self.run_engine(self.permuted_targets(space, port, start), total=len(space) // self.shard[1],
+                                      queue_size=batch_size, save_interval=300, handler=self.scan_ip,
+                                      checkpoint_config=config)
         except KeyboardInterrupt:
             print("\n\n扫描被用户中断")
         finally:
@@ -149,10 +318,11 @@ class MinecraftServerScanner:
             duration = end_time - self.start_time
             print(f"\n\n扫描完成!")
             print(f"总扫描IP数: {self.scan_count:,}")
-            print(f"发现服务器数: {len(self.results):,}")
+            print(f"端口开放数: {self.open_count:,}")
+            print(f"发现服务器数: {self.found_count:,}")
             print(f"总耗时: {duration/3600:.2f} 小时")
-            print(f"平均速度: {self.scan_count/duration:.2f} IP/秒")
-            print(f"服务器密度: {len(self.results)/self.scan_count*100:.4f}%")
+            print(f"平均速度: {self.scan_count / duration if duration > 0 else 0:.2f} IP/秒")
+            print(f"服务器密度: {self.found_count / self.scan_count * 100 if self.scan_count else 0:.4f}%")
             
             # 最后保存一次结果
             self.save_results()
@@ -163,22 +333,20 @@ class MinecraftServerScanner:
         self.last_status = message.replace('\n', ' ').replace('\r', '').strip()
         if len(self.last_status) > 100:  # 限制状态消息长度
             self.last_status = self.last_status[:97] + "..."
-        self.print_progress()
+        if not self.reporting:
+            self.print_progress()
 
     def generate_all_ips(self) -> Generator[str, None, None]:
         """生成所有IPv4地址的生成器"""
-        current = 0
-        while current < 2**32:
-            ip = ipaddress.IPv4Address(current)
-            if not any(ip in network for network in self.excluded_networks):
-                yield str(ip)
-            current += 1
+        for ip in self.public_space:
+            yield int_to_ip(ip)
 
     def print_progress(self, total_ips: int = None):
         """打印扫描进度"""
         if not self.start_time:
             return
         
+        total_ips = total_ips or self.total_targets
         elapsed_time = time.time() - self.start_time
         speed = self.scan_count / elapsed_time if elapsed_time > 0 else 0
         
@@ -186,8 +354,12 @@ class MinecraftServerScanner:
         progress_parts = [
             f"已扫描: {self.scan_count:,} IP",
             f"速度: {speed:.2f} IP/秒",
-            f"发现服务器: {len(self.results)}"
+            f"端口开放: {self.open_count}",
+            f"发现服务器: {self.found_count}",
+            f"超时: {self.telemetry.counters['timeouts'] + self.telemetry.counters['connect_timeouts']}"
         ]
+        if self.controller and self.engine:
+            progress_parts.append(f"并发: {self.engine.limit * self.fanout} 超时阈值: {self.connect_timeout:g}/{self.default_timeout:g}秒")
         
         if total_ips:
             percentage = (self.scan_count / total_ips) * 100
@@ -205,47 +377,122 @@ class MinecraftServerScanner:
         print(f"\r{' ' * 150}\r{progress_info}", end="", flush=True)
         
     def is_public_ip(self, ip: str) -> bool:
-        """检查是否是公网IP"""
-        ip_obj = ipaddress.ip_address(ip)
-        return not any(ip_obj in network for network in self.excluded_networks)
+        """检查是否是公网IP（IPv4或IPv6）"""
+        if ":" in ip:
+            return ipaddress.IPv6Address(ip) not in self.exclude_set
+        return ip_to_int(ip) in self.public_space
+
+    def get_probe(self, edition: str = "java") -> Probe:
+        """获取某个版本的探测插件"""
+        probe = self.probes.get(edition)
+        if probe is None:
+            probe_class = PROBES[edition]
+            probe = self.probes[edition] = probe_class(self.measure_ping) if edition == "java" else probe_class()
+        return probe
+
+    def close_probes(self):
+        for probe in self.probes.values():
+            probe.close()
+        self.probes = {}
+
+    async def scan_ip(self, ip: int, port: int = 25565) -> Optional[Dict]:
+        """扫描整数形式的IP，只在发起连接前格式化为字符串
+
+        设置了 port_set 时忽略 port，同一主机的所有 (版本, 端口) 在一个任务里并发探测。
+        """
+        return await self.scan_host(int_to_ip(ip), None if self.port_set else port)
+
+    async def scan_host(self, host: str, port: Optional[int] = None) -> Optional[Dict]:
+        """扫描字符串形式的地址；port 为 None 时在一个任务里并发探测 port_set 中的所有 (版本, 端口)"""
+        if port is None:
+            await asyncio.gather(*(self.scan_server(host, p, edition) for edition, p in self.port_set))
+            return None
+        return await self.scan_server(host, port)
+
+    async def check_port_open(self, host: str, port: int) -> bool:
+        """第一阶段：用非阻塞 connect() 快速检查端口是否开放"""
+        family = socket.AF_INET6 if ":" in host else socket.AF_INET
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.setblocking(False)
+        # 关闭时直接发送RST，避免大量 TIME_WAIT 连接占用端口
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+        except OSError:
+            pass
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.get_running_loop().sock_connect(sock, (host, port)),
+                                   timeout=self.connect_timeout)
+            self.telemetry.observe("connect", time.perf_counter() - start)
+            return True
+        except asyncio.TimeoutError:
+            self.telemetry.incr("connect_timeouts")
+            return False
+        except ConnectionRefusedError:
+            self.telemetry.observe("connect", time.perf_counter() - start)
+            self.telemetry.incr("refused")
+            return False
+        except OSError:
+            self.telemetry.incr("connect_errors")
+            return False
+        finally:
+            sock.close()
+
+    async def scan_server(self, host: str, port: int = 25565, edition: str = "java",
+                          hostname: Optional[str] = None) -> Optional[Dict]:
+        """扫描单个Minecraft服务器并获取信息
+
+        host 已经是解析好的IP时，hostname 传入原始域名：握手包使用域名，结果中也会保留。
+        """
+        probe = self.get_probe(edition)
+        if self.pacer:
+            await self.pacer.acquire()
+        # 域名可能通过SRV记录指向其他端口，只对IP地址做端口预检（UDP 探测没有预检）
+        if self.prefilter and probe.transport == "tcp" and is_ip_literal(host):
+            with profiler.stage("connect"):
+                port_open = await self.check_port_open(host, port)
+            if not port_open:
+                self.scan_count += 1
+                if not self.reporting:
+                    self.update_status(f"⚠️ {host}:{port} 端口未开放")
+                return None
+            self.open_count += 1
 
-    async def scan_server(self, host: str, port: int = 25565) -> Optional[Dict]:
-        """扫描单个Minecraft服务器并获取信息"""
         async with self.semaphore:  # 使用信号量控制并发
+            start = time.perf_counter()
             try:
-                server = JavaServer(host, port)
-                status = await asyncio.wait_for(server.async_status(), timeout=self.default_timeout)
+                with profiler.stage("status"):
+                    status = await asyncio.wait_for(probe.query(host, port, hostname), timeout=self.default_timeout)
+                self.telemetry.observe("status", time.perf_counter() - start)
                 
-                server_info = {
-                    "host": host,
-                    "port": port,
-                    "online": True,
-                    "version": status.version.name,
-                    "protocol": status.version.protocol,
-                    "players_online": status.players.online,
-                    "players_max": status.players.max,
-                    "latency": status.latency,
-                    "description": status.description,
-                    "timestamp": datetime.now().isoformat()
-                }
-                
-                if hasattr(status.players, 'sample') and status.players.sample:
-                    server_info["player_list"] = [
-                        player.name for player in status.players.sample
-                    ]
+                server_info = {"host": host, "port": port, "online": True, "edition": probe.edition}
+                if hostname:
+                    server_info["hostname"] = hostname
+                server_info.update(status)
+                server_info["timestamp"] = datetime.now().isoformat()
                 
+                self.telemetry.incr("hits")
                 self.update_status(f"✅ {host}:{port}")
-                self.results.append(server_info)
+                self.record_result(server_info)
                 return server_info
                 
             except asyncio.TimeoutError:
-                self.update_status(f"⚠️ {host}:{port} 超时")
+                self.telemetry.incr("timeouts")
+                if not self.reporting:
+                    self.update_status(f"⚠️ {host}:{port} 超时")
                 return None
             except Exception as e:
-                error_msg = str(e)
-                if len(error_msg) > 50:
-                    error_msg = error_msg[:47] + "..."
-                self.update_status(f"❌ {host}:{port} - {error_msg}")
+                if isinstance(e, ConnectionRefusedError):
+                    self.telemetry.incr("refused")
+                elif isinstance(e, PROTOCOL_ERRORS):
+                    self.telemetry.incr("protocol_errors")
+                else:
+                    self.telemetry.incr("errors")
+                if not self.reporting:
+                    error_msg = str(e)
+                    if len(error_msg) > 50:
+                        error_msg = error_msg[:47] + "..."
+                    self.update_status(f"❌ {host}:{port} - {error_msg}")
                 return None
             finally:
                 self.scan_count += 1
@@ -254,36 +501,28 @@ class MinecraftServerScanner:
         """扫描所有IPv4地址"""
         self.start_time = time.time()
         self.scan_count = 0
-        total_ips = 2**32 - sum(network.num_addresses for network in self.excluded_networks)
+        total_ips = len(self.public_space)
+        state = self.load_checkpoint()
         
         print(f"开始扫描所有IPv4地址（排除私有地址范围）")
         print(f"预计总共需要扫描 {total_ips:,} 个IP地址")
         print(f"使用端口: {port}")
-        print(f"批处理大小: {batch_size}")
+        print(f"队列大小: {batch_size}")
+        print(f"扫描顺序种子: {self.get_seed()}，分片: {self.shard[0]}/{self.shard[1]}")
         print("按 Ctrl+C 可以随时中断扫描，已扫描的结果会被保存\n")
-        
-        ip_generator = self.generate_all_ips()
-        current_batch = []
+        config = {"mode": "all-ipv4", "port": port, "seed": self.get_seed(),
+                  "shard": list(self.shard), "excludes": self.excludes}
+        if self.port_set:
+            config["ports"] = self.port_set
+        start = self.resume_from(state, config)
         
         try:
-            for ip in ip_generator:
-                current_batch.append(self.scan_server(ip, port))
-                
-                if len(current_batch) >= batch_size:
-                    await asyncio.gather(*current_batch)
-                    
-                    # 每隔一定时间保存一次结果
-                    current_time = time.time()
-                    if current_time - self.last_save_time >= save_interval:
-                        self.save_results()
-                        self.last_save_time = current_time
-                    
-                    current_batch = []
-            
-            # 处理最后一批
-            if current_batch:
-                await asyncio.gather(*current_batch)
-                
+            if self.incremental:
+                await self.run_incremental(self.public_space, port, batch_size, save_interval)
+            else:
+                await self.run_engine(self.permuted_targets(self.public_space, port, start),
+                                      total=total_ips // self.shard[1], queue_size=batch_size,
+                                      save_interval=save_interval, handler=self.scan_ip, checkpoint_config=config)
         except KeyboardInterrupt:
             print("\n\n扫描被用户中断")
         finally:
@@ -291,31 +530,66 @@ class MinecraftServerScanner:
             duration = end_time - self.start_time
             print(f"\n\n扫描完成!")
             print(f"总扫描IP数: {self.scan_count:,}")
-            print(f"发现服务器数: {len(self.results):,}")
+            print(f"端口开放数: {self.open_count:,}")
+            print(f"发现服务器数: {self.found_count:,}")
             print(f"总耗时: {duration/3600:.2f} 小时")
-            print(f"平均速度: {self.scan_count/duration:.2f} IP/秒")
+            print(f"平均速度: {self.scan_count / duration if duration > 0 else 0:.2f} IP/秒")
+
+    async def run_incremental(self, space: TargetSpace, port: int, queue_size: int = None,
+                              save_interval: int = None):
+        """增量扫描：先复查上次发现的服务器和热点网段，其余空间按 cold_rate 抽样，只记录相对上次的变化"""
+        previous = {(r["host"], r["port"]): r for r in load_results(self.output_file)}
+        responsive = ResponsiveMap.load(self.responsive_map_path)
+        # 按 (版本, 端口) 判断已知服务器是否在本次探测范围内，没有版本的旧结果是 Java 版
+        probed = self.port_set or [("java", port)]
+        editions = {}
+        for edition, probed_port in probed:
+            editions.setdefault(probed_port, set()).add(edition)
+        known = []
+        for (host, known_port), record in previous.items():
+            try:
+                ip = ip_to_int(host)
+            except OSError:
+                continue
+            responsive.mark(ip)
+            if record.get("edition", "java") in editions.get(known_port, ()):
+                known.append(ip)
+
+        targets, total = incremental_targets(space, port, known, responsive.expanded(self.neighbor_radius),
+                                             self.cold_rate, self.get_seed())
+        print(f"增量扫描: 已知服务器 {len(known):,} 个，有服务器的 /24 网段 {len(responsive):,} 个，"
+              f"冷空间抽样比例 {self.cold_rate:.1%}，本次目标约 {total:,} 个")
+        self.delta = DeltaTracker(previous, self.delta_output, responsive)
+
+        async def probe(ip: int, target_port: int):
+            await self.scan_ip(ip, target_port)
+            host = int_to_ip(ip)
+            for edition, probed_port in probed:
+                record = previous.get((host, probed_port))
+                if record is not None and record.get("edition", "java") == edition:
+                    self.delta.attempted.add((host, probed_port))
+
+        try:
+            await self.run_engine(targets, total=total, queue_size=queue_size,
+                                  save_interval=save_interval, handler=probe, fanout=len(probed))
+        finally:
+            gone = self.delta.finish()
+            counts = self.delta.counts
+            self.delta = None
+            responsive.save(self.responsive_map_path)
+            print(f"\n与上次相比: 新增 {counts['new']:,}，变化 {counts['changed']:,}，消失 {len(gone):,}，"
+                  f"未变化 {counts['unchanged']:,}，变化记录已写入 {self.delta_output}")
 
     async def scan_random_global_ips(self, count: int = 1000, port: int = 25565) -> List[Dict]:
         """随机扫描全球公网IP"""
         self.start_time = time.time()
         self.scan_count = 0
-        tasks = []
-        scanned_ips = set()
         
         print(f"开始随机扫描 {count} 个全球IP地址，端口: {port}")
         
-        while len(tasks) < count:
-            while True:
-                ip = str(ipaddress.IPv4Address(random.randint(1, 2**32 - 1)))
-                if ip not in scanned_ips and self.is_public_ip(ip):
-                    scanned_ips.add(ip)
-                    break
-            
-            tasks.append(self.scan_server(ip, port))
-            if len(tasks) % 100 == 0:
-                self.print_progress(count)
-        
-        await asyncio.gather(*tasks)
+        # 伪随机排列本身保证不重复，无需记录已扫描的地址
+        targets = (target for _, target in itertools.islice(self.permuted_targets(self.public_space, port), count))
+        await self.run_engine(targets, total=count, handler=self.scan_ip)
         return self.results
 
     async def scan_ip_range(self, start_ip: str, end_ip: str, port_range: tuple = None) -> List[Dict]:
@@ -323,68 +597,244 @@ class MinecraftServerScanner:
         if port_range is None:
             port_range = self.default_port_range
 
-        start = int(ipaddress.IPv4Address(start_ip))
-        end = int(ipaddress.IPv4Address(end_ip))
-        
-        all_tasks = []
-        for ip in range(start, end + 1):
-            ip_addr = str(ipaddress.IPv4Address(ip))
-            if self.is_public_ip(ip_addr):
-                for port in range(port_range[0], port_range[1] + 1):
-                    all_tasks.append(self.scan_server(ip_addr, port))
-                    
-        print(f"开始扫描IP范围 {start_ip} 到 {end_ip}，端口范围 {port_range[0]} 到 {port_range[1]}")
-        results = await asyncio.gather(*all_tasks)
-        valid_results = [r for r in results if r]
-        self.results.extend(valid_results)
-        return valid_results
+        space = TargetSpace([(ip_to_int(start_ip), ip_to_int(end_ip))], self.excludes)
+        if self.port_set:
+            # 每个主机一个任务，端口集合在 scan_ip 中展开
+            ports = [None]
+            print(f"开始扫描IP范围 {start_ip} 到 {end_ip}，每个主机探测 {len(self.port_set)} 个端口")
+        else:
+            ports = range(port_range[0], port_range[1] + 1)
+            print(f"开始扫描IP范围 {start_ip} 到 {end_ip}，端口范围 {port_range[0]} 到 {port_range[1]}")
+        found_before = len(self.results)
+        targets, total = self.shard_targets(space.targets(ports), len(space) * len(ports))
+        await self.run_engine(targets, total=total, handler=self.scan_ip)
+        return self.results[found_before:]
+
+    async def scan_targets_file(self, path: str, port: int = 25565, batch_size: int = 1000,
+                                save_interval: int = 300, dedup_capacity: int = 10_000_000):
+        """扫描目标列表文件中的IPv4/IPv6地址、网段和 主机:端口（逐行读取，支持 gzip / bz2 / xz 压缩）
+
+        重复的目标用 Bloom 过滤器跳过（dedup_capacity 为 0 时不去重），内存占用与文件大小无关。
+        目标按去重后在文件中的顺序编号，检查点记录编号，继续扫描时重新读取文件并跳过已经扫描的部分。
+        """
+        self.start_time = time.time()
+        self.scan_count = 0
+        state = self.load_checkpoint()
+        dedup = BloomFilter(dedup_capacity) if dedup_capacity else None
+        # 没有写端口的目标使用 port；设置了 port_set 时由 scan_host 探测所有端口
+        reader = TargetFile(path, self.exclude_set, dedup, None if self.port_set else port)
+        config = {"mode": "targets", "path": os.path.abspath(path), "size": os.path.getsize(path), "port": port,
+                  "shard": list(self.shard), "excludes": self.excludes + self.excludes_v6,
+                  "dedup_capacity": dedup_capacity}
+        if self.port_set:
+            config["ports"] = self.port_set
+        start = self.resume_from(state, config)
+
+        print(f"开始扫描目标列表 {path}，没有指定端口的目标使用"
+              f"{f' {len(self.port_set)} 个端口' if self.port_set else f'端口 {port}'}")
+        if dedup:
+            print(f"去重: Bloom 过滤器 {len(dedup.bits) / 2**20:.1f} MB，容量 {dedup_capacity:,} 个目标")
+        shard, shards = self.shard
+        targets = ((position, target) for position, target in enumerate(reader)
+                   if position >= start and position % shards == shard)
+        try:
+            await self.run_engine(targets, queue_size=batch_size, save_interval=save_interval,
+                                  handler=self.scan_host, checkpoint_config=config)
+        except KeyboardInterrupt:
+            print("\n\n扫描被用户中断")
+        finally:
+            counts = reader.counts
+            print(f"\n\n读取 {counts['lines']:,} 行，生成 {counts['targets']:,} 个目标；跳过重复 {counts['duplicates']:,} 个，"
+                  f"排除 {counts['excluded']:,} 个，格式无效 {counts['invalid']:,} 行，"
+                  f"网段过大 {counts['oversized']:,} 个")
+            if dedup and dedup.count > dedup.capacity:
+                print(f"警告: 不重复的目标数 {dedup.count:,} 超过去重容量，部分目标可能被误判为重复而跳过，"
+                      f"请增大 --dedup-capacity")
+            print(f"发现服务器数: {self.found_count:,}")
 
     async def scan_multiple_servers(self, servers: list):
-        """并发扫描多个指定服务器"""
-        tasks = []
+        """并发扫描多个指定服务器
+
+        先批量解析所有域名（SRV + A/AAAA，带缓存），指向同一地址的多个名字只探测一次。
+        """
+        entries = []
         for server in servers:
             if isinstance(server, str):
-                host = server
-                port = 25565
+                try:
+                    entries.append(parse_server_address(server))
+                except ValueError as e:
+                    print(f"跳过无效地址: {e}")
             else:
-                host, port = server
-            
-            tasks.append(self.scan_server(host, port))
-        
-        await asyncio.gather(*tasks)
+                entries.append(tuple(server))
+
+        entries = list(self.shard_targets(entries, len(entries))[0])
+        resolver = Resolver(self.nameservers, self.dns_concurrency, telemetry=self.telemetry)
+        start = time.time()
+        try:
+            with profiler.stage("resolve"):
+                endpoints, failed = await resolver.resolve_all(entries)
+        finally:
+            resolver.close()
+        print(f"解析 {len(entries):,} 个地址用时 {time.time() - start:.1f} 秒: {len(endpoints):,} 个目标，"
+              f"合并重复 {len(entries) - len(failed) - len(endpoints):,} 个，解析失败 {len(failed):,} 个")
+
+        # 结果中保留原始域名（同一地址有多个名字时取第一个）
+        targets = [(ip, port, "java", next((name for name in hostnames if name != ip), None))
+                   for (ip, port), hostnames in endpoints.items()]
+        await self.run_engine(targets, total=len(targets))
         return self.results
 
     async def scan_single_host_all_ports(self, host: str, start_port: int = 1, end_port: int = 65535) -> List[Dict]:
         """扫描单个主机的所有端口"""
         print(f"开始扫描主机 {host} 的端口范围 {start_port} 到 {end_port}")
-        tasks = []
-        for port in range(start_port, end_port + 1):
-            tasks.append(self.scan_server(host, port))
-        
-        await asyncio.gather(*tasks)
+        targets, total = self.shard_targets(((host, port) for port in range(start_port, end_port + 1)),
+                                            end_port - start_port + 1)
+        await self.run_engine(targets, total=total)
         return self.results
     
-    def save_results(self, filename: str = "scan_results.json"):
-        """保存扫描结果到JSON文件"""
+    async def run_engine(self, targets, total: int = None, queue_size: int = None,
+                         save_interval: int = None, handler=None, checkpoint_config: Dict = None,
+                         fanout: int = None) -> int:
+        """通过扫描引擎探测目标 (host, port)，可选定期保存结果
+
+        指定 checkpoint_config 时目标格式为 (断点位置, (host, port))，并定期保存检查点。
+        fanout 是每个目标的探测次数，包装了 scan_ip / scan_host 的 handler 需要自己传入。
+        """
+        # 设置了 port_set 时 scan_ip / scan_host 每个目标会同时探测 len(port_set) 个端口，
+        # 并发数和进度都按探测次数计算，引擎同时处理的主机数相应减少
+        if fanout is None:
+            fanout = len(self.port_set) if self.port_set and handler in (self.scan_ip, self.scan_host) else 1
+        self.fanout = fanout
+        if total:
+            total *= self.fanout
+        self.total_targets = total
+        if not self.start_time:
+            self.start_time = time.time()
+        tracked = checkpoint_config is not None
+        # 开启性能分析时统计生成目标和每次探测的耗时
+        targets = profiler.timed("targets", targets)
+        max_concurrency = self.controller.max_concurrency if self.controller else None
+        self.engine = ScanEngine(profiler.wrap("probe", handler or self.scan_server),
+                                 max(1, self.concurrency // self.fanout), queue_size, track_cursors=tracked,
+                                 max_concurrency=max_concurrency and max(1, max_concurrency // self.fanout))
+        tasks = []
+        if self.controller:
+            tasks.append(asyncio.ensure_future(self._autotune()))
+        if save_interval:
+            tasks.append(asyncio.ensure_future(self._autosave(save_interval)))
+        if tracked and self.checkpoint:
+            tasks.append(asyncio.ensure_future(self._autocheckpoint(checkpoint_config)))
+        reporter = Reporter(self.telemetry, profiler.wrap("progress", self.print_progress), self.scan_stats,
+                            self.progress_interval, self.stats_file)
+        tasks.append(asyncio.ensure_future(reporter.run()))
+        metrics_server = None
+        if self.metrics_port:
+            metrics_server = await self.telemetry.serve_metrics(port=self.metrics_port)
+        self.reporting = True
+        completed = False
         try:
+            submitted = await self.engine.run(targets)
+            completed = True
+            return submitted
+        finally:
+            self.reporting = False
+            for task in tasks:
+                task.cancel()
+            if metrics_server:
+                metrics_server.close()
+            if tracked:
+                self.save_checkpoint(checkpoint_config, completed)
+            reporter.tick()
+
+    def scan_stats(self) -> Dict:
+        """当前扫描进度（作为统计信息中的 gauge 导出）"""
+        elapsed = time.time() - self.start_time if self.start_time else 0
+        return {
+            "scanned": self.scan_count,
+            "open": self.open_count,
+            "found": self.found_count,
+            "total_targets": self.total_targets or 0,
+            "elapsed_seconds": round(elapsed, 3),
+            "probes_per_second": round(self.scan_count / elapsed, 2) if elapsed > 0 else 0,
+            "concurrency": self.engine.limit * self.fanout if self.engine else self.concurrency,
+            "connect_timeout": self.connect_timeout,
+            "status_timeout": self.default_timeout,
+            "rate_limit": self.pacer.rate if self.pacer else 0,
+        }
+
+    async def _autotune(self):
+        """扫描过程中定期根据 AIMD 控制器的决策调整并发数和超时时间"""
+        connect_ceiling, status_ceiling = self.connect_timeout, self.default_timeout
+        while True:
+            await asyncio.sleep(self.control_interval)
+            decision = self.controller.step(self.engine.limit * self.fanout, self.connect_timeout,
+                                            self.default_timeout, connect_ceiling, status_ceiling)
+            # 控制器按探测次数调节，引擎按目标（主机）限制
+            self.engine.set_limit(decision["concurrency"] // self.fanout)
+            self.connect_timeout = decision["connect_timeout"]
+            self.default_timeout = decision["status_timeout"]
+
+    async def _autosave(self, interval: int):
+        """扫描过程中每隔 interval 秒保存一次结果"""
+        while True:
+            await asyncio.sleep(max(0, self.last_save_time + interval - time.time()))
             try:
-                with open(filename, 'r', encoding='utf-8') as f:
-                    existing_results = json.load(f)
-                    if isinstance(existing_results, list):
-                        seen_servers = {(r['host'], r['port']) for r in existing_results}
-                        for result in self.results:
-                            if (result['host'], result['port']) not in seen_servers:
-                                existing_results.append(result)
-                                seen_servers.add((result['host'], result['port']))
-                        self.results = existing_results
-            except (FileNotFoundError, json.JSONDecodeError):
-                pass
-
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(self.results, f, ensure_ascii=False, indent=4)
-            self.update_status(f"已保存 {len(self.results)} 个服务器到 {filename}")
-        except Exception as e:
-            self.update_status(f"保存结果出错: {str(e)}")
+                self.save_results()
+            except ResultSinkError as e:
+                self.update_status(f"保存结果出错: {str(e)}")
+            self.last_save_time = time.time()
+
+    def record_result(self, server_info: Dict):
+        """记录一条发现的服务器"""
+        self.found_count += 1
+        if self.geo and "country" not in server_info:
+            with profiler.stage("enrich"):
+                server_info["country"] = self.geo.lookup(server_info["host"])
+        if self.delta and not self.delta.observe(server_info):
+            # 增量扫描只写入新发现或者有变化的服务器
+            return
+        with profiler.stage("sink"):
+            if self.sink:
+                self.sink.write(server_info)
+            else:
+                self.results.append(server_info)
+        self.publish("hit", server_info)
+
+    def save_results(self, filename: str = None):
+        """保存扫描结果到JSON文件"""
+        if self.sink:
+            # 结果已经逐条追加，这里只需要让写入线程尽快落盘
+            self.sink.flush()
+            return
+        filename = filename or self.output_file
+        with profiler.stage("save_results"):
+            try:
+                try:
+                    with open(filename, 'r', encoding='utf-8') as f:
+                        existing_results = json.load(f)
+                        if isinstance(existing_results, list):
+                            merged = ResultTable(existing_results)
+                            del existing_results
+                            seen_servers = {merged.key(row) for row in range(len(merged))}
+                            for result in self.results:
+                                key = ResultTable.record_key(result)
+                                if key not in seen_servers:
+                                    merged.append(result)
+                                    seen_servers.add(key)
+                            self.results = merged
+                except (FileNotFoundError, json.JSONDecodeError):
+                    pass
+
+                # 逐条写出，不在内存中生成完整的结果列表（格式与 json.dump(indent=4) 相同）
+                with open(filename, 'w', encoding='utf-8') as f:
+                    f.write("[")
+                    for i, result in enumerate(self.results):
+                        f.write(",\n    " if i else "\n    ")
+                        f.write(json.dumps(result, ensure_ascii=False, indent=4).replace("\n", "\n    "))
+                    f.write("\n]" if len(self.results) else "]")
+                self.update_status(f"已保存 {len(self.results)} 个服务器到 {filename}")
+            except Exception as e:
+                self.update_status(f"保存结果出错: {str(e)}")
 
 async def main():
     # 示例服务器列表
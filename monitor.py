@@ -0,0 +1,286 @@
+import asyncio
+import heapq
+import random
+import sqlite3
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from result_sink import ResultSink, iter_results
+from telemetry import Reporter
+
+ServerKey = Tuple[str, int]
+
+
+class HistorySink(ResultSink):
+    """监控样本的 SQLite 时间序列存储
+
+    每个样本只占一行几个整数：服务器和版本名分别存放在 servers / versions 表中，
+    samples 表按 (server_id, ts) 聚簇存放。servers 表同时记录每个服务器的调度状态，
+    监控重启后可以接着之前的检查频率继续。
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS servers (
+            id INTEGER PRIMARY KEY,
+            host TEXT NOT NULL,
+            port INTEGER NOT NULL,
+            interval REAL,
+            failures INTEGER NOT NULL DEFAULT 0,
+            next_check REAL,
+            UNIQUE (host, port)
+        );
+        CREATE TABLE IF NOT EXISTS versions (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        );
+        CREATE TABLE IF NOT EXISTS samples (
+            server_id INTEGER NOT NULL,
+            ts INTEGER NOT NULL,
+            online INTEGER NOT NULL,
+            players INTEGER,
+            latency INTEGER,
+            version_id INTEGER,
+            PRIMARY KEY (server_id, ts)
+        ) WITHOUT ROWID;
+    """
+
+    def _open(self):
+        self._db = sqlite3.connect(self.path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(self.SCHEMA)
+        self._db.commit()
+        self._server_ids = {}
+        self._version_ids = {}
+
+    def _id(self, cache: Dict, table: str, columns: Tuple[str, ...], key: Tuple) -> int:
+        row_id = cache.get(key)
+        if row_id is None:
+            where = " AND ".join(f"{c} = ?" for c in columns)
+            self._db.execute(f"INSERT OR IGNORE INTO {table} ({', '.join(columns)}) "
+                             f"VALUES ({', '.join('?' for _ in columns)})", key)
+            row_id = cache[key] = self._db.execute(f"SELECT id FROM {table} WHERE {where}", key).fetchone()[0]
+        return row_id
+
+    def _write_batch(self, records: List[Dict]):
+        with self._db:
+            samples = []
+            for r in records:
+                server_id = self._id(self._server_ids, "servers", ("host", "port"), (r["host"], r["port"]))
+                version_id = None
+                if r.get("version") is not None:
+                    version_id = self._id(self._version_ids, "versions", ("name",), (str(r["version"]),))
+                samples.append((server_id, int(r["ts"]), int(r["online"]), r.get("players"),
+                                r.get("latency"), version_id))
+                self._db.execute("UPDATE servers SET interval = ?, failures = ?, next_check = ? WHERE id = ?",
+                                 (r["interval"], r["failures"], r["next_check"], server_id))
+            # 同一秒内的重复样本保留最新的一条
+            self._db.executemany("INSERT OR REPLACE INTO samples VALUES (?, ?, ?, ?, ?, ?)", samples)
+
+    def _close(self):
+        self._db.close()
+
+
+def load_schedule(path: str) -> Dict[ServerKey, Dict]:
+    """读取历史库中保存的各服务器调度状态"""
+    db = sqlite3.connect(path)
+    try:
+        db.executescript(HistorySink.SCHEMA)
+        return {
+            (host, port): {"interval": interval, "failures": failures, "next_check": next_check}
+            for host, port, interval, failures, next_check in
+            db.execute("SELECT host, port, interval, failures, next_check FROM servers")
+        }
+    finally:
+        db.close()
+
+
+def load_history(path: str, host: str, port: int, since: Optional[float] = None) -> List[Dict]:
+    """读取某个服务器的监控样本，按时间排序"""
+    db = sqlite3.connect(path)
+    try:
+        rows = db.execute(
+            """SELECT s.ts, s.online, s.players, s.latency, v.name
+               FROM samples s JOIN servers sv ON sv.id = s.server_id
+               LEFT JOIN versions v ON v.id = s.version_id
+               WHERE sv.host = ? AND sv.port = ? AND s.ts >= ? ORDER BY s.ts""",
+            (host, port, int(since or 0)))
+        return [{"ts": ts, "online": bool(online), "players": players, "latency": latency, "version": version}
+                for ts, online, players, latency, version in rows]
+    finally:
+        db.close()
+
+
+class Monitor:
+    """持续监控已知服务器，每个服务器按自己的状态决定下一次检查的时间
+
+    - 在线且人数或版本有明显变化的服务器检查间隔减半，稳定的服务器逐渐放宽到 base_interval；
+    - 在线人数越多，间隔上限越短（popular_players 人时上限减半）；
+    - 离线的服务器按 base_interval * 2^连续失败次数 退避，最长 max_interval。
+    """
+
+    def __init__(self, scanner, history: HistorySink, base_interval: float = 300,
+                 min_interval: float = 30, max_interval: float = 86400, popular_players: int = 50,
+                 concurrency: int = 200, reload_interval: float = 600):
+        self.scanner = scanner
+        self.history = history
+        self.base_interval = base_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.popular_players = popular_players
+        self.concurrency = concurrency
+        self.reload_interval = reload_interval
+        self.states = {}  # (host, port) -> 调度状态
+        self.editions = {}  # (host, port) -> 版本（java / bedrock）
+        self.online = 0
+        self._heap = []
+
+    def add_servers(self, keys: Iterable[ServerKey], saved: Optional[Dict[ServerKey, Dict]] = None) -> int:
+        """加入新的监控对象，返回新增数量；没有保存的调度状态时在一个基础间隔内随机错开首次检查"""
+        saved = saved or {}
+        now = time.time()
+        added = 0
+        for key in keys:
+            if key in self.states:
+                continue
+            state = {"interval": self.base_interval, "failures": 0, "players": None, "version": None,
+                     "online": None, "next_check": now + random.uniform(0, min(self.base_interval, 60))}
+            state.update({k: v for k, v in saved.get(key, {}).items() if v is not None})
+            self.states[key] = state
+            heapq.heappush(self._heap, (state["next_check"], key))
+            added += 1
+        return added
+
+    def load_known_servers(self, path: str) -> int:
+        """从扫描结果文件和历史库中加载要监控的服务器"""
+        saved = load_schedule(self.history.path)
+        try:
+            records = list(iter_results(path))
+        except (OSError, ValueError, sqlite3.Error):
+            records = []
+        known = []
+        for record in records:
+            key = (record["host"], record["port"])
+            self.editions[key] = record.get("edition", "java")
+            known.append(key)
+        return self.add_servers(known + list(saved), saved)
+
+    def next_interval(self, state: Dict, status: Optional[Dict]) -> float:
+        """根据本次检查结果计算下一次检查的间隔"""
+        if status is None:
+            state["failures"] += 1
+            return min(self.max_interval, self.base_interval * 2 ** min(state["failures"], 20))
+
+        players = status.get("players_online", 0)
+        previous = state["players"]
+        changed = (state["failures"] > 0 or state["online"] is False
+                   or status.get("version") != state["version"]
+                   or previous is None or abs(players - previous) >= max(2, previous * 0.1))
+        state["failures"] = 0
+        ceiling = self.base_interval / (1 + players / self.popular_players)
+        interval = state["interval"] / 2 if changed else state["interval"] * 1.5
+        return max(self.min_interval, min(ceiling, interval))
+
+    async def check(self, key: ServerKey):
+        """检查一个服务器并记录样本"""
+        host, port = key
+        scanner = self.scanner
+        if scanner.pacer:
+            await scanner.pacer.acquire()
+        state = self.states[key]
+        status = None
+        start = time.perf_counter()
+        try:
+            probe = scanner.get_probe(self.editions.get(key, "java"))
+            status = await asyncio.wait_for(probe.query(host, port), timeout=scanner.default_timeout)
+            scanner.telemetry.observe("status", time.perf_counter() - start)
+        except asyncio.TimeoutError:
+            scanner.telemetry.incr("timeouts")
+        except Exception:
+            scanner.telemetry.incr("errors")
+        scanner.scan_count += 1
+
+        interval = self.next_interval(state, status)
+        # 加一点随机抖动，避免同一批服务器一直同时被检查
+        interval *= random.uniform(0.9, 1.1)
+        now = time.time()
+        if status is not None:
+            self.online += state["online"] is not True
+            state.update(online=True, players=status.get("players_online", 0), version=status.get("version"))
+            scanner.telemetry.incr("monitor_online")
+            # 只发布会在 Web 界面上变化的字段，没有变化的更新由 Web 界面跳过
+            scanner.publish("update", {"host": host, "port": port, "online": True,
+                                       "players_online": state["players"], "version": state["version"]})
+        else:
+            self.online -= state["online"] is True
+            state["online"] = False
+            scanner.telemetry.incr("monitor_offline")
+            scanner.publish("update", {"host": host, "port": port, "online": False})
+        state["interval"] = interval
+        state["next_check"] = now + interval
+        heapq.heappush(self._heap, (state["next_check"], key))
+
+        self.history.write({
+            "host": host,
+            "port": port,
+            "ts": now,
+            "online": status is not None,
+            "players": state["players"] if status is not None else None,
+            "latency": round(status["latency"]) if status is not None and status.get("latency") is not None else None,
+            "version": state["version"] if status is not None else None,
+            "interval": round(interval, 1),
+            "failures": state["failures"],
+            "next_check": state["next_check"],
+        })
+
+    def stats(self) -> Dict:
+        return {
+            "monitored": len(self.states),
+            "online": self.online,
+            "checked": self.scanner.scan_count,
+            "due": sum(1 for due, _ in self._heap if due <= time.time()),
+        }
+
+    def print_status(self):
+        stats = self.stats()
+        print(f"\r{' ' * 100}\r监控服务器: {stats['monitored']:,} | 在线: {stats['online']:,} | "
+              f"已检查: {stats['checked']:,} | 待检查: {stats['due']:,}", end="", flush=True)
+
+    async def run(self, results_path: str, duration: Optional[float] = None):
+        """持续监控，直到 duration 秒后（不指定则一直运行）"""
+        scanner = self.scanner
+        added = self.load_known_servers(results_path)
+        print(f"监控 {added:,} 个服务器，基础检查间隔 {self.base_interval:g} 秒，历史数据写入 {self.history.path}")
+        reporter = Reporter(scanner.telemetry, self.print_status, self.stats,
+                            scanner.progress_interval, scanner.stats_file)
+        reporter_task = asyncio.ensure_future(reporter.run())
+        started = last_reload = time.time()
+        running = set()
+        try:
+            while duration is None or time.time() - started < duration:
+                now = time.time()
+                if now - last_reload >= self.reload_interval:
+                    # 其他扫描进程可能发现了新的服务器
+                    self.load_known_servers(results_path)
+                    last_reload = now
+                while self._heap and len(running) < self.concurrency:
+                    due, key = self._heap[0]
+                    if due > now:
+                        break
+                    heapq.heappop(self._heap)
+                    if due != self.states[key]["next_check"]:
+                        continue  # 已经重新安排过的旧条目
+                    running.add(asyncio.ensure_future(self.check(key)))
+                wait = min(1.0, self._heap[0][0] - now) if self._heap else 1.0
+                if running:
+                    _, running = await asyncio.wait(running, timeout=max(0.01, wait),
+                                                    return_when=asyncio.FIRST_COMPLETED)
+                else:
+                    await asyncio.sleep(max(0.01, wait))
+        finally:
+            for task in running:
+                task.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
+            reporter_task.cancel()
+            reporter.tick()
+            print()
@@ -0,0 +1,86 @@
+import asyncio
+from typing import Dict, List, Optional, Tuple
+
+import raknet
+import slp
+
+# 表示服务器响应格式不对（而不是网络问题）的异常
+PROTOCOL_ERRORS = (slp.SLPError, raknet.RakNetError, asyncio.IncompleteReadError)
+
+
+class Probe:
+    """探测插件：查询一种客户端版本（edition）的服务器状态"""
+
+    edition = None
+    transport = "tcp"  # tcp 探测可以先做端口预检
+    default_port = None
+
+    async def query(self, host: str, port: int, server_address: Optional[str] = None) -> Dict:
+        """返回服务器状态（字段与 slp.parse_status 一致），失败时抛出异常
+
+        host 为连接的地址，server_address 为用户给出的原始域名（协议需要时使用）
+        """
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class JavaProbe(Probe):
+    """Java 版：Server List Ping（TCP）"""
+
+    edition = "java"
+    transport = "tcp"
+    default_port = 25565
+
+    def __init__(self, ping: bool = False):
+        self.ping = ping
+
+    async def query(self, host: str, port: int, server_address: Optional[str] = None) -> Dict:
+        return await slp.query(host, port, self.ping, server_address=server_address)
+
+
+class BedrockProbe(Probe):
+    """基岩版：RakNet Unconnected Ping（UDP），所有目标共用一个套接字"""
+
+    edition = "bedrock"
+    transport = "udp"
+    default_port = 19132
+
+    def __init__(self):
+        self.endpoint = raknet.BedrockEndpoint()
+
+    async def query(self, host: str, port: int, server_address: Optional[str] = None) -> Dict:
+        return await self.endpoint.query(host, port)
+
+    def close(self):
+        self.endpoint.close()
+
+
+PROBES = {probe.edition: probe for probe in (JavaProbe, BedrockProbe)}
+
+PortSet = List[Tuple[str, int]]
+
+
+def parse_port_set(spec: str) -> PortSet:
+    """解析端口集合，例如 "25565-25567,bedrock:19132"（不写版本时为 java）
+
+    返回去重后的 [(版本, 端口), ...]
+    """
+    port_set = {}  # 按插入顺序去重
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        edition, _, ports = item.rpartition(":")
+        edition = edition.lower() or "java"
+        if edition not in PROBES:
+            raise ValueError(f"不支持的版本: {edition}（可选: {', '.join(PROBES)}）")
+        start, _, end = ports.partition("-")
+        start, end = int(start), int(end or start)
+        if not 1 <= start <= end <= 65535:
+            raise ValueError(f"端口范围无效: {ports}")
+        port_set.update(dict.fromkeys((edition, port) for port in range(start, end + 1)))
+    if not port_set:
+        raise ValueError("端口集合为空")
+    return list(port_set)
@@ -0,0 +1,323 @@
+import asyncio
+import cProfile
+import contextvars
+import functools
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from telemetry import LATENCY_BUCKETS, Histogram
+
+# 采样方式：stack=定时采样所有线程的调用栈，cprofile=定期开启一段时间的 cProfile，
+# tracemalloc=定期记录内存分配快照
+SAMPLERS = ("stack", "cprofile", "tracemalloc")
+# 阶段耗时的桶上界（秒）：解析 JSON 等阶段只有几十微秒，在延迟桶前面补上更细的桶
+STAGE_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025) + LATENCY_BUCKETS
+STACK_SAMPLE_PERIOD = 0.005  # 调用栈采样间隔（秒）
+LOOP_LAG_PERIOD = 0.05  # 事件循环延迟的检测间隔（秒）
+TRACEMALLOC_FRAMES = 32
+
+# 当前所在的阶段路径，协程和线程各自独立（新建的任务继承创建时的路径）
+_path = contextvars.ContextVar("profile_path", default=())
+
+
+class _NullStage:
+    """未开启性能分析时使用的空阶段"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    __slots__ = ("profiler", "name", "token", "start")
+
+    def __init__(self, profiler: "Profiler", name: str):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.token = _path.set(_path.get() + (self.name,))
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        path = _path.get()
+        _path.reset(self.token)
+        self.profiler.record(path, elapsed)
+        return False
+
+
+def _frame_name(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ",")
+
+
+class Profiler:
+    """可选的性能分析：各阶段耗时、事件循环延迟，以及定时采样的调用栈 / cProfile / 内存分配
+
+    未开启时 stage() 返回一个共享的空对象，wrap() 和 timed() 原样返回参数，几乎没有开销。
+    结果写成火焰图工具（flamegraph.pl、speedscope、inferno）可以直接读取的折叠栈格式：
+      <前缀>.stages.folded    各阶段的任务耗时（微秒；并发的任务分别计算，总和可能超过实际时间）
+      <前缀>.stack.folded     调用栈采样次数
+      <前缀>.mem-<n>.folded   第 n 个内存快照中各调用栈分配的字节数
+      <前缀>.cpu-<n>.prof     第 n 个 cProfile 窗口（pstats 格式，可以用 flameprof / snakeviz 查看）
+      <前缀>.json             各阶段的次数和耗时分位数、事件循环延迟
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.prefix = None
+        self.root = None
+        self.sampler = None
+        self.interval = 10.0  # cProfile 窗口 / 内存快照的间隔（秒）
+        self.window = 1.0  # 每个 cProfile 窗口的长度（秒）
+        self.stages = {}  # 阶段路径 -> Histogram
+        self.loop_lag = Histogram(STAGE_BUCKETS)
+        self.max_loop_lag = 0.0
+        self.stack_samples = Counter()
+        self.cpu_profiles = {}  # 窗口编号 -> pstats.Stats
+        self.snapshots = 0
+        self.started = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def enable(self, prefix: str, root: str, sampler: Optional[str] = None,
+               interval: float = 10.0, window: float = 1.0):
+        """开启性能分析，结果文件以 prefix 开头，root 是折叠栈的根节点名（scan / web）"""
+        if sampler is not None and sampler not in SAMPLERS:
+            raise ValueError(f"不支持的采样方式: {sampler}")
+        self.enabled = True
+        self.prefix = prefix
+        self.root = root
+        self.sampler = sampler
+        self.interval = interval
+        self.window = min(window, interval)
+
+    def stage(self, name: str):
+        """统计一个阶段的耗时，可以嵌套：with profiler.stage("status"): ..."""
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name)
+
+    def record(self, path: Tuple[str, ...], seconds: float):
+        with self._lock:
+            histogram = self.stages.get(path)
+            if histogram is None:
+                histogram = self.stages[path] = Histogram(STAGE_BUCKETS)
+            histogram.observe(seconds)
+
+    def wrap(self, name: str, func: Callable) -> Callable:
+        """把函数（或协程函数）的每次调用作为一个阶段统计；未开启时原样返回"""
+        if not self.enabled:
+            return func
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def staged(*args, **kwargs):
+                with self.stage(name):
+                    return await func(*args, **kwargs)
+        else:
+            @functools.wraps(func)
+            def staged(*args, **kwargs):
+                with self.stage(name):
+                    return func(*args, **kwargs)
+
+        return staged
+
+    def timed(self, name: str, iterable: Iterable) -> Iterable:
+        """统计从迭代器中取出每个元素的耗时（例如生成扫描目标）；未开启时原样返回"""
+        if not self.enabled:
+            return iterable
+        return self._timed(name, iter(iterable))
+
+    def _timed(self, name: str, iterator):
+        path = _path.get() + (name,)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self.record(path, time.perf_counter() - start)
+            yield item
+
+    # 采样
+
+    def start(self):
+        """开始计时，并按采样方式启动采样线程（cProfile 窗口在 session 中由事件循环开启）"""
+        if not self.enabled or self.started is not None:
+            return
+        self.started = time.monotonic()
+        self._stop.clear()
+        if self.sampler == "tracemalloc":
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            self._thread = threading.Thread(target=self._snapshot_loop, name="profile-tracemalloc", daemon=True)
+        elif self.sampler == "stack":
+            self._thread = threading.Thread(target=self._stack_loop, name="profile-stack", daemon=True)
+        if self._thread:
+            self._thread.start()
+
+    def stop(self):
+        """停止采样并写入结果文件"""
+        if not self.enabled or self.started is None:
+            return
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        if self.sampler == "tracemalloc":
+            self._write_snapshot()
+            tracemalloc.stop()
+        self.write()
+        self.started = None
+
+    def _stack_loop(self):
+        me = threading.get_ident()
+        while not self._stop.wait(STACK_SAMPLE_PERIOD):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)).replace(";", ","))
+                self.stack_samples[";".join(reversed(stack))] += 1
+
+    def _snapshot_loop(self):
+        while not self._stop.wait(self.interval):
+            self._write_snapshot()
+
+    def _write_snapshot(self):
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ))
+        path = f"{self.prefix}.mem-{self.snapshots}.folded"
+        with open(path, "w", encoding="utf-8") as f:
+            for stat in snapshot.statistics("traceback"):
+                # 调用栈从最外层开始，与折叠栈的顺序一致
+                frames = [f"{os.path.basename(frame.filename)}:{frame.lineno}".replace(";", ",")
+                          for frame in stat.traceback]
+                f.write(f"{self.root};{';'.join(frames)} {stat.size}\n")
+        self.snapshots += 1
+
+    def cprofile_window(self) -> Optional[int]:
+        """当前处于第几个 cProfile 窗口（每个间隔的最后 window 秒），不在窗口中时返回 None"""
+        if self.sampler != "cprofile" or self.started is None:
+            return None
+        elapsed = time.monotonic() - self.started
+        if elapsed % self.interval < self.interval - self.window:
+            return None
+        return int(elapsed // self.interval)
+
+    def add_profile(self, window: int, profile: cProfile.Profile):
+        """把一段 cProfile 结果合并到对应窗口"""
+        with self._lock:
+            stats = self.cpu_profiles.get(window)
+            if stats is None:
+                self.cpu_profiles[window] = pstats.Stats(profile)
+            else:
+                stats.add(profile)
+
+    async def _cprofile_windows(self):
+        """在事件循环所在的线程上定期开启 cProfile，窗口内所有协程的调用都会被记录"""
+        while True:
+            await asyncio.sleep(self.interval - self.window)
+            window = int((time.monotonic() - self.started) // self.interval)
+            profile = cProfile.Profile()
+            profile.enable()
+            try:
+                await asyncio.sleep(self.window)
+            finally:
+                profile.disable()
+                self.add_profile(window, profile)
+
+    async def _watch_loop(self):
+        """事件循环延迟：定时器比预定时间晚触发了多久"""
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(LOOP_LAG_PERIOD)
+            lag = max(0.0, loop.time() - start - LOOP_LAG_PERIOD)
+            self.loop_lag.observe(lag)
+            self.max_loop_lag = max(self.max_loop_lag, lag)
+
+    @asynccontextmanager
+    async def session(self):
+        """在事件循环中运行的一次性能分析：检测事件循环延迟和开启 cProfile 窗口，结束时写入结果"""
+        if not self.enabled:
+            yield
+            return
+        self.start()
+        tasks = [asyncio.ensure_future(self._watch_loop())]
+        if self.sampler == "cprofile":
+            tasks.append(asyncio.ensure_future(self._cprofile_windows()))
+        try:
+            yield
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self.stop()
+
+    # 输出
+
+    def summary(self) -> Dict:
+        with self._lock:
+            stages = dict(self.stages)
+        return {
+            "root": self.root,
+            "sampler": self.sampler,
+            "duration_seconds": round(time.monotonic() - self.started, 3) if self.started is not None else None,
+            "stages": {";".join(path): dict(histogram.summary(), total=histogram.sum)
+                       for path, histogram in sorted(stages.items())},
+            "loop_lag": dict(self.loop_lag.summary(), max=self.max_loop_lag) if self.loop_lag.count else None,
+        }
+
+    def folded_stages(self) -> Dict[str, int]:
+        """各阶段的自身耗时（微秒）：阶段总耗时减去直接子阶段的总耗时"""
+        with self._lock:
+            totals = {path: histogram.sum for path, histogram in self.stages.items()}
+        children = Counter()
+        for path, total in totals.items():
+            if len(path) > 1:
+                children[path[:-1]] += total
+        return {";".join((self.root,) + path): max(0, int((total - children[path]) * 1e6))
+                for path, total in sorted(totals.items())}
+
+    def write(self):
+        with open(f"{self.prefix}.json", "w", encoding="utf-8") as f:
+            json.dump(self.summary(), f, ensure_ascii=False, indent=2)
+        with open(f"{self.prefix}.stages.folded", "w", encoding="utf-8") as f:
+            for stack, value in self.folded_stages().items():
+                f.write(f"{stack} {value}\n")
+        if self.stack_samples:
+            with open(f"{self.prefix}.stack.folded", "w", encoding="utf-8") as f:
+                for stack, count in self.stack_samples.items():
+                    f.write(f"{stack} {count}\n")
+        with self._lock:
+            cpu_profiles = dict(self.cpu_profiles)
+        for window, stats in cpu_profiles.items():
+            stats.dump_stats(f"{self.prefix}.cpu-{window}.prof")
+
+
+# 进程内共用的性能分析器，由 scan.py / web.py 的 --profile 参数开启
+profiler = Profiler()
@@ -0,0 +1,156 @@
+import asyncio
+import itertools
+import random
+import socket
+import struct
+import time
+from typing import Dict, Tuple
+
+# RakNet 离线消息的固定标识
+MAGIC = bytes.fromhex("00ffff00fefefefefdfdfdfd12345678")
+UNCONNECTED_PING = 0x01
+UNCONNECTED_PONG = 0x1C
+
+_ping = struct.Struct(">Bq16sq")
+_pong_header = struct.Struct(">Bqq16sH")
+
+
+class RakNetError(Exception):
+    """服务器响应不符合 RakNet 离线 ping 协议"""
+
+
+def pack_ping(token: int, client_guid: int) -> bytes:
+    """Unconnected Ping：包ID + 时间（这里用作请求编号）+ MAGIC + 客户端 GUID"""
+    return _ping.pack(UNCONNECTED_PING, token, MAGIC, client_guid)
+
+
+def pack_pong(token: int, server_guid: int, text: str) -> bytes:
+    data = text.encode("utf-8")
+    return _pong_header.pack(UNCONNECTED_PONG, token, server_guid, MAGIC, len(data)) + data
+
+
+def unpack_pong(data: bytes) -> Tuple[int, int, str]:
+    """解析 Unconnected Pong，返回 (请求编号, 服务器 GUID, 服务器信息字符串)"""
+    if len(data) < _pong_header.size or data[0] != UNCONNECTED_PONG:
+        raise RakNetError("不是 Unconnected Pong 数据包")
+    _, token, server_guid, magic, length = _pong_header.unpack_from(data)
+    if magic != MAGIC:
+        raise RakNetError("MAGIC 不匹配")
+    text = data[_pong_header.size:_pong_header.size + length]
+    if len(text) != length:
+        raise RakNetError("服务器信息长度不完整")
+    try:
+        return token, server_guid, text.decode("utf-8")
+    except UnicodeDecodeError:
+        raise RakNetError("服务器信息编码无效")
+
+
+def parse_pong_text(text: str) -> Dict:
+    """解析服务器信息字符串
+
+    格式: 版本;MOTD第一行;协议号;游戏版本;在线人数;最大人数;服务器ID;MOTD第二行;游戏模式;游戏模式编号;IPv4端口;IPv6端口;
+    """
+    fields = text.split(";")
+    if len(fields) < 6 or fields[0] not in ("MCPE", "MCEE"):
+        raise RakNetError("服务器信息格式无效")
+    try:
+        info = {
+            "version": fields[3],
+            "protocol": int(fields[2]),
+            "players_online": int(fields[4]),
+            "players_max": int(fields[5]),
+            "description": fields[1],
+        }
+    except ValueError:
+        raise RakNetError("服务器信息格式无效")
+    if len(fields) > 7 and fields[7]:
+        info["description"] += "\n" + fields[7]
+    if len(fields) > 8 and fields[8]:
+        info["gamemode"] = fields[8]
+    return info
+
+
+class _PingProtocol(asyncio.DatagramProtocol):
+    def __init__(self, endpoint: "BedrockEndpoint"):
+        self.endpoint = endpoint
+
+    def datagram_received(self, data: bytes, addr):
+        self.endpoint._received(data, addr)
+
+    def error_received(self, exc: Exception):
+        # ICMP 端口不可达等错误无法对应到具体请求，由请求超时处理
+        pass
+
+
+class BedrockEndpoint:
+    """所有 Bedrock 探测共用的 UDP 套接字（每个地址族一个），用请求编号把响应分发给对应的请求"""
+
+    def __init__(self, bind: Tuple[str, int] = ("0.0.0.0", 0), bind_v6: Tuple[str, int] = ("::", 0)):
+        self.binds = {socket.AF_INET: bind, socket.AF_INET6: bind_v6}
+        self.transports = {}  # 地址族 -> 套接字
+        self.client_guid = random.getrandbits(63)
+        self._tokens = itertools.count(random.getrandbits(31))
+        self._pending = {}  # 请求编号 -> (目标地址, Future)
+        self._open_lock = asyncio.Lock()
+
+    async def open(self, family: int = socket.AF_INET):
+        async with self._open_lock:
+            if family not in self.transports:
+                loop = asyncio.get_running_loop()
+                self.transports[family], _ = await loop.create_datagram_endpoint(
+                    lambda: _PingProtocol(self), local_addr=self.binds[family], family=family)
+        return self.transports[family]
+
+    def close(self):
+        for transport in self.transports.values():
+            transport.close()
+        self.transports = {}
+
+    def _received(self, data: bytes, addr):
+        try:
+            token, _, text = unpack_pong(data)
+        except RakNetError:
+            return
+        pending = self._pending.get(token)
+        if pending is None or pending[0] != addr[:2] or pending[1].done():
+            return
+        pending[1].set_result(text)
+
+    @staticmethod
+    async def _address(host: str, port: int) -> Tuple[int, Tuple[str, int]]:
+        """目标地址族和规范化的 (IP, 端口)（与收到的响应来源地址格式一致），域名优先使用 IPv4"""
+        for family in (socket.AF_INET, socket.AF_INET6):
+            try:
+                return family, (socket.inet_ntop(family, socket.inet_pton(family, host)), port)
+            except OSError:
+                continue
+        infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_DGRAM)
+        family, _, _, _, address = min(infos, key=lambda info: info[0] != socket.AF_INET)
+        return family, address[:2]
+
+    async def query(self, host: str, port: int = 19132, retries: int = 1,
+                    retry_interval: float = 0.5) -> Dict:
+        """发送 Unconnected Ping 并等待响应（由调用方控制总超时），丢包时重发"""
+        family, address = await self._address(host, port)
+        transport = self.transports.get(family) or await self.open(family)
+        loop = asyncio.get_running_loop()
+
+        token = next(self._tokens)
+        future = loop.create_future()
+        self._pending[token] = (address, future)
+        try:
+            packet = pack_ping(token, self.client_guid)
+            for attempt in range(retries + 1):
+                start = time.perf_counter()
+                transport.sendto(packet, address)
+                done, _ = await asyncio.wait({future}, timeout=retry_interval if attempt < retries else None)
+                if done:
+                    break
+            latency = (time.perf_counter() - start) * 1000
+            info = parse_pong_text(future.result())
+            info["latency"] = latency
+            return info
+        finally:
+            del self._pending[token]
+            future.cancel()
+
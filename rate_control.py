@@ -0,0 +1,128 @@
+import asyncio
+import bisect
+import time
+from typing import Dict, Optional
+
+from telemetry import Telemetry, bucket_percentile
+
+
+class TokenBucket:
+    """令牌桶限速器：平均每秒发出 rate 个探测，最多允许 burst 个突发
+
+    令牌不足时调用方预支令牌并睡眠到轮到自己为止，不需要为每个令牌单独调度。
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        if rate <= 0:
+            raise ValueError("速率必须大于0")
+        self.rate = rate
+        # 默认允许约 50ms 的突发，至少一个令牌
+        self.burst = burst or max(1.0, rate / 20)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        if self.tokens < 0:
+            await asyncio.sleep(-self.tokens / self.rate)
+
+
+class AIMDController:
+    """根据最近一个周期的超时率和往返时间调节并发数和超时时间
+
+    - 状态查询超时率超过 timeout_ratio，或端口预检 p90 往返时间超过基线的 rtt_factor 倍时，
+      认为链路拥塞，并发数乘以 decrease（乘性减）；
+    - 否则并发数增加 increase（加性增）；
+    - 两个阶段的超时时间跟随各自的 p99 往返时间，限制在 [min_timeout, 初始超时] 之间；
+      超时的尝试只知道往返时间不短于当前超时，按当前超时计入，超时率超过 1% 时超时时间会重新变长。
+    """
+
+    MIN_SAMPLES = 20  # 一个周期内样本太少时不做判断
+
+    def __init__(self, telemetry: Telemetry, min_concurrency: int = 50, max_concurrency: int = 8000,
+                 increase: int = 50, decrease: float = 0.7, timeout_ratio: float = 0.2,
+                 rtt_factor: float = 3.0, min_timeout: float = 0.2, timeout_multiplier: float = 2.0):
+        self.telemetry = telemetry
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.increase = increase
+        self.decrease = decrease
+        self.timeout_ratio = timeout_ratio
+        self.rtt_factor = rtt_factor
+        self.min_timeout = min_timeout
+        self.timeout_multiplier = timeout_multiplier
+        self.baseline_rtt = None  # 观察到的最小端口预检 p50 往返时间
+        self._last_counters = {}
+        self._last_counts = {}
+
+    def _delta_counter(self, name: str) -> int:
+        value = self.telemetry.counters[name]
+        delta = value - self._last_counters.get(name, 0)
+        self._last_counters[name] = value
+        return delta
+
+    def _window(self, stage: str):
+        """返回某阶段本周期内的 (桶上界, 各桶计数)"""
+        histogram = self.telemetry.histogram(stage)
+        last = self._last_counts.get(stage, [0] * len(histogram.counts))
+        self._last_counts[stage] = list(histogram.counts)
+        return histogram.buckets, [a - b for a, b in zip(histogram.counts, last)]
+
+    def _adapt_timeout(self, buckets, counts, timed_out: int, current: float, ceiling: float) -> float:
+        counts = list(counts)
+        counts[bisect.bisect_left(buckets, current)] += timed_out
+        if sum(counts) < self.MIN_SAMPLES:
+            return current
+        p99 = bucket_percentile(buckets, counts, 0.99)
+        return round(max(self.min_timeout, min(ceiling, p99 * self.timeout_multiplier)), 3)
+
+    def step(self, concurrency: int, connect_timeout: float, status_timeout: float,
+             connect_ceiling: float, status_ceiling: float) -> Dict:
+        """根据上一个周期的统计给出新的并发数和超时时间"""
+        timeouts = self._delta_counter("timeouts")
+        connect_timeouts = self._delta_counter("connect_timeouts")
+        failures = self._delta_counter("protocol_errors") + self._delta_counter("errors")
+        status_buckets, status_counts = self._window("status")
+        connect_buckets, connect_counts = self._window("connect")
+
+        status_attempts = sum(status_counts) + timeouts + failures
+        ratio = timeouts / status_attempts if status_attempts >= self.MIN_SAMPLES else None
+        connect_p50 = connect_p90 = None
+        if sum(connect_counts) >= self.MIN_SAMPLES:
+            connect_p50 = bucket_percentile(connect_buckets, connect_counts, 0.5)
+            connect_p90 = bucket_percentile(connect_buckets, connect_counts, 0.9)
+            if self.baseline_rtt is None or connect_p50 < self.baseline_rtt:
+                self.baseline_rtt = connect_p50
+
+        if ratio is not None and ratio > self.timeout_ratio:
+            action, reason = "decrease", f"状态查询超时率 {ratio:.0%}"
+        elif connect_p90 is not None and connect_p90 > self.baseline_rtt * self.rtt_factor:
+            action, reason = "decrease", f"连接 p90 {connect_p90 * 1000:.0f}ms 超过基线 {self.baseline_rtt * 1000:.0f}ms 的 {self.rtt_factor:g} 倍"
+        else:
+            action, reason = "increase", "未发现拥塞"
+
+        if action == "decrease":
+            new_concurrency = max(self.min_concurrency, int(concurrency * self.decrease))
+        else:
+            new_concurrency = min(self.max_concurrency, concurrency + self.increase)
+        if new_concurrency == concurrency:
+            action = "hold"
+        self.telemetry.incr(f"aimd_{action}")
+
+        decision = {
+            "time": time.time(),
+            "action": action,
+            "reason": reason,
+            "concurrency": new_concurrency,
+            "connect_timeout": self._adapt_timeout(connect_buckets, connect_counts, connect_timeouts,
+                                                   connect_timeout, connect_ceiling),
+            "status_timeout": self._adapt_timeout(status_buckets, status_counts, timeouts,
+                                                  status_timeout, status_ceiling),
+            "status_timeout_ratio": ratio,
+            "connect_p90": connect_p90,
+        }
+        self.telemetry.record_decision(decision)
+        return decision
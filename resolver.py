@@ -0,0 +1,350 @@
+import asyncio
+import random
+import socket
+import struct
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from scan_engine import ScanEngine
+from targets import is_ip_literal
+
+TYPE_A = 1
+TYPE_CNAME = 5
+TYPE_AAAA = 28
+TYPE_SRV = 33
+CLASS_IN = 1
+
+RCODE_OK = 0
+RCODE_NXDOMAIN = 3
+
+# Minecraft 客户端查询的 SRV 记录前缀
+SRV_PREFIX = "_minecraft._tcp."
+
+_header = struct.Struct(">HHHHHH")
+_question_tail = struct.Struct(">HH")
+_answer_header = struct.Struct(">HHIH")
+_srv = struct.Struct(">HHH")
+
+Endpoint = Tuple[str, int]
+
+
+class DNSError(Exception):
+    """DNS 查询失败（服务器错误或响应格式无效）"""
+
+
+def pack_name(name: str) -> bytes:
+    out = bytearray()
+    for label in name.rstrip(".").split("."):
+        try:
+            data = label.encode("idna") if label else b""
+        except UnicodeError:
+            raise DNSError(f"域名无效: {name}")
+        if not data or len(data) > 63:
+            raise DNSError(f"域名无效: {name}")
+        out.append(len(data))
+        out += data
+    return bytes(out) + b"\x00"
+
+
+def unpack_name(data: bytes, offset: int) -> Tuple[str, int]:
+    """解码（可能经过压缩的）域名，返回 (域名, 新偏移)"""
+    labels = []
+    end = None
+    for _ in range(128):  # 防止恶意的循环压缩指针
+        if offset >= len(data):
+            raise DNSError("域名数据不完整")
+        length = data[offset]
+        if length & 0xC0 == 0xC0:
+            if offset + 1 >= len(data):
+                raise DNSError("域名数据不完整")
+            if end is None:
+                end = offset + 2
+            offset = ((length & 0x3F) << 8) | data[offset + 1]
+            continue
+        offset += 1
+        if length == 0:
+            return ".".join(labels).lower(), end if end is not None else offset
+        labels.append(data[offset:offset + length].decode("ascii", "replace"))
+        offset += length
+    raise DNSError("域名压缩指针过多")
+
+
+def pack_query(query_id: int, name: str, rtype: int) -> bytes:
+    """递归查询请求（RD=1）"""
+    return _header.pack(query_id, 0x0100, 1, 0, 0, 0) + pack_name(name) + _question_tail.pack(rtype, CLASS_IN)
+
+
+def pack_record(rtype: int, value) -> bytes:
+    if rtype == TYPE_A:
+        return socket.inet_aton(value)
+    if rtype == TYPE_AAAA:
+        return socket.inet_pton(socket.AF_INET6, value)
+    if rtype == TYPE_SRV:
+        priority, weight, port, target = value
+        return _srv.pack(priority, weight, port) + pack_name(target)
+    return pack_name(value)
+
+
+def pack_response(query_id: int, name: str, rtype: int, answers: Iterable[Tuple[str, int, int, object]],
+                  rcode: int = RCODE_OK) -> bytes:
+    """构造响应，answers 为 [(所有者域名, 类型, TTL, 值), ...]（测试用的假 DNS 服务器使用）"""
+    answers = list(answers)
+    body = bytearray(pack_name(name) + _question_tail.pack(rtype, CLASS_IN))
+    for owner, answer_type, ttl, value in answers:
+        rdata = pack_record(answer_type, value)
+        body += pack_name(owner) + _answer_header.pack(answer_type, CLASS_IN, ttl, len(rdata)) + rdata
+    return _header.pack(query_id, 0x8180 | rcode, 1, len(answers), 0, 0) + bytes(body)
+
+
+def unpack_response(data: bytes) -> Tuple[int, int, str, List[Tuple[int, int, object]]]:
+    """解析响应，返回 (请求编号, 响应码, 问题域名, [(类型, TTL, 值), ...])"""
+    if len(data) < _header.size:
+        raise DNSError("响应长度不足")
+    query_id, flags, qdcount, ancount, _, _ = _header.unpack_from(data)
+    if not flags & 0x8000:
+        raise DNSError("不是DNS响应")
+    try:
+        offset = _header.size
+        question = ""
+        for _ in range(qdcount):
+            question, offset = unpack_name(data, offset)
+            offset += _question_tail.size
+        answers = []
+        for _ in range(ancount):
+            _, offset = unpack_name(data, offset)
+            rtype, _, ttl, length = _answer_header.unpack_from(data, offset)
+            offset += _answer_header.size
+            rdata = data[offset:offset + length]
+            if len(rdata) != length:
+                raise DNSError("记录数据不完整")
+            if rtype == TYPE_A and length == 4:
+                answers.append((rtype, ttl, socket.inet_ntoa(rdata)))
+            elif rtype == TYPE_AAAA and length == 16:
+                answers.append((rtype, ttl, socket.inet_ntop(socket.AF_INET6, rdata)))
+            elif rtype == TYPE_SRV and length > _srv.size:
+                priority, weight, port = _srv.unpack_from(rdata)
+                answers.append((rtype, ttl, (priority, weight, port, unpack_name(data, offset + _srv.size)[0])))
+            elif rtype == TYPE_CNAME:
+                answers.append((rtype, ttl, unpack_name(data, offset)[0]))
+            offset += length
+    except struct.error:
+        raise DNSError("响应格式无效")
+    return query_id, flags & 0x0F, question, answers
+
+
+def read_nameservers(path: str = "/etc/resolv.conf") -> List[str]:
+    """读取系统配置的DNS服务器，读取失败时使用本机"""
+    servers = []
+    try:
+        with open(path, "r") as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) >= 2 and fields[0] == "nameserver":
+                    servers.append(fields[1].split("%")[0])
+    except OSError:
+        pass
+    return servers or ["127.0.0.1"]
+
+
+def parse_server_address(text: str) -> Tuple[str, Optional[int]]:
+    """解析 "域名"、"域名:端口"、"[IPv6]:端口" 或 IP，没有写端口时返回 None"""
+    text = text.strip()
+    if text.startswith("["):
+        host, _, rest = text[1:].partition("]")
+        port = rest[1:] if rest.startswith(":") else ""
+    elif text.count(":") == 1:
+        host, port = text.split(":")
+    else:
+        host, port = text, ""
+    if not host:
+        raise ValueError(f"地址无效: {text}")
+    if port and not (port.isdigit() and 1 <= int(port) <= 65535):
+        raise ValueError(f"端口无效: {text}")
+    return host.rstrip(".").lower() if not is_ip_literal(host) else host, int(port) if port else None
+
+
+class _DNSProtocol(asyncio.DatagramProtocol):
+    def __init__(self, resolver: "Resolver"):
+        self.resolver = resolver
+
+    def datagram_received(self, data: bytes, addr):
+        self.resolver._received(data, addr)
+
+    def error_received(self, exc: Exception):
+        pass
+
+
+class Resolver:
+    """批量异步DNS解析器
+
+    - 所有查询共用每个地址族一个 UDP 套接字，按请求编号分发响应；
+    - 结果按记录的 TTL 缓存（不存在的域名缓存 negative_ttl 秒），同一个名字同时只会查询一次；
+    - 同时进行的查询数不超过 concurrency。
+    """
+
+    def __init__(self, nameservers: Optional[List[str]] = None, concurrency: int = 256,
+                 timeout: float = 2.0, retries: int = 2, negative_ttl: float = 60,
+                 max_ttl: float = 86400, telemetry=None):
+        self.nameservers = [self._server_address(s) for s in (nameservers or read_nameservers())]
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.retries = retries
+        self.negative_ttl = negative_ttl
+        self.max_ttl = max_ttl
+        self.telemetry = telemetry
+        self.cache = {}  # (域名, 类型) -> (过期时间, [(类型, TTL, 值), ...])
+        self._inflight = {}  # (域名, 类型) -> 正在进行的查询
+        self._pending = {}  # 请求编号 -> (DNS服务器地址, 问题域名, Future)
+        self._transports = {}  # 地址族 -> 套接字
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._open_lock = asyncio.Lock()
+
+    @staticmethod
+    def _server_address(server: str) -> Tuple[str, int]:
+        host, port = parse_server_address(server)
+        return host, port or 53
+
+    def _incr(self, name: str):
+        if self.telemetry:
+            self.telemetry.incr(name)
+
+    async def _transport(self, host: str):
+        family = socket.AF_INET6 if ":" in host else socket.AF_INET
+        transport = self._transports.get(family)
+        if transport is None:
+            async with self._open_lock:
+                transport = self._transports.get(family)
+                if transport is None:
+                    loop = asyncio.get_running_loop()
+                    transport, _ = await loop.create_datagram_endpoint(
+                        lambda: _DNSProtocol(self), family=family,
+                        local_addr=("::" if family == socket.AF_INET6 else "0.0.0.0", 0))
+                    self._transports[family] = transport
+        return transport
+
+    def close(self):
+        for transport in self._transports.values():
+            transport.close()
+        self._transports = {}
+
+    def _received(self, data: bytes, addr):
+        try:
+            response = unpack_response(data)
+        except DNSError:
+            return
+        pending = self._pending.get(response[0])
+        # 请求编号只有16位，同时核对来源地址和问题域名
+        if pending is None or pending[0] != addr[:2] or pending[1] != response[2] or pending[2].done():
+            return
+        pending[2].set_result(response)
+
+    async def _exchange(self, name: str, rtype: int) -> Tuple[int, List]:
+        """向DNS服务器发送查询，超时后换下一个服务器重发"""
+        loop = asyncio.get_running_loop()
+        query_id = random.getrandbits(16)
+        while query_id in self._pending:
+            query_id = random.getrandbits(16)
+        future = loop.create_future()
+        try:
+            for attempt in range(self.retries + 1):
+                server = self.nameservers[attempt % len(self.nameservers)]
+                self._pending[query_id] = (server, name, future)
+                transport = await self._transport(server[0])
+                transport.sendto(pack_query(query_id, name, rtype), server)
+                done, _ = await asyncio.wait({future}, timeout=self.timeout)
+                if done:
+                    _, rcode, _, answers = future.result()
+                    return rcode, answers
+            raise asyncio.TimeoutError()
+        finally:
+            self._pending.pop(query_id, None)
+            future.cancel()
+
+    async def _lookup(self, key: Tuple[str, int]) -> List:
+        name, rtype = key
+        async with self._semaphore:
+            self._incr("dns_queries")
+            start = time.perf_counter()
+            try:
+                rcode, answers = await self._exchange(name, rtype)
+            except asyncio.TimeoutError:
+                self._incr("dns_timeouts")
+                raise DNSError(f"{name} 查询超时")
+            if self.telemetry:
+                self.telemetry.observe("dns", time.perf_counter() - start)
+        if rcode not in (RCODE_OK, RCODE_NXDOMAIN):
+            self._incr("dns_errors")
+            raise DNSError(f"{name} 查询失败（响应码 {rcode}）")
+        # 响应中可能先是 CNAME 链，整条链的最小 TTL 决定缓存时间
+        records = [value for answer_type, _, value in answers if answer_type == rtype]
+        ttl = min((ttl for _, ttl, _ in answers), default=None) if records else self.negative_ttl
+        self.cache[key] = (time.monotonic() + min(ttl, self.max_ttl), records)
+        return records
+
+    async def lookup(self, name: str, rtype: int) -> List:
+        """查询一种记录，返回记录值列表（域名不存在或没有该类型记录时为空）"""
+        key = (name.rstrip(".").lower(), rtype)
+        cached = self.cache.get(key)
+        if cached is not None and cached[0] > time.monotonic():
+            self._incr("dns_cache_hits")
+            return cached[1]
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._inflight[key] = asyncio.ensure_future(self._lookup(key))
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self._incr("dns_cache_hits")
+        return await asyncio.shield(task)
+
+    async def resolve_host(self, host: str) -> Optional[str]:
+        """域名解析为一个IP地址，优先使用 IPv4"""
+        if is_ip_literal(host):
+            return host
+        for rtype in (TYPE_A, TYPE_AAAA):
+            addresses = await self.lookup(host, rtype)
+            if addresses:
+                return addresses[0]
+        return None
+
+    async def resolve(self, host: str, port: Optional[int] = None,
+                      default_port: int = 25565) -> Optional[Endpoint]:
+        """按 Minecraft 客户端的规则解析服务器地址
+
+        没有指定端口的域名先查询 _minecraft._tcp SRV 记录（取优先级最高、权重最大的一条），
+        返回 (IP, 端口)，无法解析时返回 None。
+        """
+        if port is None and not is_ip_literal(host):
+            records = await self.lookup(SRV_PREFIX + host, TYPE_SRV)
+            if records:
+                _, _, port, target = min(records, key=lambda r: (r[0], -r[1]))
+                host = target
+        address = await self.resolve_host(host)
+        if address is None:
+            return None
+        return address, port or default_port
+
+    async def resolve_all(self, servers: Iterable[Tuple[str, Optional[int]]],
+                          default_port: int = 25565) -> Tuple[Dict[Endpoint, List[str]], List[str]]:
+        """并发解析一批 (主机, 端口或None)
+
+        返回 ({(IP, 端口): [解析到这里的原始主机名, ...]}, [解析失败的主机名])，
+        多个名字指向同一个地址时只保留一个目标。
+        """
+        endpoints = {}
+        failed = []
+
+        async def collect(host: str, port: Optional[int]):
+            try:
+                endpoint = await self.resolve(host, port, default_port)
+            except DNSError:
+                endpoint = None
+            if endpoint is None:
+                self._incr("dns_unresolved")
+                failed.append(host)
+                return
+            names = endpoints.setdefault(endpoint, [])
+            if host not in names:
+                names.append(host)
+
+        await ScanEngine(collect, self.concurrency).run(servers)
+        return endpoints, failed
@@ -0,0 +1,307 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+_FLUSH = object()
+_STOP = object()
+
+
+class ResultSinkError(Exception):
+    """结果文件无法打开或写入"""
+
+
+class ResultSink:
+    """结果写入器基类：扫描协程只负责入队，真正的磁盘写入在后台线程完成
+
+    文件在构造时打开，打不开时直接抛出 ResultSinkError；后台线程写入时出现的错误
+    在下一次 flush() 或 close() 时抛出（每个错误只抛出一次）。
+    """
+
+    def __init__(self, path: str, batch_size: int = 500, fsync_interval: float = 1.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.fsync_interval = fsync_interval
+        self.written = 0
+        self.error = None
+        try:
+            self._open()
+        except (OSError, sqlite3.Error) as e:
+            raise ResultSinkError(f"无法打开结果文件 {path}: {e}") from e
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=f"sink-{os.path.basename(path)}", daemon=True)
+        self._thread.start()
+
+    def write(self, record: Dict):
+        """追加一条结果（不阻塞事件循环）"""
+        self._queue.put(record)
+
+    def flush(self):
+        """请求后台线程尽快把缓冲区写入磁盘并 fsync；之前的写入出错时抛出 ResultSinkError"""
+        self._raise_error()
+        self._queue.put(_FLUSH)
+
+    def close(self):
+        """写完所有剩余结果并关闭文件；写入出错时抛出 ResultSinkError"""
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+        self._raise_error()
+
+    def _raise_error(self):
+        error, self.error = self.error, None
+        if error is not None:
+            raise ResultSinkError(f"写入结果文件 {self.path} 出错: {error}") from error
+
+    def _run(self):
+        last_sync = time.time()
+        dirty = False
+        try:
+            while True:
+                try:
+                    item = self._queue.get(timeout=self.fsync_interval)
+                except queue.Empty:
+                    item = _FLUSH if dirty else None
+                batch = []
+                force_sync = stop = False
+                # 尽量把队列中已有的结果合并成一批写入
+                while item is not None:
+                    if item is _STOP:
+                        stop = True
+                    elif item is _FLUSH:
+                        force_sync = True
+                    else:
+                        batch.append(item)
+                    if stop or len(batch) >= self.batch_size:
+                        break
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+
+                if batch:
+                    try:
+                        self._write_batch(batch)
+                        self.written += len(batch)
+                        dirty = True
+                    except Exception as e:
+                        self.error = e
+                now = time.time()
+                if dirty and (force_sync or stop or now - last_sync >= self.fsync_interval):
+                    try:
+                        self._sync()
+                    except Exception as e:
+                        self.error = e
+                    last_sync = now
+                    dirty = False
+                if stop:
+                    return
+        finally:
+            try:
+                self._close()
+            except Exception as e:
+                self.error = self.error or e
+
+    def _open(self):
+        raise NotImplementedError
+
+    def _write_batch(self, records: List[Dict]):
+        raise NotImplementedError
+
+    def _sync(self):
+        pass
+
+    def _close(self):
+        pass
+
+
+class JsonlSink(ResultSink):
+    """JSON Lines 格式：每行一条结果，只追加不重写"""
+
+    def _open(self):
+        self._file = open(self.path, "a+", encoding="utf-8")
+        # 上次崩溃留下的半行要先补上换行，否则会和新写入的第一条结果连在一起
+        if self._file.tell() > 0:
+            self._file.seek(self._file.tell() - 1)
+            if self._file.read(1) != "\n":
+                self._file.write("\n")
+
+    def _write_batch(self, records: List[Dict]):
+        self._file.write("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records))
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def _close(self):
+        self._file.close()
+
+
+class SqliteSink(ResultSink):
+    """SQLite 格式：按 (host, port) 去重，重复发现时更新为最新结果"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS servers (
+            host TEXT NOT NULL,
+            port INTEGER NOT NULL,
+            version TEXT,
+            protocol INTEGER,
+            players_online INTEGER,
+            players_max INTEGER,
+            timestamp TEXT,
+            data TEXT NOT NULL,
+            PRIMARY KEY (host, port)
+        )
+    """
+    UPSERT = """
+        INSERT INTO servers (host, port, version, protocol, players_online, players_max, timestamp, data)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (host, port) DO UPDATE SET
+            version = excluded.version,
+            protocol = excluded.protocol,
+            players_online = excluded.players_online,
+            players_max = excluded.players_max,
+            timestamp = excluded.timestamp,
+            data = excluded.data
+    """
+
+    def _open(self):
+        # 在调用方线程中打开，之后只由后台写入线程使用
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(self.SCHEMA)
+        self._db.commit()
+
+    @staticmethod
+    def row(record: Dict) -> tuple:
+        r = record
+        return (r["host"], r["port"], r.get("version"), r.get("protocol"), r.get("players_online"),
+                r.get("players_max"), r.get("timestamp"), json.dumps(r, ensure_ascii=False))
+
+    def _write_batch(self, records: List[Dict]):
+        with self._db:
+            self._db.executemany(self.UPSERT, [self.row(r) for r in records])
+
+    def _close(self):
+        self._db.close()
+
+
+SQLITE_SUFFIXES = (".db", ".sqlite", ".sqlite3")
+
+
+def open_sink(path: str) -> Optional[ResultSink]:
+    """按文件扩展名创建结果写入器；.json 使用旧的整体保存方式，返回 None"""
+    lower = path.lower()
+    if lower.endswith(".json"):
+        return None
+    if lower.endswith(SQLITE_SUFFIXES):
+        return SqliteSink(path)
+    return JsonlSink(path)
+
+
+def iter_results(path: str) -> Iterator[Dict]:
+    """读取结果文件（.json / .jsonl / SQLite），同一 (host, port) 只保留最新一条"""
+    lower = path.lower()
+    if lower.endswith(SQLITE_SUFFIXES):
+        db = sqlite3.connect(path)
+        try:
+            for (data,) in db.execute("SELECT data FROM servers"):
+                yield json.loads(data)
+        finally:
+            db.close()
+        return
+
+    if lower.endswith(".json"):
+        with open(path, "r", encoding="utf-8") as f:
+            results = json.load(f)
+        yield from (results if isinstance(results, list) else [])
+        return
+
+    latest = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # 进程崩溃时最后一行可能只写了一半
+                continue
+            latest[(record["host"], record["port"])] = record
+    yield from latest.values()
+
+
+def results_position(path: str):
+    """结果文件当前读到的位置：JSON Lines 为文件长度，SQLite 为最新的时间戳；
+    整体保存的 .json 每次都会重写，返回 None（不支持增量读取）"""
+    lower = path.lower()
+    if lower.endswith(".json"):
+        return None
+    if lower.endswith(SQLITE_SUFFIXES):
+        db = sqlite3.connect(path)
+        try:
+            return db.execute("SELECT MAX(timestamp) FROM servers").fetchone()[0] or ""
+        finally:
+            db.close()
+    return os.path.getsize(path)
+
+
+def tail_results(path: str, position) -> Tuple[List[Dict], object]:
+    """读取 position 之后新增或更新的结果，返回 (结果列表, 新的位置)
+
+    JSON Lines 只读取完整的行，写了一半的最后一行留到下次；SQLite 按时间戳读取（包括更新过的服务器）。
+    """
+    if path.lower().endswith(SQLITE_SUFFIXES):
+        db = sqlite3.connect(path)
+        try:
+            rows = db.execute("SELECT data, timestamp FROM servers WHERE timestamp >= ? ORDER BY timestamp",
+                              (position,)).fetchall()
+        finally:
+            db.close()
+        return [json.loads(data) for data, _ in rows], (rows[-1][1] if rows else position)
+
+    with open(path, "rb") as f:
+        f.seek(position)
+        data = f.read()
+    end = data.rfind(b"\n") + 1
+    records = []
+    for line in data[:end].splitlines():
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            continue
+    return records, position + end
+
+
+def rewrite_results(path: str, records: List[Dict]):
+    """用 records 覆盖结果文件（用于批量修改已有结果），文本格式通过临时文件原子替换"""
+    if path.lower().endswith(SQLITE_SUFFIXES):
+        db = sqlite3.connect(path)
+        try:
+            db.execute(SqliteSink.SCHEMA)
+            with db:
+                db.executemany(SqliteSink.UPSERT, [SqliteSink.row(r) for r in records])
+        finally:
+            db.close()
+        return
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        if path.lower().endswith(".json"):
+            json.dump(records, f, ensure_ascii=False, indent=4)
+        else:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def load_results(path: str) -> List[Dict]:
+    """读取结果文件，文件不存在或损坏时返回空列表"""
+    try:
+        return list(iter_results(path))
+    except (OSError, ValueError, sqlite3.Error):
+        return []
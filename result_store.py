@@ -0,0 +1,504 @@
+import base64
+import bisect
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict, defaultdict
+from collections.abc import Mapping
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from geo import UNKNOWN_COUNTRY
+from profiling import profiler
+from result_sink import iter_results, results_position, tail_results
+from result_table import MISSING, ResultTable, column_sum, group_counts, group_sums
+from search_index import SearchIndex, parse_query
+
+# 支持的排序字段：返回 行号 -> 排序键 的函数
+SORT_KEYS = {
+    "players": lambda t: t.players_online.__getitem__,
+    "max_players": lambda t: t.players_max.__getitem__,
+    # 没有延迟的服务器按 0 排序
+    "latency": lambda t: lambda row: t.latency[row] if t.latency[row] == t.latency[row] else 0,
+    "timestamp": lambda t: t.timestamp.__getitem__,
+    "host": lambda t: lambda row: (t.hosts.get(row, ""), t.ip[row], t.port[row]),
+}
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+
+class InvalidCursor(ValueError):
+    """分页游标对应的数据已经更新"""
+
+
+class CountryGroups(Mapping):
+    """按国家分组的服务器：访问某个国家时才还原该国家的结果字典，不长期占用内存"""
+
+    def __init__(self, table: ResultTable, rows: Dict[str, array]):
+        self.table = table
+        self.rows = rows
+
+    def __getitem__(self, code: str) -> List[Dict]:
+        return [self.table.record(row) for row in self.rows[code]]
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+
+class ResultSnapshot:
+    """某一版本结果文件的只读快照，加载时一次性建好聚合数据和索引
+
+    结果按列保存在 ResultTable 中，索引都是行号数组，统计信息直接在列上计算。
+    """
+
+    def __init__(self, servers: Iterable[Dict], version: str):
+        self.version = version
+        self.table = table = ResultTable()
+        self.search_index = SearchIndex()  # 结果逐条加入时同时建立倒排索引
+        for server in servers:
+            if not server.get("country"):
+                # 没有国家信息的结果归为未知
+                server = dict(server, country=UNKNOWN_COUNTRY)
+            self.search_index.add(len(table), server)
+            table.append(server)
+        rows = len(table)
+
+        codes = table.country_codes.values
+        self.by_country = {codes[country]: group for country, group in table.group_rows(table.country).items()}
+        self.by_version = defaultdict(lambda: array("I"))  # 版本名 -> 服务器序号
+        for version_id, group in table.group_rows(table.version).items():
+            self.by_version[str(table.versions.values[version_id] or "")].extend(group)
+        self.by_version = dict(self.by_version)
+        self.servers_by_country = CountryGroups(table, self.by_country)
+
+        # 按在线人数升序排列的序号，用于 min_players 过滤
+        self.players_order = array("I", sorted(range(rows), key=table.players_online.__getitem__))
+        self.players_values = array("i", (max(0, table.players_online[i]) for i in self.players_order))
+        # 各排序字段的全量排序结果和每个服务器的名次
+        self.orders = {}
+        self.ranks = {}
+        for key, getter in SORT_KEYS.items():
+            self.orders[key] = array("I", sorted(range(rows), key=getter(table)))
+            self.ranks[key] = self._rank(self.orders[key])
+
+        size = len(codes)
+        counts = group_counts(table.country, size)
+        players = group_sums(table.country, table.players_online, size)
+        max_players = group_sums(table.country, table.players_max, size)
+        self.stats = {
+            "total_servers": rows,
+            "total_countries": len(self.by_country),
+            "total_players": column_sum(table.players_online),
+            "max_players": column_sum(table.players_max),
+            "countries": {
+                codes[country]: {
+                    "name": table.countries[country]["name"],
+                    "name_zh": table.countries[country]["name_zh"],
+                    "count": counts[country],
+                    "players": players[country],
+                    "max_players": max_players[country],
+                }
+                for country in range(1, size) if counts[country]
+            },
+        }
+        self._query_cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.rendered = {}  # 按页面缓存已经生成的响应内容（首页、/api/servers 全量响应）
+        self.generation = 0  # 并入新结果的次数，与 version 一起组成 ETag
+        self._rows = None  # 服务器去重键 -> 行号，第一次并入新结果时建立
+
+    @property
+    def revision(self) -> str:
+        """当前内容的版本（ETag 和分页游标使用）：结果文件重新加载时 version 变化，并入新结果时 generation 变化"""
+        return f"{self.version}.{self.generation}"
+
+    @staticmethod
+    def _rank(order: array) -> array:
+        rank = array("I", bytes(order.itemsize * len(order)))
+        for position, i in enumerate(order):
+            rank[i] = position
+        return rank
+
+    def _count(self, stats: Dict, row: int, sign: int):
+        """把第 row 行计入（sign=1）或移出（sign=-1）统计信息"""
+        table = self.table
+        players = table.players_online[row]
+        players = 0 if players == MISSING else players
+        max_players = table.players_max[row]
+        max_players = 0 if max_players == MISSING else max_players
+        stats["total_servers"] += sign
+        stats["total_players"] += sign * players
+        stats["max_players"] += sign * max_players
+        country = table.country[row]
+        code = table.country_codes.values[country]
+        entry = stats["countries"].get(code)
+        if entry is None:
+            entry = stats["countries"][code] = {
+                "name": table.countries[country]["name"],
+                "name_zh": table.countries[country]["name_zh"],
+                "count": 0, "players": 0, "max_players": 0,
+            }
+        entry["count"] += sign
+        entry["players"] += sign * players
+        entry["max_players"] += sign * max_players
+        if not entry["count"]:
+            del stats["countries"][code]
+        stats["total_countries"] = len(stats["countries"])
+
+    @staticmethod
+    def _insort(order: array, row: int, key: Callable):
+        """按 (排序键, 行号) 把 row 插入已排序的 order，与全量稳定排序的结果一致"""
+        target = (key(row), row)
+        low, high = 0, len(order)
+        while low < high:
+            middle = (low + high) // 2
+            if (key(order[middle]), order[middle]) < target:
+                low = middle + 1
+            else:
+                high = middle
+        order.insert(low, row)
+        return low
+
+    def fold(self, records: Iterable[Dict] = (), updates: Iterable[Dict] = ()) -> Dict:
+        """把新的结果并入快照，增量更新分组、排序、统计信息和搜索索引，不重新加载全部结果
+
+        records 是完整的结果（实时事件或结果文件新增的部分），同一服务器已经存在时覆盖该行，
+        与现有内容相同的跳过；updates 只包含变化的字段（例如监控模式的在线人数），只用于已有的服务器。
+        返回 {"added": [...], "updated": [...]}。排序、统计信息和分组都先在副本上修改再替换
+        （每次合并中第一次修改某个分组时复制它的行号数组），读取快照的请求不需要加锁；
+        只有被覆盖的那一行在覆盖过程中可能读到新旧混合的字段。
+        """
+        table = self.table
+        added, updated = [], []
+        changes = [(record, False) for record in records] + [(record, True) for record in updates]
+        if not changes:
+            return {"added": added, "updated": updated}
+        with self._lock:
+            if self._rows is None:
+                self._rows = {table.key(row): row for row in range(len(table))}
+            rows = self._rows
+            stats = dict(self.stats, countries={code: dict(entry) for code, entry in self.stats["countries"].items()})
+            groups = {"country": self.by_country, "version": self.by_version}
+            copied = set()  # 本次合并中已经复制过的 (字段, 分组名)；值为字段名时表示字典已复制
+
+            def writable(field: str, name: str) -> array:
+                """可以修改的分组行号数组：第一次修改时连同所在的字典一起复制，读者手里的旧数组不变"""
+                if field not in copied:
+                    groups[field] = dict(groups[field])
+                    copied.add(field)
+                if (field, name) not in copied:
+                    groups[field][name] = array("I", groups[field].get(name, ()))
+                    copied.add((field, name))
+                return groups[field][name]
+            orders = {key: array("I", order) for key, order in self.orders.items()}
+            players_order, players_values = array("I", self.players_order), array("i", self.players_values)
+            getters = {key: getter(table) for key, getter in SORT_KEYS.items()}
+
+            def group_names(row: int) -> Dict[str, str]:
+                return {"country": table.country_codes.values[table.country[row]],
+                        "version": str(table.versions.values[table.version[row]] or "")}
+
+            for record, partial in changes:
+                key = ResultTable.record_key(record)
+                row = rows.get(key)
+                if partial:
+                    if row is None:
+                        continue
+                    record = dict(table.record(row), **record)
+                if not record.get("country"):
+                    record = dict(record, country=UNKNOWN_COUNTRY)
+                if row is not None and table.matches(row, record):
+                    continue
+
+                if row is None:
+                    row = rows[key] = len(table)
+                    table.append(record)
+                    self.search_index.add(row, record)
+                    old_names = {}
+                    added.append(record)
+                else:
+                    # 先把旧内容移出统计信息和排序，覆盖后再按新内容加入
+                    old = table.record(row)
+                    old_names = group_names(row)
+                    self._count(stats, row, -1)
+                    for order in orders.values():
+                        order.remove(row)
+                    position = players_order.index(row)
+                    del players_order[position]
+                    del players_values[position]
+                    table.update(row, record)
+                    self.search_index.update(row, old, record)
+                    updated.append(record)
+
+                self._count(stats, row, 1)
+                for key_name, order in orders.items():
+                    self._insort(order, row, getters[key_name])
+                position = self._insort(players_order, row, table.players_online.__getitem__)
+                players_values.insert(position, max(0, table.players_online[row]))
+                for field, name in group_names(row).items():
+                    if old_names.get(field) == name:
+                        continue
+                    if field in old_names:
+                        members = writable(field, old_names[field])
+                        members.remove(row)
+                        if not members:
+                            del groups[field][old_names[field]]
+                            copied.discard((field, old_names[field]))
+                    bisect.insort(writable(field, name), row)
+
+            if added or updated:
+                self.stats = stats
+                self.by_country, self.by_version = groups["country"], groups["version"]
+                self.servers_by_country = CountryGroups(table, self.by_country)
+                self.orders = orders
+                self.players_order, self.players_values = players_order, players_values
+                self.ranks = {}  # 分页排序时按需重新计算
+                self._query_cache.clear()
+                self.rendered = {}
+                self.generation += 1
+        return {"added": added, "updated": updated}
+
+    def servers_json(self) -> str:
+        """全部服务器（按国家分组）和统计信息的 JSON，逐个国家生成"""
+        groups = ", ".join(f"{json.dumps(code)}: {json.dumps(servers, ensure_ascii=False)}"
+                           for code, servers in self.servers_by_country.items())
+        return f'{{"stats": {json.dumps(self.stats, ensure_ascii=False)}, "servers": {{{groups}}}}}'
+
+    def _cached(self, cache_key: Tuple, build: Callable):
+        """查询结果缓存（便于连续翻页），最多保留 64 个查询"""
+        cache_key = (self.generation,) + cache_key
+        with self._lock:
+            cached = self._query_cache.get(cache_key)
+            if cached is not None:
+                self._query_cache.move_to_end(cache_key)
+                return cached
+        result = build()
+        with self._lock:
+            self._query_cache[cache_key] = result
+            if len(self._query_cache) > 64:
+                self._query_cache.popitem(last=False)
+        return result
+
+    def _sorted(self, candidates: Optional[set], sort: str, descending: bool):
+        """按排序字段排列候选序号；candidates 为 None 表示全部服务器"""
+        order = self.orders[sort]
+        if candidates is None:
+            selected = order
+        elif len(candidates) * 8 < len(order):
+            rank = self.ranks.get(sort)
+            if rank is None:
+                rank = self.ranks[sort] = self._rank(order)
+            selected = sorted(candidates, key=rank.__getitem__)
+        else:
+            selected = [i for i in order if i in candidates]
+        return selected[::-1] if descending else selected
+
+    def _page(self, selected, cursor: Optional[str], limit: int, sort: str, descending: bool) -> Dict:
+        limit = max(1, min(limit, MAX_LIMIT))
+        offset = self._seek(selected, cursor, sort, descending) if cursor else 0
+        page = selected[offset:offset + limit]
+        next_offset = offset + len(page)
+        next_cursor = None
+        if next_offset < len(selected):
+            last = page[-1]
+            next_cursor = self.encode_cursor(next_offset, SORT_KEYS[sort](self.table)(last), last)
+        return {
+            "total": len(selected),
+            "items": [self.table.record(i) for i in page],
+            "next_cursor": next_cursor,
+        }
+
+    def _seek(self, selected, cursor: str, sort: str, descending: bool) -> int:
+        """游标对应的位置：内容没有变化时直接使用游标中的位置，并入过新结果时按上一页最后一个服务器的
+        (排序键, 行号) 在当前排序中二分查找，新加入的服务器不会导致重复或遗漏已经翻过的部分"""
+        generation, offset, last_key, last_row = self.decode_cursor(cursor)
+        if generation == self.generation:
+            return offset
+        key = SORT_KEYS[sort](self.table)
+        target = (last_key, last_row)
+        low, high = 0, len(selected)
+        while low < high:
+            middle = (low + high) // 2
+            current = (key(selected[middle]), selected[middle])
+            if (current > target) if descending else (current < target):
+                low = middle + 1
+            else:
+                high = middle
+        # 跳过上一页的最后一个服务器本身（它的排序键没有变化时正好在 low 位置）
+        if low < len(selected) and selected[low] == last_row and key(last_row) == last_key:
+            low += 1
+        return low
+
+    def _select(self, country: Optional[str], version: Optional[str], min_players: Optional[int],
+                sort: str, descending: bool) -> List[int]:
+        """返回满足过滤条件、已排序的服务器序号"""
+        return self._cached((country, version, min_players, sort, descending),
+                            lambda: self._sorted(self._filter(country, version, min_players), sort, descending))
+
+    def _filter(self, country: Optional[str], version: Optional[str], min_players: Optional[int]) -> Optional[set]:
+        candidates = None
+        if country is not None:
+            candidates = set(self.by_country.get(country, ()))
+        if version is not None:
+            matched = self.by_version.get(version, ())
+            candidates = set(matched) if candidates is None else candidates.intersection(matched)
+        if min_players is not None:
+            start = bisect.bisect_left(self.players_values, min_players)
+            matched = self.players_order[start:]
+            candidates = set(matched) if candidates is None else candidates.intersection(matched)
+        return candidates
+
+    def query(self, country: Optional[str] = None, version: Optional[str] = None,
+              min_players: Optional[int] = None, sort: str = "players", order: str = "desc",
+              cursor: Optional[str] = None, limit: int = DEFAULT_LIMIT) -> Dict:
+        """分页查询服务器"""
+        if sort not in SORT_KEYS:
+            raise ValueError(f"不支持的排序字段: {sort}")
+        selected = self._select(country.upper() if country else None, version, min_players,
+                                sort, order != "asc")
+        return self._page(selected, cursor, limit, sort, order != "asc")
+
+    def search(self, q: str = "", filters: Optional[Dict[str, str]] = None, sort: str = "players",
+               order: str = "desc", cursor: Optional[str] = None, limit: int = DEFAULT_LIMIT) -> Dict:
+        """全文 / 分面搜索，返回分页结果和搜索结果的分面计数（语法见 search_index.parse_query）"""
+        if sort not in SORT_KEYS:
+            raise ValueError(f"不支持的排序字段: {sort}")
+        terms = parse_query(q, filters)
+        descending = order != "asc"
+
+        def build():
+            matched = self.search_index.match(terms)
+            return self._sorted(matched, sort, descending), self.search_index.facet_counts(matched)
+
+        selected, facets = self._cached(("search", tuple(sorted(terms)), sort, descending), build)
+        result = self._page(selected, cursor, limit, sort, descending)
+        result["facets"] = facets
+        return result
+
+    def encode_cursor(self, offset: int, last_key, last_row: int) -> str:
+        """分页游标：[revision, 下一页的位置, 上一页最后一个服务器的排序键, 行号]"""
+        raw = json.dumps([self.revision, offset, last_key, last_row], ensure_ascii=False).encode("utf-8")
+        return base64.urlsafe_b64encode(raw).decode("ascii")
+
+    def decode_cursor(self, cursor: str) -> Tuple[int, int, object, int]:
+        """返回 (generation, 位置, 排序键, 行号)；结果文件重新加载过（version 变化）时抛出 InvalidCursor"""
+        try:
+            revision, offset, last_key, last_row = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+            version, generation = revision.rsplit(".", 1)
+            generation, offset, last_row = int(generation), int(offset), int(last_row)
+        except (ValueError, TypeError, AttributeError, UnicodeError):
+            raise ValueError("分页游标格式无效")
+        if version != self.version:
+            raise InvalidCursor("数据已更新，请重新开始分页")
+        if isinstance(last_key, list):
+            # 按主机排序时排序键是元组
+            last_key = tuple(last_key)
+        return generation, offset, last_key, last_row
+
+
+class ResultStore:
+    """结果文件的缓存层：只有文件的修改时间或大小变化时才重新加载
+
+    JSON Lines 和 SQLite 文件只读取新增的部分并入当前快照；扫描器实时发布的结果通过 publish 并入。
+    需要完整重新加载时（整体保存的 .json 文件、文件被替换），两次加载至少间隔 reload_interval 秒，
+    期间继续使用当前快照。
+    """
+
+    def __init__(self, path_resolver: Callable[[], str], on_change: Optional[Callable[[ResultSnapshot, Dict], None]] = None,
+                 reload_interval: float = 10.0):
+        self.path_resolver = path_resolver
+        self.on_change = on_change  # 快照内容变化时调用：on_change(快照, {"added", "updated"} 或 {"reset": True})
+        self.reload_interval = reload_interval
+        self._loaded = None  # 上次完整加载的时间（time.monotonic）
+        self._signature = None
+        self._inode = None
+        self._position = None  # 结果文件已经读到的位置（见 result_sink.results_position）
+        self._live = {}  # 实时收到、结果文件中可能还没有的服务器，重新加载文件后再次并入
+        self._snapshot = ResultSnapshot([], "empty")
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def file_signature(path: str) -> Optional[Tuple]:
+        """文件签名：路径 + 修改时间 + 大小（SQLite 还要看 WAL 文件）"""
+        signature = [path]
+        for candidate in (path, path + "-wal"):
+            try:
+                stat = os.stat(candidate)
+                signature.extend((stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+    def snapshot(self) -> ResultSnapshot:
+        """返回最新的结果快照，必要时读取结果文件的变化"""
+        path = self.path_resolver()
+        signature = self.file_signature(path)
+        if signature == self._signature:
+            return self._snapshot
+        with self._lock:
+            if signature != self._signature:
+                self._refresh(path, signature)
+        return self._snapshot
+
+    def _refresh(self, path: str, signature: Tuple):
+        try:
+            inode = os.stat(path).st_ino
+        except OSError:
+            inode = None
+        if (self._signature and self._signature[0] == path and inode == self._inode
+                and self._position is not None and (signature[2] or 0) >= (self._signature[2] or 0)):
+            # 同一个文件只是追加或更新了结果：只读取新增的部分
+            try:
+                records, position = tail_results(path, self._position)
+            except (OSError, ValueError, sqlite3.Error):
+                records = None
+            if records is not None:
+                self._position = position
+                self._signature = signature
+                for record in records:
+                    self._live.pop(ResultTable.record_key(record), None)
+                self._notify(self._snapshot.fold(records))
+                return
+
+        if self._loaded is not None and time.monotonic() - self._loaded < self.reload_interval:
+            # 距离上次完整加载太近（例如扫描器每次保存都重写 .json 文件），之后的请求再检查
+            return
+        version = hashlib.sha1(json.dumps(signature).encode("utf-8")).hexdigest()[:12]
+        try:
+            # 先记下位置再读取，读取期间追加的结果下次增量读取时会再读到（相同的结果会跳过）
+            position = results_position(path)
+            # 逐条读取直接写入列存储，不生成完整的结果列表
+            with profiler.stage("load_snapshot"):
+                snapshot = ResultSnapshot(iter_results(path), version)
+        except (OSError, ValueError, sqlite3.Error):
+            position = None
+            snapshot = ResultSnapshot([], version)
+        # 实时收到的结果可能还没有写入文件；已经在文件中的（没有变化）不再保留
+        changes = snapshot.fold(list(self._live.values()))
+        self._live = {ResultTable.record_key(record): record for record in changes["added"] + changes["updated"]}
+        self._snapshot = snapshot
+        self._signature = signature
+        self._inode = inode
+        self._position = position
+        self._loaded = time.monotonic()
+        self._notify({"reset": True})
+
+    def publish(self, records: Iterable[Dict] = (), updates: Iterable[Dict] = ()):
+        """并入扫描器实时发布的结果（records 为完整结果，updates 为已有服务器变化的字段）"""
+        self.snapshot()  # 先读入结果文件的变化
+        records, updates = list(records), list(updates)
+        with self._lock:
+            changes = self._snapshot.fold(records, updates)
+            for record in changes["added"] + changes["updated"]:
+                self._live[ResultTable.record_key(record)] = record
+            self._notify(changes)
+
+    def _notify(self, changes: Dict):
+        if self.on_change and (changes.get("reset") or changes["added"] or changes["updated"]):
+            self.on_change(self._snapshot, changes)
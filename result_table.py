@@ -0,0 +1,363 @@
+import argparse
+import json
+import socket
+import struct
+from array import array
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from result_sink import iter_results
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+MISSING = -(1 << 31)  # 整数列中表示字段不存在
+MISSING_TIMESTAMP = -(1 << 63)
+INT_FIELDS = ("protocol", "players_online", "players_max")
+# 以列形式存放的字段，其余字段放在每行的 extras 中
+COLUMN_FIELDS = frozenset(("host", "port", "online", "edition", "version", "latency", "timestamp",
+                           "country", "description") + INT_FIELDS)
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+_ipv4 = struct.Struct("!I")
+
+
+def _parse_ipv4(host: str) -> Optional[int]:
+    """严格的点分十进制IPv4地址转整数，其他主机名返回 None"""
+    try:
+        ip = _ipv4.unpack(socket.inet_pton(socket.AF_INET, host))[0]
+    except (OSError, TypeError):
+        return None
+    return ip if socket.inet_ntoa(_ipv4.pack(ip)) == host else None
+
+
+def _parse_timestamp(value) -> Optional[int]:
+    """不带时区的 ISO 时间转微秒数，无法原样还原的返回 None"""
+    if not isinstance(value, str):
+        return None
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if moment.tzinfo is not None or moment.isoformat() != value:
+        return None
+    return (moment - _EPOCH) // _MICROSECOND
+
+
+class StringTable:
+    """去重字符串表：相同的值只保存一份，列中存放编号（0 表示字段不存在）"""
+
+    def __init__(self):
+        self.values = [None]
+        self.ids = {None: 0}
+
+    def intern(self, value) -> int:
+        value_id = self.ids.get(value)
+        if value_id is None:
+            value_id = self.ids[value] = len(self.values)
+            self.values.append(value)
+        return value_id
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+
+class ResultTable:
+    """按列存放的扫描结果
+
+    每个服务器只占几十字节：IPv4 地址存为 uint32，版本、国家、客户端版本名和描述（MOTD）
+    存为字符串表中的编号，数值字段存放在 array 中。只有不常见的字段（玩家列表、域名等）
+    才按行保存为字典。按行号访问时才还原成结果字典。
+    """
+
+    def __init__(self, records: Iterable[Dict] = ()):
+        self.ip = array("I")
+        self.port = array("H")
+        self.edition = array("B")
+        self.version = array("I")
+        self.protocol = array("i")
+        self.players_online = array("i")
+        self.players_max = array("i")
+        self.latency = array("d")  # 毫秒，NaN 表示不存在（用双精度保存，导出时与原始结果一致）
+        self.timestamp = array("q")  # 1970-01-01 起的微秒数（与记录一样不带时区）
+        self.country = array("H")
+        self.description = array("I")
+        self.editions = StringTable()
+        self.versions = StringTable()
+        self.descriptions = StringTable()
+        self.country_codes = StringTable()
+        self.countries = [None]  # 国家编号 -> 国家信息字典
+        self.hosts = {}  # 行号 -> 不是IPv4地址的主机名
+        self.extras = {}  # 行号 -> 其他字段
+        self.extend(records)
+
+    def __len__(self) -> int:
+        return len(self.ip)
+
+    def _columns(self) -> tuple:
+        # ip 放在最后：其他线程按 len(ip) 读取行数时，这一行的其他列已经写好
+        return (self.port, self.edition, self.version, self.protocol, self.players_online, self.players_max,
+                self.latency, self.timestamp, self.country, self.description, self.ip)
+
+    def _encode(self, record: Dict) -> Tuple[Optional[str], tuple, Dict]:
+        """把结果字典编码成各列的值，返回 (不是IPv4地址的主机名, 与 _columns 对应的值, 其他字段)"""
+        extras = {key: value for key, value in record.items() if key not in COLUMN_FIELDS}
+        if record.get("online", True) is not True:
+            extras["online"] = record["online"]
+
+        host = record["host"]
+        ip = _parse_ipv4(host)
+
+        strings = []
+        for name, table in (("edition", self.editions), ("version", self.versions),
+                            ("description", self.descriptions)):
+            value = record.get(name)
+            if isinstance(value, str):
+                strings.append(table.intern(value))
+            else:
+                strings.append(0)
+                if value is not None:
+                    extras[name] = value
+        edition, version, description = strings
+
+        numbers = []
+        for name in INT_FIELDS:
+            value = record.get(name)
+            if type(value) is int and MISSING < value < (1 << 31):
+                numbers.append(value)
+            else:
+                numbers.append(MISSING)
+                if name in record:
+                    extras[name] = value
+
+        latency = record.get("latency")
+        if not isinstance(latency, (int, float)) or isinstance(latency, bool):
+            if "latency" in record:
+                extras["latency"] = latency
+            latency = float("nan")
+
+        timestamp = _parse_timestamp(record.get("timestamp"))
+        if timestamp is None:
+            timestamp = MISSING_TIMESTAMP
+            if "timestamp" in record:
+                extras["timestamp"] = record["timestamp"]
+
+        country = record.get("country")
+        if isinstance(country, dict) and isinstance(country.get("code"), str):
+            country_id = self.country_codes.intern(country["code"])
+            if country_id == len(self.countries):
+                self.countries.append(country)
+        else:
+            country_id = 0
+            if country is not None:
+                extras["country"] = country
+
+        values = (record["port"], edition, version, *numbers, latency, timestamp, country_id, description, ip or 0)
+        return (host if ip is None else None), values, extras
+
+    def append(self, record: Dict):
+        row = len(self.ip)
+        host, values, extras = self._encode(record)
+        if host is not None:
+            self.hosts[row] = host
+        if extras:
+            self.extras[row] = extras
+        for column, value in zip(self._columns(), values):
+            column.append(value)
+
+    def update(self, row: int, record: Dict):
+        """用同一服务器的新结果覆盖第 row 行"""
+        host, values, extras = self._encode(record)
+        for mapping, value in ((self.hosts, host), (self.extras, extras)):
+            if value:
+                mapping[row] = value
+            else:
+                mapping.pop(row, None)
+        for column, value in zip(self._columns(), values):
+            column[row] = value
+
+    def matches(self, row: int, record: Dict) -> bool:
+        """第 row 行是否已经是这条结果"""
+        host, values, extras = self._encode(record)
+        if self.hosts.get(row) != host or self.extras.get(row, {}) != extras:
+            return False
+        for column, value in zip(self._columns(), values):
+            stored = column[row]
+            # 两边都没有延迟（NaN）时视为相同
+            if stored != value and not (value != value and stored != stored):
+                return False
+        return True
+
+    def extend(self, records: Iterable[Dict]):
+        for record in records:
+            self.append(record)
+
+    def host(self, row: int) -> str:
+        return self.hosts.get(row) or socket.inet_ntoa(_ipv4.pack(self.ip[row]))
+
+    def key(self, row: int):
+        """服务器的去重键，与 record_key 一致"""
+        host = self.hosts.get(row)
+        return (host, self.port[row]) if host is not None else self.ip[row] << 16 | self.port[row]
+
+    @staticmethod
+    def record_key(record: Dict):
+        """结果字典的去重键：IPv4 服务器用一个整数，其他用 (主机名, 端口)"""
+        ip = _parse_ipv4(record["host"])
+        return (record["host"], record["port"]) if ip is None else ip << 16 | record["port"]
+
+    def record(self, row: int) -> Dict:
+        """还原第 row 行的结果字典"""
+        record = {"host": self.host(row), "port": self.port[row], "online": True}
+        edition = self.edition[row]
+        if edition:
+            record["edition"] = self.editions.values[edition]
+        version = self.version[row]
+        if version:
+            record["version"] = self.versions.values[version]
+        for name in INT_FIELDS:
+            value = getattr(self, name)[row]
+            if value != MISSING:
+                record[name] = value
+        description = self.description[row]
+        if description:
+            record["description"] = self.descriptions.values[description]
+        latency = self.latency[row]
+        if latency == latency:
+            record["latency"] = latency
+        timestamp = self.timestamp[row]
+        if timestamp != MISSING_TIMESTAMP:
+            record["timestamp"] = (_EPOCH + timestamp * _MICROSECOND).isoformat()
+        country = self.country[row]
+        if country:
+            record["country"] = self.countries[country]
+        extras = self.extras.get(row)
+        if extras:
+            record.update(extras)
+        return record
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.record(row) for row in range(len(self))[index]]
+        return self.record(range(len(self))[index])
+
+    def __iter__(self) -> Iterator[Dict]:
+        for row in range(len(self)):
+            yield self.record(row)
+
+    def group_rows(self, column: array) -> Dict[int, array]:
+        """按某个编号列分组，返回 {编号: 行号数组}（按编号排序）"""
+        groups = {}
+        for row, key in enumerate(column):
+            rows = groups.get(key)
+            if rows is None:
+                rows = groups[key] = array("I")
+            rows.append(row)
+        return dict(sorted(groups.items()))
+
+    def to_arrow(self):
+        """导出为 pyarrow.Table；数值列直接共享内存，字符串表导出为字典编码列"""
+        try:
+            import pyarrow as pa
+            import pyarrow.compute as pc
+        except ImportError:
+            raise ImportError("导出 Arrow / Parquet 需要安装 pyarrow: pip install pyarrow")
+
+        rows = len(self)
+
+        def numeric(column: array, arrow_type, missing=None):
+            values = pa.Array.from_buffers(arrow_type, rows, [None, pa.py_buffer(column)])
+            if missing is not None and column.count(missing):
+                values = pc.if_else(pc.equal(values, pa.scalar(missing, arrow_type)), None, values)
+            return values
+
+        def dictionary(column: array, index_type, table: StringTable):
+            indices = numeric(column, index_type)
+            return pa.DictionaryArray.from_arrays(indices, pa.array(table.values), mask=pc.equal(indices, 0))
+
+        latency = numeric(self.latency, pa.float64())
+        if rows and pc.any(pc.is_nan(latency)).as_py():
+            latency = pc.if_else(pc.is_nan(latency), None, latency)
+        timestamp = pa.Array.from_buffers(pa.int64(), rows, [None, pa.py_buffer(self.timestamp)])
+        if self.timestamp.count(MISSING_TIMESTAMP):
+            timestamp = pc.if_else(pc.equal(timestamp, MISSING_TIMESTAMP), None, timestamp)
+        return pa.table({
+            "ip": numeric(self.ip, pa.uint32()),
+            "host": pa.array([self.hosts.get(row) for row in range(rows)] if self.hosts else [None] * rows,
+                             pa.string()),
+            "port": numeric(self.port, pa.uint16()),
+            "edition": dictionary(self.edition, pa.uint8(), self.editions),
+            "version": dictionary(self.version, pa.uint32(), self.versions),
+            "protocol": numeric(self.protocol, pa.int32(), MISSING),
+            "players_online": numeric(self.players_online, pa.int32(), MISSING),
+            "players_max": numeric(self.players_max, pa.int32(), MISSING),
+            "latency": latency,
+            "timestamp": timestamp.cast(pa.timestamp("us")),
+            "country": dictionary(self.country, pa.uint16(), self.country_codes),
+            "description": dictionary(self.description, pa.uint32(), self.descriptions),
+            "extra": pa.array([json.dumps(self.extras[row], ensure_ascii=False) if row in self.extras else None
+                               for row in range(rows)], pa.string()),
+        })
+
+    def write_parquet(self, path: str):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("导出 Parquet 需要安装 pyarrow: pip install pyarrow")
+        pq.write_table(self.to_arrow(), path)
+
+    def write_arrow(self, path: str):
+        """写入 Arrow IPC 文件（可以用 pyarrow.memory_map 零拷贝读取）"""
+        table = self.to_arrow()
+        import pyarrow as pa
+        with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+def column_sum(column: array, missing: int = MISSING) -> int:
+    """整数列求和，跳过不存在的值"""
+    return sum(column) - column.count(missing) * missing
+
+
+def group_sums(keys: array, values: array, size: int) -> List[int]:
+    """按编号列分组对整数列求和（安装了 numpy 时向量化计算），返回长度为 size 的列表"""
+    if numpy is not None and len(keys):
+        values = numpy.frombuffer(values, dtype=values.typecode)
+        values = numpy.where(values == MISSING, 0, values)
+        return [int(total) for total in numpy.bincount(numpy.frombuffer(keys, dtype=keys.typecode),
+                                                       weights=values, minlength=size)]
+    sums = [0] * size
+    for key, value in zip(keys, values):
+        if value != MISSING:
+            sums[key] += value
+    return sums
+
+
+def group_counts(keys: array, size: int) -> List[int]:
+    """编号列中每个编号出现的次数"""
+    if numpy is not None and len(keys):
+        return numpy.bincount(numpy.frombuffer(keys, dtype=keys.typecode), minlength=size).tolist()
+    counts = [0] * size
+    for key in keys:
+        counts[key] += 1
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='把扫描结果导出为 Parquet / Arrow 文件')
+    parser.add_argument('input', help='结果文件（.json / .jsonl / .db）')
+    parser.add_argument('output', help='输出文件（.parquet 或 .arrow）')
+    args = parser.parse_args()
+
+    table = ResultTable(iter_results(args.input))
+    if args.output.lower().endswith(".arrow"):
+        table.write_arrow(args.output)
+    else:
+        table.write_parquet(args.output)
+    print(f"已导出 {len(table):,} 个服务器到 {args.output}")
+
+if __name__ == "__main__":
+    main()
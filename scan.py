@@ -1,6 +1,17 @@
 import asyncio
 import argparse
+import copy
+import multiprocessing
+import random
 from mc_scanner import MinecraftServerScanner
+from checkpoint import Checkpoint
+from targets import load_cidr_file
+from monitor import HistorySink, Monitor
+from probes import parse_port_set
+from live import DEFAULT_EVENTS_SOCKET
+from profiling import SAMPLERS, profiler
+from result_sink import ResultSinkError
+from workers import WorkerPool, worker_checkpoint_path, worker_shard
 import ipaddress
 
 def validate_ip(ip_str):
@@ -19,85 +30,292 @@ def parse_port_range(port_range):
         pass
     raise argparse.ArgumentTypeError('端口范围格式无效，请使用 "起始端口-结束端口" 格式，例如: "25565-25575"')
 
+def configure_scanner(scanner, args):
+    """按命令行参数设置扫描器（--workers 模式下每个工作进程也会调用）"""
+    scanner.set_output(args.output)
+    scanner.set_events(None if args.no_events else args.events_socket)
+    scanner.open_geo()
+    scanner.configure_stages(args.concurrency, args.connect_timeout,
+                             args.status_concurrency, args.timeout)
+    scanner.configure_rate(args.rate, args.adaptive, args.min_concurrency, args.max_concurrency)
+    scanner.prefilter = not args.no_prefilter
+    scanner.measure_ping = args.ping
+    scanner.port_set = args.ports
+    scanner.nameservers = args.dns_servers
+    scanner.dns_concurrency = args.dns_concurrency
+    scanner.seed = args.seed
+    scanner.shard = args.shard
+    scanner.checkpoint = Checkpoint(args.checkpoint, args.checkpoint_interval)
+    scanner.resume = args.resume
+    scanner.progress_interval = args.progress_interval
+    scanner.stats_file = args.stats_file
+    scanner.metrics_port = args.metrics_port
+    scanner.incremental = args.incremental
+    scanner.cold_rate = args.cold_rate
+    scanner.neighbor_radius = args.neighbor_radius
+    scanner.responsive_map_path = args.responsive_map
+    scanner.delta_output = args.delta_output
+    for exclude_file in args.exclude_file:
+        scanner.add_excludes(load_cidr_file(exclude_file))
+    if args.profile:
+        profiler.enable(args.profile, "scan", args.profile_sampler, args.profile_interval)
+
+async def run_mode(scanner, args):
+    """执行 args.mode 指定的扫描（参数已经过 validate_args 检查）"""
+    if args.mode == 'single':
+        await scanner.scan_server(args.host)
+
+    elif args.mode == 'multiple':
+        with open(args.hosts_file, 'r') as f:
+            servers = [line.strip() for line in f if line.strip()]
+        await scanner.scan_multiple_servers(servers)
+
+    elif args.mode == 'range':
+        port_range = args.port_range or (25565, 25565)
+        await scanner.scan_ip_range(args.start_ip, args.end_ip, port_range)
+
+    elif args.mode == 'all-ports':
+        port_range = args.port_range or (1, 65535)
+        await scanner.scan_single_host_all_ports(args.host, port_range[0], port_range[1])
+
+    elif args.mode == 'global':
+        await scanner.scan_random_global_ips(args.count, args.port)
+
+    elif args.mode == 'all-ipv4':
+        await scanner.scan_all_ipv4(args.port, args.batch_size, args.save_interval)
+
+    elif args.mode == 'country':
+        await scanner.scan_country(args.country, args.port, args.batch_size)
+
+    elif args.mode == 'targets':
+        await scanner.scan_targets_file(args.targets_file, args.port, args.batch_size, args.save_interval,
+                                        args.dedup_capacity)
+
+    elif args.mode == 'monitor':
+        history = HistorySink(args.history)
+        try:
+            monitor = Monitor(scanner, history, base_interval=args.monitor_interval,
+                              concurrency=scanner.status_concurrency)
+            await monitor.run(args.output, args.duration)
+        finally:
+            history.close()
+
+def validate_args(parser, args):
+    """检查各扫描模式必需的参数"""
+    if args.mode == 'single' and not args.host:
+        parser.error('单服务器模式需要指定 --host 参数')
+    if args.mode == 'all-ports' and not args.host:
+        parser.error('全端口扫描模式需要指定 --host 参数')
+    if args.mode == 'multiple' and not args.hosts_file:
+        parser.error('多服务器模式需要指定 --hosts-file 参数')
+    if args.mode == 'range':
+        if not (args.start_ip and args.end_ip):
+            parser.error('IP范围模式需要指定 --start-ip 和 --end-ip 参数')
+        if not (validate_ip(args.start_ip) and validate_ip(args.end_ip)):
+            parser.error('请输入有效的IP地址')
+    if args.mode == 'country' and not args.country:
+        parser.error('请使用 --country 参数指定要扫描的国家')
+    if args.mode == 'targets' and not args.targets_file:
+        parser.error('目标列表模式需要指定 --targets-file 参数')
+    if args.dedup_capacity < 0:
+        parser.error('--dedup-capacity 不能小于0')
+    if args.workers < 1:
+        parser.error('--workers 必须大于0')
+    if args.mode == 'monitor' and args.workers > 1:
+        parser.error('监控模式不支持 --workers')
+    if args.incremental and args.workers > 1:
+        parser.error('增量扫描不支持 --workers')
+    # 增量扫描的目标顺序取决于上次的结果文件，扫描过程中结果文件还会变化，无法按位置分片或继续扫描
+    if args.incremental and args.shard != (0, 1):
+        parser.error('增量扫描不支持 --shard')
+    if args.incremental and args.resume:
+        parser.error('增量扫描不支持 --resume')
+    if not 0 <= args.cold_rate <= 1:
+        parser.error('--cold-rate 必须在0到1之间')
+
+def worker_args(args):
+    """为每个工作进程生成参数：各自扫描一个分片，速率上限平均分配"""
+    if args.seed is None:
+        # 所有工作进程必须使用同一个种子；继续扫描时沿用检查点中的种子
+        state = Checkpoint(worker_checkpoint_path(args.checkpoint, 0)).load() if args.resume else None
+        args.seed = state["config"].get("seed") if state else random.getrandbits(32)
+    args_list = []
+    for index in range(args.workers):
+        child = copy.copy(args)
+        child.shard = worker_shard(args.shard, index, args.workers)
+        child.checkpoint = worker_checkpoint_path(args.checkpoint, index)
+        child.rate = args.rate / args.workers if args.rate else None
+        child.count = len(range(index, args.count, args.workers))
+        child.stats_file = child.metrics_port = None
+        if args.profile:
+            child.profile = f"{args.profile}.{index}"
+        args_list.append(child)
+    return args_list
+
+def parse_ports(spec):
+    try:
+        return parse_port_set(spec)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(f'端口集合无效: {e}，格式示例: "25565-25567,bedrock:19132"')
+
+def parse_shard(shard):
+    try:
+        index, total = map(int, shard.split('/'))
+        if 0 <= index < total:
+            return (index, total)
+    except:
+        pass
+    raise argparse.ArgumentTypeError('分片格式无效，请使用 "编号/总数" 格式，编号从0开始，例如: "0/4"')
+
 async def main():
     parser = argparse.ArgumentParser(description='Minecraft服务器扫描工具')
-    parser.add_argument('--mode', choices=['single', 'multiple', 'range', 'all-ports', 'global', 'all-ipv4', 'country'],
-                      required=True, help='扫描模式：single=单个服务器，multiple=多个服务器，range=IP范围，all-ports=扫描所有端口，global=扫描全球服务器，all-ipv4=扫描所有IPv4地址，country=扫描特定国家')
+    parser.add_argument('--mode', choices=['single', 'multiple', 'range', 'all-ports', 'global', 'all-ipv4', 'country', 'targets', 'monitor'],
+                      required=True, help='扫描模式：single=单个服务器，multiple=多个服务器，range=IP范围，all-ports=扫描所有端口，global=扫描全球服务器，all-ipv4=扫描所有IPv4地址，country=扫描特定国家，targets=扫描目标列表文件（支持IPv6），monitor=持续监控已发现的服务器')
     
     parser.add_argument('--host', help='要扫描的服务器主机名或IP')
-    parser.add_argument('--hosts-file', help='包含多个服务器地址的文件路径，每行一个地址')
+    parser.add_argument('--hosts-file', help='包含多个服务器地址的文件路径，每行一个地址（域名、域名:端口 或 IP）')
+    parser.add_argument('--targets-file',
+                      help='目标列表文件（targets 模式），每行一个IPv4/IPv6地址、网段或 主机:端口，可以是 gzip / bz2 / xz 压缩文件')
+    parser.add_argument('--dedup-capacity', type=int, default=10_000_000,
+                      help='targets 模式去重使用的 Bloom 过滤器容量（不重复的目标数，默认: 10000000，约 17 MB；0 表示不去重）')
+    parser.add_argument('--dns-servers', type=lambda s: [x.strip() for x in s.split(',') if x.strip()],
+                      help='多服务器模式使用的DNS服务器，逗号分隔（默认读取 /etc/resolv.conf）')
+    parser.add_argument('--dns-concurrency', type=int, default=256,
+                      help='多服务器模式同时进行的DNS查询数（默认: 256）')
     parser.add_argument('--start-ip', help='起始IP地址')
     parser.add_argument('--end-ip', help='结束IP地址')
     parser.add_argument('--port-range', type=parse_port_range, 
                       help='端口范围，格式: "起始端口-结束端口"，例如: "25565-25575"')
-    parser.add_argument('--output', default='scan_results.json',
-                      help='结果输出文件路径')
+    parser.add_argument('--output', default='scan_results.jsonl',
+                      help='结果输出文件路径（.jsonl 逐行追加，.db/.sqlite 写入SQLite，.json 为旧的整体保存格式）')
     parser.add_argument('--count', type=int, default=1000,
                       help='全球扫描模式下要扫描的IP数量')
     parser.add_argument('--port', type=int, default=25565,
                       help='指定扫描端口')
+    parser.add_argument('--ports', type=parse_ports,
+                      help='每个主机要探测的端口集合（可包含基岩版），例如: "25565-25567,bedrock:19132"；'
+                           '用于 range / global / all-ipv4 / country 模式，代替 --port 和 --port-range')
     parser.add_argument('--batch-size', type=int, default=1000,
-                      help='批处理大小（用于全IPv4扫描模式）')
+                      help='任务队列大小（用于全IPv4扫描和国家扫描模式）')
     parser.add_argument('--save-interval', type=int, default=300,
                       help='保存间隔（全IPv4扫描模式下，每扫描多少秒保存一次结果）')
-    parser.add_argument('--country', help='要扫描的国家（例如：china, usa, japan等）')
+    parser.add_argument('--country', help='要扫描的国家或地区（例如：china, usa, japan，或任意ISO国家代码如 CN, BR）')
+    parser.add_argument('--exclude-file', action='append', default=[],
+                      help='额外排除的网段文件，每行一个CIDR，可多次指定')
+
+    parser.add_argument('--seed', type=int,
+                      help='伪随机扫描顺序的种子（多个分片必须使用相同的种子，不指定则随机生成）')
+    parser.add_argument('--shard', type=parse_shard, default=(0, 1),
+                      help='分片，格式: "编号/总数"，例如: "0/4"，用于在多个进程或主机间拆分同一次扫描')
+
+    parser.add_argument('--concurrency', type=int,
+                      help='端口预检阶段的并发数（默认1000）')
+    parser.add_argument('--connect-timeout', type=float,
+                      help='端口预检（TCP connect）超时时间，单位秒（默认0.5）')
+    parser.add_argument('--status-concurrency', type=int,
+                      help='状态查询阶段的并发数（默认1000）')
+    parser.add_argument('--timeout', type=float,
+                      help='状态查询超时时间，单位秒（默认2）')
+    parser.add_argument('--no-prefilter', action='store_true',
+                      help='关闭端口预检，直接对每个目标发起状态查询')
+    parser.add_argument('--ping', action='store_true',
+                      help='状态查询后额外发送ping包测量延迟')
+
+    parser.add_argument('--rate', type=float,
+                      help='每秒最多发起的探测数（令牌桶限速），不指定则不限速')
+    parser.add_argument('--adaptive', action='store_true',
+                      help='根据超时率和往返时间自动调节并发数和超时时间（AIMD）')
+    parser.add_argument('--min-concurrency', type=int,
+                      help='自动调节时的最小并发数（默认50）')
+    parser.add_argument('--max-concurrency', type=int,
+                      help='自动调节时的最大并发数（默认为 --concurrency 的8倍）')
+
+    parser.add_argument('--progress-interval', type=float, default=0.5,
+                      help='进度行刷新间隔，单位秒')
+    parser.add_argument('--stats-file',
+                      help='定期写入扫描统计信息（计数器、各阶段延迟）的 JSON 文件')
+    parser.add_argument('--metrics-port', type=int,
+                      help='在该端口上提供 Prometheus 格式的 /metrics 接口（只监听 127.0.0.1）')
+    parser.add_argument('--incremental', action='store_true',
+                      help='增量扫描（全IPv4和国家扫描模式）：先复查已知服务器及相邻网段，其余空间只抽样，只写入变化')
+    parser.add_argument('--cold-rate', type=float, default=0.05,
+                      help='增量扫描时从未发现过服务器的网段的抽样比例（0~1）')
+    parser.add_argument('--neighbor-radius', type=int, default=1,
+                      help='增量扫描时已知服务器所在 /24 前后各复查多少个 /24')
+    parser.add_argument('--responsive-map', default='scan_responsive.bin',
+                      help='记录曾经出现过服务器的 /24 网段的位图文件')
+    parser.add_argument('--delta-output', default='scan_delta.jsonl',
+                      help='增量扫描的变化记录文件（新增、消失、变化）')
+    parser.add_argument('--history', default='scan_history.db',
+                      help='监控模式下保存历史数据的 SQLite 文件')
+    parser.add_argument('--monitor-interval', type=float, default=300,
+                      help='监控模式的基础检查间隔，单位秒（热门、变化频繁的服务器更频繁，离线服务器指数退避）')
+    parser.add_argument('--duration', type=float,
+                      help='监控模式运行时长，单位秒（不指定则一直运行）')
+    parser.add_argument('--workers', type=int, default=1,
+                      help='扫描进程数，每个进程扫描一个分片并使用独立的事件循环（并发数按每个进程计算，--rate 为所有进程合计）')
+    parser.add_argument('--checkpoint', default='scan_checkpoint.json',
+                      help='检查点文件路径（全IPv4扫描和国家扫描模式会定期记录扫描位置）')
+    parser.add_argument('--checkpoint-interval', type=float, default=5,
+                      help='检查点保存间隔，单位秒')
+    parser.add_argument('--resume', action='store_true',
+                      help='从检查点继续上次中断的扫描')
+    parser.add_argument('--events-socket', default=DEFAULT_EVENTS_SOCKET,
+                      help=f'把发现的服务器实时发给 Web 界面的 Unix 套接字（与 web.py 的 --events-socket 相同，默认: {DEFAULT_EVENTS_SOCKET}）')
+    parser.add_argument('--no-events', action='store_true',
+                      help='不向 Web 界面发布实时结果')
+    parser.add_argument('--profile', nargs='?', const='scan_profile', metavar='PREFIX',
+                      help='开启性能分析：记录事件循环延迟和各阶段（生成目标、端口预检、读取响应、解析JSON、'
+                           '补充国家信息、写入结果等）耗时，写入 PREFIX.json 和火焰图格式的 PREFIX.*.folded'
+                           '（默认前缀 scan_profile，--workers 模式下每个进程加上编号）')
+    parser.add_argument('--profile-sampler', choices=SAMPLERS,
+                      help='性能分析时额外采样：stack=调用栈采样，cprofile=定期开启 cProfile，tracemalloc=定期记录内存分配快照')
+    parser.add_argument('--profile-interval', type=float, default=10,
+                      help='cProfile 窗口和内存快照的间隔，单位秒（每个 cProfile 窗口 1 秒）')
 
     args = parser.parse_args()
+    validate_args(parser, args)
     scanner = MinecraftServerScanner()
+    try:
+        configure_scanner(scanner, args)
+    except ResultSinkError as e:
+        parser.error(str(e))
 
     try:
-        if args.mode == 'single':
-            if not args.host:
-                parser.error('单服务器模式需要指定 --host 参数')
-            await scanner.scan_server(args.host)
-
-        elif args.mode == 'multiple':
-            if not args.hosts_file:
-                parser.error('多服务器模式需要指定 --hosts-file 参数')
-            with open(args.hosts_file, 'r') as f:
-                servers = [line.strip() for line in f if line.strip()]
-            await scanner.scan_multiple_servers(servers)
-
-        elif args.mode == 'range':
-            if not (args.start_ip and args.end_ip):
-                parser.error('IP范围模式需要指定 --start-ip 和 --end-ip 参数')
-            if not (validate_ip(args.start_ip) and validate_ip(args.end_ip)):
-                parser.error('请输入有效的IP地址')
-            port_range = args.port_range or (25565, 25565)
-            await scanner.scan_ip_range(args.start_ip, args.end_ip, port_range)
-
-        elif args.mode == 'all-ports':
-            if not args.host:
-                parser.error('全端口扫描模式需要指定 --host 参数')
-            port_range = args.port_range or (1, 65535)
-            await scanner.scan_single_host_all_ports(args.host, port_range[0], port_range[1])
-
-        elif args.mode == 'global':
+        if args.mode == 'global':
             print(f"开始全球服务器扫描，将随机扫描 {args.count} 个IP地址")
-            await scanner.scan_random_global_ips(args.count, args.port)
 
         elif args.mode == 'all-ipv4':
             print("警告: 扫描所有IPv4地址将耗费大量时间和资源！")
             confirmation = input("确定要继续吗？(y/N) ")
-            if confirmation.lower() == 'y':
-                await scanner.scan_all_ipv4(args.port, args.batch_size, args.save_interval)
-            else:
+            if confirmation.lower() != 'y':
                 print("操作已取消")
                 return
 
-        elif args.mode == 'country':
-            if not args.country:
-                parser.error('请使用 --country 参数指定要扫描的国家')
-            await scanner.scan_country(args.country, args.port, args.batch_size)
+        async with profiler.session():
+            if args.workers > 1 and args.mode != 'single':
+                print(f"使用 {args.workers} 个扫描进程")
+                await WorkerPool(scanner, args.workers).run(worker_args(args), configure_scanner, run_mode)
+            else:
+                await run_mode(scanner, args)
 
-        scanner.save_results(args.output)
+        scanner.save_results()
 
     except KeyboardInterrupt:
         print("\n扫描被用户中断")
-        scanner.save_results(args.output)
+        scanner.save_results()
     except Exception as e:
         print(f"发生错误: {str(e)}")
-        scanner.save_results(args.output)
+        scanner.save_results()
+    finally:
+        scanner.close_probes()
+        try:
+            scanner.close_sink()
+        except ResultSinkError as e:
+            print(f"\n{str(e)}")
+        scanner.close_events()
 
 if __name__ == "__main__":
-    asyncio.run(main()) 
\ No newline at end of file
+    # PyInstaller 打包的程序用 spawn 启动工作进程时，子进程也从这里开始执行，必须最先调用
+    multiprocessing.freeze_support()
+    asyncio.run(main()) 
@@ -0,0 +1,97 @@
+import asyncio
+from typing import Awaitable, Callable, Iterable, Optional, Sized, Tuple
+
+Target = Tuple[str, int]
+
+
+class ScanEngine:
+    """生产者/消费者扫描引擎：工作协程从有界队列中取目标
+
+    启动 max_concurrency 个工作协程，其中只有序号小于 limit 的会取目标，
+    运行中可以通过 set_limit 调整实际并发数。
+    """
+
+    def __init__(self, handler: Callable[[str, int], Awaitable], concurrency: int = 1000,
+                 queue_size: Optional[int] = None, track_cursors: bool = False,
+                 max_concurrency: Optional[int] = None):
+        self.handler = handler
+        # 开启后目标格式为 (断点位置, 目标)，位置必须单调递增
+        self.track_cursors = track_cursors
+        self.concurrency = max(1, concurrency)
+        self.max_concurrency = max(self.concurrency, max_concurrency or 0)
+        self.limit = self.concurrency  # 当前允许同时探测的工作协程数
+        # 队列容量默认为并发数的两倍，保证工作协程不会空等生产者
+        self.queue_size = queue_size or self.concurrency * 2
+        self.submitted = 0
+        self.errors = 0
+        self._pending = {}  # 已提交但尚未完成的目标：序号 -> 断点位置（按提交顺序排列）
+        self._next_cursor = None
+        self._resized = asyncio.Event()
+        self._draining = False
+
+    def set_limit(self, limit: int):
+        """调整实际并发数（不超过 max_concurrency），超出的工作协程完成手头的目标后暂停"""
+        self.limit = max(1, min(int(limit), self.max_concurrency))
+        self._wake()
+
+    def _wake(self):
+        self._resized.set()
+        self._resized = asyncio.Event()
+
+    def cursor(self) -> Optional[int]:
+        """可以安全继续扫描的位置：最早一个尚未完成的目标"""
+        if self._pending:
+            return next(iter(self._pending.values()))
+        return self._next_cursor
+
+    async def _worker(self, index: int, queue: asyncio.Queue):
+        """工作协程：不断从队列取目标并探测，遇到 None 退出"""
+        while True:
+            while index >= self.limit:
+                if self._draining:
+                    # 队列已经没有新目标，多余的工作协程直接退出
+                    return
+                await self._resized.wait()
+            item = await queue.get()
+            if item is None:
+                # 把结束标记留给其他工作协程
+                queue.put_nowait(None)
+                return
+            seq, target = item
+            try:
+                await self.handler(*target)
+            except Exception:
+                # 单个目标的异常不能让工作协程退出，否则生产者会永久阻塞
+                self.errors += 1
+            # 被取消的目标保留在 _pending 中，继续扫描时会重新探测
+            if seq is not None:
+                del self._pending[seq]
+
+    async def run(self, targets: Iterable[Target]) -> int:
+        """扫描所有目标，返回提交的目标数量"""
+        worker_count = self.max_concurrency
+        if isinstance(targets, Sized):
+            worker_count = max(1, min(worker_count, len(targets)))
+
+        self._draining = False
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        workers = [asyncio.ensure_future(self._worker(i, queue)) for i in range(worker_count)]
+        try:
+            for target in targets:
+                if self.track_cursors:
+                    cursor, target = target
+                    self._pending[self.submitted] = cursor
+                    self._next_cursor = cursor + 1
+                    await queue.put((self.submitted, target))
+                else:
+                    await queue.put((None, target))
+                self.submitted += 1
+            self._draining = True
+            self._wake()
+            await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        return self.submitted
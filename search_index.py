@@ -0,0 +1,221 @@
+import bisect
+import re
+from array import array
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from result_table import StringTable, numpy
+
+# 格式代码（§ 加一个字符）在分词前去掉，不拆开被格式代码隔开的单词
+_FORMAT_CODE = re.compile("§.", re.S)
+_WORD = re.compile(r"\w+")
+_VERSION = re.compile(r"(?<![\d.])(\d+)\.(\d+)(?:\.(\d+))?")
+
+# 版本字符串中常见的服务端 / 代理名称
+SOFTWARE = frozenset((
+    "vanilla", "craftbukkit", "bukkit", "spigot", "paper", "purpur", "folia", "pufferfish", "airplane",
+    "tuinity", "forge", "neoforge", "fabric", "quilt", "sponge", "mohist", "magma", "arclight", "catserver",
+    "velocity", "bungeecord", "waterfall", "travertine", "flamecord", "geyser",
+))
+
+# 可以按字段查询的词项前缀；没有前缀的查询词匹配 MOTD
+FIELDS = ("motd", "version", "protocol", "software", "loader", "mod", "player", "edition", "country")
+# 返回计数的分面
+FACETS = ("version", "software", "loader", "edition", "country")
+FACET_LIMIT = 20
+
+
+class SearchQueryError(ValueError):
+    """搜索语句无效"""
+
+
+@lru_cache(maxsize=1 << 16)
+def motd_tokens(text: str) -> FrozenSet[str]:
+    """MOTD 分词：去掉颜色和格式代码，转小写"""
+    return frozenset(word.lower() for word in _WORD.findall(_FORMAT_CODE.sub("", text)))
+
+
+@lru_cache(maxsize=1 << 12)
+def parse_version(version: str) -> Tuple[FrozenSet[str], Optional[str], Optional[str]]:
+    """解析版本字符串，返回 (版本词项, 主版本系列, 服务端名称)
+
+    "Paper 1.20.4" -> ({"1.20", "1.20.4"}, "1.20", "paper")；
+    "BungeeCord 1.8.x-1.20.x" 这类范围会包含出现的每个版本。
+    """
+    terms = set()
+    family = None
+    for major, minor, patch in _VERSION.findall(version):
+        series = f"{int(major)}.{int(minor)}"
+        family = family or series
+        terms.add(series)
+        if patch:
+            terms.add(f"{series}.{int(patch)}")
+    software = next((word for word in _WORD.findall(version.lower()) if word in SOFTWARE), None)
+    return frozenset(terms), family, software
+
+
+def normalize_version(value: str) -> str:
+    """查询中的版本：去掉 "1.20.x" / "1.20.*" 的通配部分"""
+    value = value.strip().lower()
+    while value.endswith((".x", ".*")):
+        value = value[:-2]
+    return value
+
+
+def record_terms(record: Dict) -> Tuple[set, Dict[str, Optional[str]]]:
+    """一条结果的全部词项和各分面的值"""
+    terms = set()
+    description = record.get("description")
+    if isinstance(description, str):
+        terms.update("motd:" + token for token in motd_tokens(description))
+
+    facets = dict.fromkeys(FACETS)
+    version = record.get("version")
+    if isinstance(version, str):
+        versions, facets["version"], facets["software"] = parse_version(version)
+        terms.update("version:" + v for v in versions)
+        if facets["software"]:
+            terms.add("software:" + facets["software"])
+    if record.get("protocol") is not None:
+        terms.add(f"protocol:{record['protocol']}")
+    if record.get("mod_loader"):
+        facets["loader"] = str(record["mod_loader"]).lower()
+        terms.add("loader:" + facets["loader"])
+    for mod in record.get("mods") or ():
+        terms.add("mod:" + str(mod).lower())
+    for player in record.get("player_list") or ():
+        terms.add("player:" + str(player).lower())
+    if record.get("edition"):
+        facets["edition"] = record["edition"]
+        terms.add("edition:" + record["edition"])
+    country = record.get("country")
+    if isinstance(country, dict) and country.get("code"):
+        facets["country"] = country["code"]
+        terms.add("country:" + country["code"].lower())
+    return terms, facets
+
+
+def parse_query(text: str = "", filters: Optional[Dict[str, str]] = None) -> List[str]:
+    """把搜索语句转成词项列表（各词项之间是“并且”）
+
+    语句由空格分隔，可以是普通单词（匹配 MOTD）或 字段:值，例如
+    "skyblock version:1.20.x software:paper"；以 * 结尾的词按前缀匹配。
+    filters 是额外的 {字段: 值} 条件（来自 URL 参数）。
+    """
+    items = [tuple(part.split(":", 1)) if ":" in part else ("motd", part) for part in text.split()]
+    items.extend((field, value) for field, value in (filters or {}).items() if value)
+    terms = []
+    for field, value in items:
+        field = field.lower()
+        if field not in FIELDS:
+            raise SearchQueryError(f"不支持的搜索字段: {field}（可选: {', '.join(FIELDS)}）")
+        if field == "version":
+            terms.append("version:" + normalize_version(value))
+        elif field == "motd":
+            prefix = value.endswith("*")
+            words = [word.lower() for word in _WORD.findall(_FORMAT_CODE.sub("", value))]
+            terms.extend("motd:" + word for word in words)
+            if prefix and words:
+                terms[-1] += "*"
+        else:
+            terms.append(f"{field}:{value.strip().lower()}")
+    return terms
+
+
+class SearchIndex:
+    """倒排索引：词项 -> 行号数组，结果按行号顺序逐条加入
+
+    每行还记录各分面的值编号，用来统计搜索结果的分面计数。
+    """
+
+    def __init__(self):
+        self.postings = {}  # 词项 -> 行号数组（递增）
+        self.rows = 0
+        self.facet_values = {facet: StringTable() for facet in FACETS}
+        self.facet_columns = {facet: array("H") for facet in FACETS}
+        self._vocabulary = None  # 排序后的词项，前缀查询时按需生成
+
+    def add(self, row: int, record: Dict):
+        """加入一条结果（row 必须递增）"""
+        terms, facets = record_terms(record)
+        for term in terms:
+            rows = self.postings.get(term)
+            if rows is None:
+                rows = self.postings[term] = array("I")
+                self._vocabulary = None
+            rows.append(row)
+        for facet, value in facets.items():
+            self.facet_columns[facet].append(self.facet_values[facet].intern(value))
+        self.rows = row + 1
+
+    def update(self, row: int, old: Dict, new: Dict):
+        """第 row 行的结果从 old 变为 new：只调整变化的词项，行号数组保持递增
+
+        变化的行号数组复制后修改再替换，正在查询的读者不会看到修改到一半的数组。
+        """
+        old_terms, _ = record_terms(old)
+        new_terms, facets = record_terms(new)
+        for term in old_terms - new_terms:
+            rows = array("I", self.postings[term])
+            rows.remove(row)
+            self.postings[term] = rows
+        for term in new_terms - old_terms:
+            rows = self.postings.get(term)
+            if rows is None:
+                self._vocabulary = None
+            rows = array("I", rows or ())
+            bisect.insort(rows, row)
+            self.postings[term] = rows
+        for facet, value in facets.items():
+            self.facet_columns[facet][row] = self.facet_values[facet].intern(value)
+
+    def add_many(self, records: Iterable[Dict], start: int = 0):
+        for row, record in enumerate(records, start):
+            self.add(row, record)
+
+    def _postings(self, term: str):
+        if not term.endswith("*"):
+            return self.postings.get(term, ())
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self.postings)
+        prefix = term[:-1]
+        matched = set()
+        for i in range(bisect.bisect_left(self._vocabulary, prefix), len(self._vocabulary)):
+            if not self._vocabulary[i].startswith(prefix):
+                break
+            matched.update(self.postings[self._vocabulary[i]])
+        return matched
+
+    def match(self, terms: List[str]) -> Optional[set]:
+        """同时包含所有词项的行号集合；没有任何词项时返回 None（表示全部）"""
+        if not terms:
+            return None
+        postings = sorted((self._postings(term) for term in terms), key=len)
+        result = set(postings[0])
+        for rows in postings[1:]:
+            if not result:
+                break
+            result.intersection_update(rows)
+        return result
+
+    def facet_counts(self, rows: Optional[Iterable[int]] = None, limit: int = FACET_LIMIT) -> Dict[str, Dict]:
+        """各分面出现次数最多的值和次数；rows 为 None 时统计全部结果"""
+        if numpy is not None and rows is not None:
+            rows = numpy.fromiter(rows, dtype=numpy.uint32, count=len(rows))
+        counts = {}
+        for facet in FACETS:
+            column = self.facet_columns[facet]
+            values = self.facet_values[facet].values
+            if numpy is not None and len(column):
+                # 安装了 numpy 时在列上向量化计数
+                ids = numpy.frombuffer(column, dtype=numpy.uint16)
+                totals = numpy.bincount(ids if rows is None else ids[rows], minlength=len(values))
+                totals[0] = 0
+                top = [int(i) for i in numpy.argsort(-totals, kind="stable")[:limit] if totals[i]]
+                counts[facet] = {values[i]: int(totals[i]) for i in top}
+                continue
+            counter = Counter(column if rows is None else map(column.__getitem__, rows))
+            counter.pop(0, None)
+            counts[facet] = {values[value_id]: count for value_id, count in counter.most_common(limit)}
+        return counts
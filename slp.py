@@ -0,0 +1,292 @@
+import asyncio
+import json
+import struct
+import time
+from typing import Dict, Optional, Tuple
+
+from profiling import profiler
+
+# 状态查询使用的协议版本号（与 mcstatus 保持一致）
+DEFAULT_PROTOCOL = 47
+# 单个数据包的最大长度，防止恶意服务器让我们分配过大的缓冲区
+MAX_PACKET_SIZE = 1 << 21
+
+# JSON 文本组件中的颜色/格式名称到 § 代码的映射
+COLOR_CODES = {
+    "black": "0", "dark_blue": "1", "dark_green": "2", "dark_aqua": "3",
+    "dark_red": "4", "dark_purple": "5", "gold": "6", "gray": "7",
+    "dark_gray": "8", "blue": "9", "green": "a", "aqua": "b",
+    "red": "c", "light_purple": "d", "yellow": "e", "white": "f",
+}
+FORMAT_CODES = (
+    ("obfuscated", "k"), ("bold", "l"), ("strikethrough", "m"),
+    ("underlined", "n"), ("italic", "o"),
+)
+
+_ping_token = struct.Struct(">q")
+
+
+class SLPError(Exception):
+    """服务器响应不符合 Server List Ping 协议"""
+
+
+def pack_varint(value: int) -> bytes:
+    """编码 VarInt（负数按32位无符号处理）"""
+    value &= 0xFFFFFFFF
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def unpack_varint(data: bytes, offset: int = 0) -> Tuple[int, int]:
+    """从 data[offset:] 解码 VarInt，返回 (值, 新偏移)"""
+    value = 0
+    for i in range(5):
+        if offset >= len(data):
+            raise SLPError("VarInt 数据不完整")
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << (7 * i)
+        if not byte & 0x80:
+            if value & 0x80000000:
+                value -= 1 << 32
+            return value, offset
+    raise SLPError("VarInt 过长")
+
+
+async def read_varint(reader: asyncio.StreamReader) -> int:
+    """从流中读取 VarInt"""
+    value = 0
+    for i in range(5):
+        byte = (await reader.readexactly(1))[0]
+        value |= (byte & 0x7F) << (7 * i)
+        if not byte & 0x80:
+            return value
+    raise SLPError("VarInt 过长")
+
+
+def pack_packet(packet_id: int, payload: bytes = b"") -> bytes:
+    """按 长度 + 包ID + 数据 的格式封装数据包"""
+    body = pack_varint(packet_id) + payload
+    return pack_varint(len(body)) + body
+
+
+def pack_string(text: str) -> bytes:
+    data = text.encode("utf-8")
+    return pack_varint(len(data)) + data
+
+
+async def read_packet(reader: asyncio.StreamReader) -> Tuple[int, bytes, int]:
+    """读取一个数据包，返回 (包ID, 数据, 数据起始偏移)
+
+    只支持旧版协议的服务器会回复 0xFF 踢出包，但长度在 128 以上、低 7 位全为 1 的正常数据包
+    第一个字节也是 0xFF，所以不按第一个字节判断：踢出包按新协议解析会失败（长度或包ID无效、
+    连接被关闭），由 query 回退到旧版 ping。
+    """
+    length = await read_varint(reader)
+    if length <= 0 or length > MAX_PACKET_SIZE:
+        raise SLPError(f"数据包长度无效: {length}")
+    data = await reader.readexactly(length)
+    packet_id, offset = unpack_varint(data)
+    return packet_id, data, offset
+
+
+def flatten_description(component) -> str:
+    """把 JSON 文本组件展开成带 § 格式代码的字符串"""
+    if isinstance(component, str):
+        return component
+    if isinstance(component, list):
+        return "".join(flatten_description(part) for part in component)
+    if not isinstance(component, dict):
+        return ""
+
+    parts = []
+    color = component.get("color")
+    if color in COLOR_CODES:
+        parts.append("§" + COLOR_CODES[color])
+    for key, code in FORMAT_CODES:
+        if component.get(key):
+            parts.append("§" + code)
+    parts.append(str(component.get("text", "")))
+    for extra in component.get("extra", ()):
+        parts.append(flatten_description(extra))
+    return "".join(parts)
+
+
+def parse_status(raw: Dict) -> Dict:
+    """把服务器返回的状态 JSON 直接解码为结果字段"""
+    try:
+        version = raw["version"]
+        players = raw["players"]
+        info = {
+            "version": str(version["name"]),
+            "protocol": int(version["protocol"]),
+            "players_online": int(players["online"]),
+            "players_max": int(players["max"]),
+            "description": flatten_description(raw.get("description", "")),
+        }
+    except (KeyError, TypeError, ValueError) as e:
+        raise SLPError(f"状态响应缺少字段: {e}")
+
+    sample = players.get("sample")
+    if sample:
+        info["player_list"] = [player["name"] for player in sample
+                               if isinstance(player, dict) and "name" in player]
+
+    # Forge 服务器在状态中附带模组信息：1.13+ 为 forgeData，更早的版本为 modinfo
+    forge_data, modinfo = raw.get("forgeData"), raw.get("modinfo")
+    mods = None
+    if isinstance(forge_data, dict):
+        info["mod_loader"] = "forge"
+        mods = [mod.get("modId") for mod in forge_data.get("mods") or () if isinstance(mod, dict)]
+    elif isinstance(modinfo, dict):
+        info["mod_loader"] = str(modinfo.get("type") or "fml").lower()
+        mods = [mod.get("modid") for mod in modinfo.get("modList") or () if isinstance(mod, dict)]
+    if mods:
+        info["mods"] = [str(mod) for mod in mods if mod]
+    return info
+
+
+async def _open(host: str, port: int):
+    return await asyncio.open_connection(host, port)
+
+
+def _close(writer: asyncio.StreamWriter):
+    try:
+        writer.close()
+    except Exception:
+        pass
+
+
+async def query_modern(host: str, port: int, ping: bool = False,
+                       protocol: int = DEFAULT_PROTOCOL, server_address: Optional[str] = None) -> Dict:
+    """1.7+ 协议：握手 + 状态请求，可选 ping 测延迟
+
+    server_address 是握手包中的服务器地址（连接的是解析后的IP时传入原始域名，虚拟主机才能识别）
+    """
+    reader, writer = await _open(host, port)
+    try:
+        handshake = pack_packet(0x00, pack_varint(protocol) + pack_string(server_address or host)
+                                + struct.pack(">H", port) + pack_varint(1))
+        # 握手和状态请求合并为一次写入
+        start = time.perf_counter()
+        writer.write(handshake + pack_packet(0x00))
+        with profiler.stage("read"):
+            packet_id, data, offset = await read_packet(reader)
+        latency = (time.perf_counter() - start) * 1000
+        if packet_id != 0x00:
+            raise SLPError(f"状态响应包ID无效: {packet_id}")
+
+        with profiler.stage("decode"):
+            length, offset = unpack_varint(data, offset)
+            try:
+                raw = json.loads(data[offset:offset + length].decode("utf-8"))
+            except (UnicodeDecodeError, ValueError):
+                raise SLPError("状态响应不是有效的JSON")
+            if not isinstance(raw, dict):
+                raise SLPError("状态响应不是JSON对象")
+            info = parse_status(raw)
+
+        if ping:
+            token = int(time.time() * 1000)
+            start = time.perf_counter()
+            writer.write(pack_packet(0x01, _ping_token.pack(token)))
+            packet_id, data, offset = await read_packet(reader)
+            if packet_id != 0x01 or data[offset:offset + 8] != _ping_token.pack(token):
+                raise SLPError("ping 响应无效")
+            latency = (time.perf_counter() - start) * 1000
+
+        info["latency"] = latency
+        return info
+    finally:
+        _close(writer)
+
+
+def _parse_legacy(text: str, latency: float) -> Dict:
+    """解析旧版 ping 的踢出消息"""
+    if text.startswith("§1\x00"):
+        # 1.4 - 1.6: §1 \0 协议号 \0 版本 \0 MOTD \0 在线人数 \0 最大人数
+        fields = text.split("\x00")
+        if len(fields) != 6:
+            raise SLPError("旧版 ping 响应格式无效")
+        _, protocol, version, motd, online, maximum = fields
+    else:
+        # 1.4 之前: MOTD § 在线人数 § 最大人数
+        fields = text.rsplit("§", 2)
+        if len(fields) != 3:
+            raise SLPError("旧版 ping 响应格式无效")
+        motd, online, maximum = fields
+        protocol, version = "-1", "<1.4"
+    try:
+        return {
+            "version": version,
+            "protocol": int(protocol),
+            "players_online": int(online),
+            "players_max": int(maximum),
+            "description": motd,
+            "latency": latency,
+        }
+    except ValueError:
+        raise SLPError("旧版 ping 响应格式无效")
+
+
+async def _query_legacy(host: str, port: int, request: bytes) -> Dict:
+    reader, writer = await _open(host, port)
+    try:
+        start = time.perf_counter()
+        writer.write(request)
+        with profiler.stage("read"):
+            header = await reader.readexactly(3)
+            latency = (time.perf_counter() - start) * 1000
+            if header[0] != 0xFF:
+                raise SLPError("旧版 ping 响应包ID无效")
+            length = struct.unpack(">H", header[1:])[0]
+            data = await reader.readexactly(length * 2)
+        try:
+            text = data.decode("utf-16-be")
+        except UnicodeDecodeError:
+            raise SLPError("旧版 ping 响应编码无效")
+        return _parse_legacy(text, latency)
+    finally:
+        _close(writer)
+
+
+async def query_legacy(host: str, port: int, server_address: Optional[str] = None) -> Dict:
+    """1.6 格式的旧版 ping（1.4 - 1.6 服务器）"""
+    server_address = server_address or host
+    host_data = server_address.encode("utf-16-be")
+    channel = "MC|PingHost".encode("utf-16-be")
+    payload = (struct.pack(">B", 74) + struct.pack(">H", len(server_address)) + host_data
+               + struct.pack(">i", port))
+    request = (b"\xfe\x01\xfa" + struct.pack(">H", len(channel) // 2) + channel
+               + struct.pack(">H", len(payload)) + payload)
+    return await _query_legacy(host, port, request)
+
+
+async def query_beta(host: str, port: int, server_address: Optional[str] = None) -> Dict:
+    """1.4 之前的旧版 ping（只发送 0xFE）"""
+    return await _query_legacy(host, port, b"\xfe")
+
+
+async def query(host: str, port: int, ping: bool = False, legacy: bool = True,
+                server_address: Optional[str] = None) -> Dict:
+    """查询服务器状态；新协议无法识别时依次回退到 1.6 和 1.4 之前的旧版 ping"""
+    try:
+        return await query_modern(host, port, ping, server_address=server_address)
+    except (SLPError, asyncio.IncompleteReadError, ConnectionResetError) as e:
+        if not legacy:
+            raise
+        error = e
+
+    for fallback in (query_legacy, query_beta):
+        try:
+            return await fallback(host, port, server_address)
+        except (SLPError, asyncio.IncompleteReadError, ConnectionResetError):
+            continue
+    raise error
@@ -0,0 +1,425 @@
+import bisect
+import bz2
+import gzip
+import hashlib
+import ipaddress
+import lzma
+import math
+import random
+import re
+import socket
+import struct
+from collections import Counter
+from typing import Generator, Iterable, Iterator, List, Optional, Tuple
+
+Interval = Tuple[int, int]  # 闭区间 [start, end]，均为整数形式的IPv4地址
+
+IPV4_MAX = 2**32 - 1
+
+# 默认排除的私有/保留IP范围
+DEFAULT_EXCLUDES = [
+    "10.0.0.0/8",
+    "172.16.0.0/12",
+    "192.168.0.0/16",
+    "127.0.0.0/8",
+    "169.254.0.0/16",  # 链路本地地址
+    "224.0.0.0/4",     # 多播地址
+    "240.0.0.0/4",     # 保留地址
+]
+
+# IPv6 默认排除的范围（目标列表文件中的 IPv6 地址使用）
+DEFAULT_EXCLUDES_V6 = [
+    "::/128",          # 未指定地址
+    "::1/128",         # 回环地址
+    "::ffff:0:0/96",   # IPv4 映射地址（直接写 IPv4 地址扫描）
+    "64:ff9b:1::/48",  # 本地使用的 NAT64 前缀
+    "100::/64",        # 丢弃前缀
+    "2001:db8::/32",   # 文档地址
+    "fc00::/7",        # 唯一本地地址
+    "fe80::/10",       # 链路本地地址
+    "ff00::/8",        # 多播地址
+]
+
+_pack_ip = struct.Struct("!I").pack
+
+
+def int_to_ip(value: int) -> str:
+    """整数转点分十进制IP字符串（只在真正发起连接时调用）"""
+    return socket.inet_ntoa(_pack_ip(value))
+
+
+def ip_to_int(ip: str) -> int:
+    """点分十进制IP字符串转整数"""
+    return struct.unpack("!I", socket.inet_aton(ip))[0]
+
+
+def is_ip_literal(host: str) -> bool:
+    """判断主机名是否为IP地址字面量（IPv4或IPv6）"""
+    for family in (socket.AF_INET, socket.AF_INET6):
+        try:
+            socket.inet_pton(family, host)
+            return True
+        except OSError:
+            continue
+    return False
+
+
+def cidr_to_interval(cidr: str) -> Interval:
+    """CIDR（或单个IP）转闭区间"""
+    network = ipaddress.IPv4Network(cidr.strip(), strict=False)
+    return int(network.network_address), int(network.broadcast_address)
+
+
+def merge_intervals(intervals: Iterable[Interval]) -> List[Interval]:
+    """合并为有序、互不相交的区间列表"""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1] + 1:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def subtract_intervals(ranges: List[Interval], excludes: List[Interval]) -> List[Interval]:
+    """从有序区间 ranges 中减去有序区间 excludes"""
+    result = []
+    i = 0
+    for start, end in ranges:
+        # 跳过完全位于当前区间之前的排除区间
+        while i < len(excludes) and excludes[i][1] < start:
+            i += 1
+        j = i
+        current = start
+        while j < len(excludes) and excludes[j][0] <= end:
+            ex_start, ex_end = excludes[j]
+            if ex_start > current:
+                result.append((current, ex_start - 1))
+            current = max(current, ex_end + 1)
+            j += 1
+        if current <= end:
+            result.append((current, end))
+    return result
+
+
+def is_prime(n: int) -> bool:
+    """Miller-Rabin 素性检测（对 n < 3.3e24 是确定性的）"""
+    if n < 2:
+        return False
+    small_primes = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41)
+    for p in small_primes:
+        if n % p == 0:
+            return n == p
+    d, r = n - 1, 0
+    while d % 2 == 0:
+        d //= 2
+        r += 1
+    for a in small_primes:
+        x = pow(a, d, n)
+        if x in (1, n - 1):
+            continue
+        for _ in range(r - 1):
+            x = x * x % n
+            if x == n - 1:
+                break
+        else:
+            return False
+    return True
+
+
+def prime_factors(n: int) -> List[int]:
+    """试除法分解质因数（n 不超过 2^33 左右时足够快）"""
+    factors = []
+    p = 2
+    while p * p <= n:
+        if n % p == 0:
+            factors.append(p)
+            while n % p == 0:
+                n //= p
+        p += 1 if p == 2 else 2
+    if n > 1:
+        factors.append(n)
+    return factors
+
+
+class CyclicPermutation:
+    """基于乘法循环群 (Z/pZ)* 的伪随机排列（ZMap 方式）
+
+    选取大于 size 的最小素数 p 和一个随机原根 g，从随机起点 x0 出发不断乘 g，
+    会恰好遍历 1..p-1 各一次；丢弃大于 size 的元素即得到 [0, size) 的排列。
+    不需要为每个地址保存状态，分片 i/N 只取循环中位置 ≡ i (mod N) 的元素。
+    """
+
+    def __init__(self, size: int, seed: int = 0, shard: int = 0, shards: int = 1):
+        if not 0 <= shard < shards:
+            raise ValueError(f"分片编号无效: {shard}/{shards}")
+        self.size = size
+        self.seed = seed
+        self.shard = shard
+        self.shards = shards
+        self.prime = size + 1
+        while not is_prime(self.prime):
+            self.prime += 1
+
+        rng = random.Random(seed)
+        order = self.prime - 1
+        factors = prime_factors(order)
+        if self.prime == 2:
+            self.generator = 1
+        else:
+            while True:
+                g = rng.randrange(2, self.prime)
+                if all(pow(g, order // q, self.prime) != 1 for q in factors):
+                    self.generator = g
+                    break
+        self.start = rng.randrange(1, self.prime)
+        # 当前分片在整个循环中需要走的步数
+        self.steps = (order - shard + shards - 1) // shards
+
+    def iter_from(self, position: int = 0) -> Generator[Tuple[int, int], None, None]:
+        """从分片内第 position 步开始，生成 (所在步数, 排列值)，便于断点续扫"""
+        p = self.prime
+        step = pow(self.generator, self.shards, p)
+        x = self.start * pow(self.generator, self.shard + position * self.shards, p) % p
+        size = self.size
+        for k in range(position, self.steps):
+            if x <= size:
+                yield k, x - 1
+            x = x * step % p
+
+    def __iter__(self) -> Generator[int, None, None]:
+        for _, value in self.iter_from(0):
+            yield value
+
+
+def load_cidr_file(path: str) -> List[str]:
+    """读取CIDR列表文件，每行一个网段，支持 # 注释"""
+    cidrs = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            if line:
+                cidrs.append(line)
+    return cidrs
+
+
+class ExcludeSet:
+    """IPv4 和 IPv6 排除网段，各自合并成有序区间后二分查找"""
+
+    def __init__(self, cidrs: Iterable[str]):
+        intervals = {4: [], 6: []}
+        for cidr in cidrs:
+            network = ipaddress.ip_network(cidr.strip(), strict=False)
+            intervals[network.version].append((int(network.network_address), int(network.broadcast_address)))
+        self.intervals = {version: merge_intervals(ranges) for version, ranges in intervals.items()}
+        self._starts = {version: [start for start, _ in ranges] for version, ranges in self.intervals.items()}
+
+    def __contains__(self, address) -> bool:
+        """address 为 ipaddress.IPv4Address / IPv6Address"""
+        value = int(address)
+        intervals = self.intervals[address.version]
+        index = bisect.bisect_right(self._starts[address.version], value) - 1
+        return index >= 0 and value <= intervals[index][1]
+
+    def remaining(self, network) -> List[Interval]:
+        """网段中没有被排除的部分（整数区间）"""
+        return subtract_intervals([(int(network.network_address), int(network.broadcast_address))],
+                                  self.intervals[network.version])
+
+
+class BloomFilter:
+    """固定内存的 Bloom 过滤器：加入 capacity 个元素时误判率约为 error_rate
+
+    误判表示一个没有出现过的元素被当成重复（用于目标去重时这个目标会被跳过）。
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        self.capacity = capacity
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))  # 位数
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def add(self, key: bytes) -> bool:
+        """加入 key，返回之前是否（可能）已经加入过"""
+        digest = hashlib.blake2b(key, digest_size=16).digest()
+        # 双重哈希：第 i 个位置为 h1 + i * h2
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        bits, size = self.bits, self.size
+        present = True
+        for i in range(self.hashes):
+            bit = (h1 + i * h2) % size
+            mask = 1 << (bit & 7)
+            if not bits[bit >> 3] & mask:
+                bits[bit >> 3] |= mask
+                present = False
+        if not present:
+            self.count += 1
+        return present
+
+
+MAX_CIDR_SIZE = 1 << 24  # 目标列表中单个网段最多展开的地址数（IPv6 网段通常大得无法扫描）
+_HOSTNAME = re.compile(r"(?!-)[a-z0-9_-]{1,63}(?<!-)(\.(?!-)[a-z0-9_-]{1,63}(?<!-))*")
+_COMPRESSED = ((b"\x1f\x8b", gzip.open), (b"BZh", bz2.open), (b"\xfd7zXZ\x00", lzma.open))
+
+
+def open_targets_file(path: str):
+    """以文本方式打开目标列表文件，按文件头自动识别 gzip / bz2 / xz 压缩"""
+    with open(path, "rb") as f:
+        magic = f.read(6)
+    for prefix, opener in _COMPRESSED:
+        if magic.startswith(prefix):
+            return opener(path, "rt", encoding="utf-8", errors="replace")
+    return open(path, "r", encoding="utf-8", errors="replace")
+
+
+def parse_target(text: str) -> Tuple[object, Optional[int]]:
+    """解析目标列表中的一项，返回 (地址 / 网段 / 主机名, 端口或 None)
+
+    支持 1.2.3.4、1.2.3.4:25565、2001:db8::1、[2001:db8::1]:25565、1.2.3.0/24、2001:db8::/120、
+    mc.example.com、mc.example.com:25565；格式无效时抛出 ValueError。
+    """
+    port = None
+    if text.startswith("["):
+        host, separator, rest = text[1:].partition("]")
+        if not separator or (rest and not rest.startswith(":")):
+            raise ValueError(f"无效的目标: {text}")
+        text, port = host, (rest[1:] or None)
+    elif text.count(":") == 1:
+        text, port = text.split(":")
+    if port is not None:
+        port = int(port)
+        if not 0 < port < 65536:
+            raise ValueError(f"无效的端口: {port}")
+    if "/" in text:
+        return ipaddress.ip_network(text, strict=False), port
+    try:
+        return ipaddress.ip_address(text), port
+    except ValueError:
+        pass
+    name = text.rstrip(".").lower()
+    # 最后一段全是数字的不是主机名（例如写错的 IPv4 地址）
+    if len(name) > 253 or not _HOSTNAME.fullmatch(name) or name.rsplit(".", 1)[-1].isdigit():
+        raise ValueError(f"无效的目标: {text}")
+    return name, port
+
+
+class TargetFile:
+    """逐行读取目标列表文件（可以是压缩文件），生成去重并排除保留地址后的 (主机, 端口)
+
+    每行一个目标（格式见 parse_target，# 之后为注释，只取每行第一列），网段在读取时逐个展开，
+    不会把整个文件读入内存。没有写端口的目标端口为 default_port（None 表示由调用方决定）。
+    dedup 为 BloomFilter 时跳过重复的目标；主机名在连接时才解析，不检查排除网段。
+    counts 记录读取的行数、生成的目标数和各种原因跳过的数量。
+    """
+
+    def __init__(self, path: str, excludes: ExcludeSet, dedup: Optional[BloomFilter] = None,
+                 default_port: Optional[int] = None, max_cidr_size: int = MAX_CIDR_SIZE):
+        self.path = path
+        self.excludes = excludes
+        self.dedup = dedup
+        self.default_port = default_port
+        self.max_cidr_size = max_cidr_size
+        self.counts = Counter()
+
+    def _new(self, key: bytes, port: Optional[int]) -> bool:
+        if self.dedup is None:
+            return True
+        if self.dedup.add(key + struct.pack("!H", port or 0)):
+            self.counts["duplicates"] += 1
+            return False
+        return True
+
+    def _expand(self, target, port: Optional[int]) -> Iterator[Tuple[str, Optional[int]]]:
+        if isinstance(target, str):
+            if self._new(target.encode("utf-8"), port):
+                yield target, port
+            return
+        if isinstance(target, (ipaddress.IPv4Address, ipaddress.IPv6Address)):
+            if target in self.excludes:
+                self.counts["excluded"] += 1
+            elif self._new(target.packed, port):
+                yield str(target), port
+            return
+        if target.num_addresses > self.max_cidr_size:
+            self.counts["oversized"] += 1
+            return
+        address_class = type(target.network_address)
+        remaining = self.excludes.remaining(target)
+        self.counts["excluded"] += target.num_addresses - sum(end - start + 1 for start, end in remaining)
+        for start, end in remaining:
+            for value in range(start, end + 1):
+                address = address_class(value)
+                if self._new(address.packed, port):
+                    yield str(address), port
+
+    def __iter__(self) -> Iterator[Tuple[str, Optional[int]]]:
+        with open_targets_file(self.path) as f:
+            for line in f:
+                fields = line.split("#", 1)[0].split()
+                if not fields:
+                    continue
+                self.counts["lines"] += 1
+                try:
+                    target, port = parse_target(fields[0])
+                except ValueError:
+                    self.counts["invalid"] += 1
+                    continue
+                for host, target_port in self._expand(target, port or self.default_port):
+                    self.counts["targets"] += 1
+                    yield host, target_port
+
+
+class TargetSpace:
+    """以整数区间表示的扫描目标空间，排除网段在构造时一次性预编译"""
+
+    def __init__(self, ranges: Optional[Iterable[Interval]] = None,
+                 excludes: Optional[Iterable[str]] = None):
+        if ranges is None:
+            ranges = [(0, IPV4_MAX)]
+        if excludes is None:
+            excludes = DEFAULT_EXCLUDES
+        self.excluded = merge_intervals(cidr_to_interval(cidr) for cidr in excludes)
+        self.intervals = subtract_intervals(merge_intervals(ranges), self.excluded)
+        self._starts = [start for start, _ in self.intervals]
+        # 每个区间之前的地址总数，用于按序号定位地址
+        self._offsets = []
+        self.size = 0
+        for start, end in self.intervals:
+            self._offsets.append(self.size)
+            self.size += end - start + 1
+
+    @classmethod
+    def from_cidrs(cls, cidrs: Iterable[str], excludes: Optional[Iterable[str]] = None) -> "TargetSpace":
+        """由CIDR列表构建目标空间"""
+        return cls((cidr_to_interval(cidr) for cidr in cidrs), excludes)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __contains__(self, value: int) -> bool:
+        index = bisect.bisect_right(self._starts, value) - 1
+        return index >= 0 and value <= self.intervals[index][1]
+
+    def __iter__(self) -> Generator[int, None, None]:
+        for start, end in self.intervals:
+            yield from range(start, end + 1)
+
+    def nth(self, index: int) -> int:
+        """返回目标空间中第 index 个地址"""
+        i = bisect.bisect_right(self._offsets, index) - 1
+        return self.intervals[i][0] + index - self._offsets[i]
+
+    def permuted(self, seed: int = 0, shard: int = 0, shards: int = 1) -> Generator[int, None, None]:
+        """按伪随机顺序遍历目标空间，每个地址恰好一次"""
+        for index in CyclicPermutation(self.size, seed, shard, shards):
+            yield self.nth(index)
+
+    def targets(self, ports: Iterable[int], order: Optional[Iterable[int]] = None) -> Generator[Tuple[int, int], None, None]:
+        """生成 (整数IP, 端口) 目标，order 为自定义的地址顺序"""
+        ports = list(ports)
+        for ip in (self if order is None else order):
+            for port in ports:
+                yield ip, port
@@ -0,0 +1,164 @@
+import asyncio
+import bisect
+import json
+import os
+import time
+from collections import Counter, deque
+from typing import Callable, Dict, Optional, Sequence
+
+# 延迟直方图的桶上界（秒），与 Prometheus 默认桶一致
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def bucket_percentile(buckets: Sequence[float], counts: Sequence[int], q: float) -> Optional[float]:
+    """按桶估算分位数（返回所在桶的上界）"""
+    total = sum(counts)
+    if not total:
+        return None
+    target = q * total
+    seen = 0
+    for i, count in enumerate(counts):
+        seen += count
+        if seen >= target:
+            return buckets[i] if i < len(buckets) else float("inf")
+    return float("inf")
+
+
+class Histogram:
+    """固定桶的延迟直方图，记录一次只需要一次二分查找"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def percentile(self, q: float) -> Optional[float]:
+        return bucket_percentile(self.buckets, self.counts, q)
+
+    def summary(self) -> Dict:
+        return {
+            "count": self.count,
+            "avg": self.sum / self.count if self.count else None,
+            "p50": self.percentile(0.5),
+            "p90": self.percentile(0.9),
+            "p99": self.percentile(0.99),
+        }
+
+
+class Telemetry:
+    """扫描计数器和各阶段延迟；探测协程只做计数，渲染和导出由定时任务完成"""
+
+    def __init__(self):
+        self.counters = Counter()
+        self.histograms = {}
+        self.gauges = {}
+        self.decisions = deque(maxlen=20)  # 最近的自动调节决策
+
+    def incr(self, name: str, value: int = 1):
+        self.counters[name] += value
+
+    def observe(self, stage: str, seconds: float):
+        self.histogram(stage).observe(seconds)
+
+    def histogram(self, stage: str) -> Histogram:
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            histogram = self.histograms[stage] = Histogram()
+        return histogram
+
+    def record_decision(self, decision: Dict):
+        self.decisions.append(decision)
+
+    def snapshot(self) -> Dict:
+        return {
+            "time": time.time(),
+            "gauges": dict(self.gauges),
+            "counters": dict(self.counters),
+            "latency": {stage: h.summary() for stage, h in self.histograms.items()},
+            "decisions": list(self.decisions),
+        }
+
+    def prometheus(self, prefix: str = "mcserverradar") -> str:
+        """导出 Prometheus 文本格式"""
+        lines = []
+        for name, value in sorted(self.gauges.items()):
+            lines.append(f"# TYPE {prefix}_{name} gauge")
+            lines.append(f"{prefix}_{name} {value}")
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            lines.append(f"{prefix}_{name}_total {value}")
+        for stage, histogram in sorted(self.histograms.items()):
+            metric = f"{prefix}_{stage}_seconds"
+            lines.append(f"# TYPE {metric} histogram")
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f'{metric}_bucket{{le="{bound}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{le="+Inf"}} {histogram.count}')
+            lines.append(f"{metric}_sum {histogram.sum}")
+            lines.append(f"{metric}_count {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_stats_file(self, path: str):
+        """原子地写入 JSON 统计文件"""
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    async def serve_metrics(self, host: str = "127.0.0.1", port: int = 9108):
+        """启动一个只提供 /metrics 的极简 HTTP 服务"""
+        async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+            try:
+                request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+                # 读掉请求头
+                while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b"\r\n", b"\n", b""):
+                    pass
+                if request_line.split(b" ")[1:2] == [b"/metrics"]:
+                    body = self.prometheus().encode("utf-8")
+                    status = b"200 OK"
+                else:
+                    body, status = b"not found\n", b"404 Not Found"
+                writer.write(b"HTTP/1.1 " + status + b"\r\nContent-Type: text/plain; version=0.0.4\r\n"
+                             + f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("ascii") + body)
+                await writer.drain()
+            except (asyncio.TimeoutError, ConnectionError):
+                pass
+            finally:
+                writer.close()
+
+        return await asyncio.start_server(handle, host, port)
+
+
+class Reporter:
+    """按固定频率渲染进度行并导出统计信息的定时任务"""
+
+    def __init__(self, telemetry: Telemetry, render: Callable[[], None],
+                 collect: Optional[Callable[[], Dict]] = None, interval: float = 0.5,
+                 stats_file: Optional[str] = None):
+        self.telemetry = telemetry
+        self.render = render
+        self.collect = collect
+        self.interval = interval
+        self.stats_file = stats_file
+
+    def tick(self):
+        if self.collect:
+            self.telemetry.gauges.update(self.collect())
+        self.render()
+        if self.stats_file:
+            try:
+                self.telemetry.write_stats_file(self.stats_file)
+            except OSError:
+                pass
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            self.tick()
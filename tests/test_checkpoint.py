@@ -0,0 +1,101 @@
+import asyncio
+import json
+
+import pytest
+
+import checkpoint
+from checkpoint import Checkpoint
+from mc_scanner import MinecraftServerScanner
+from targets import CyclicPermutation, TargetSpace, ip_to_int
+
+RANGES = [(ip_to_int("1.2.3.0"), ip_to_int("1.2.3.255"))]
+COUNTERS = {"scan_count": 0, "open_count": 0, "found_count": 0, "elapsed": 0}
+
+
+def make_scanner(tmp_path, seed=7) -> MinecraftServerScanner:
+    """只扫描 1.2.3.0/24 一个网段的“国家”，不需要 GeoIP 数据库"""
+    scanner = MinecraftServerScanner()
+    scanner.set_output(str(tmp_path / "results.jsonl"))
+    scanner.checkpoint = Checkpoint(str(tmp_path / "checkpoint.json"))
+    scanner.seed = seed
+    scanner.country_ranges = {"build_epoch": 1, "countries": {"ZZ": []}}
+    scanner.download_geoip_db = lambda: None
+    scanner.get_country_ip_count = lambda code: (len(RANGES), RANGES)
+    return scanner
+
+
+def country_config(scanner) -> dict:
+    return {"mode": "country", "country": "ZZ", "db_build_epoch": 1, "port": 25565, "seed": scanner.seed,
+            "shard": [0, 1], "excludes": scanner.excludes}
+
+
+def test_resume_completed_checkpoint_without_scans(tmp_path, capsys):
+    scanner = make_scanner(tmp_path)
+    steps = CyclicPermutation(TargetSpace(RANGES, scanner.excludes).size, scanner.seed).steps
+    scanner.checkpoint.save(country_config(scanner), steps, COUNTERS, completed=True)
+    scanner.resume = True
+    # 已经完成且没有扫描过任何地址的检查点：汇总信息不能除以0，结果仍然要保存
+    asyncio.run(scanner.scan_country("ZZ"))
+    scanner.close_sink()
+    out = capsys.readouterr().out
+    assert "检查点显示该扫描已经完成" in out
+    assert "服务器密度: 0.0000%" in out
+    assert (tmp_path / "results.jsonl").exists()
+
+
+def test_save_is_atomic(tmp_path, monkeypatch):
+    saved = Checkpoint(str(tmp_path / "checkpoint.json"))
+    saved.save({"mode": "all-ipv4"}, 10, COUNTERS)
+
+    def fail(*args, **kwargs):
+        raise OSError("磁盘已满")
+
+    monkeypatch.setattr(checkpoint.json, "dump", fail)
+    with pytest.raises(OSError):
+        saved.save({"mode": "all-ipv4"}, 20, COUNTERS)
+    # 写入失败时原来的检查点保持完整
+    assert saved.load()["cursor"] == 10
+
+
+def test_interrupt_and_resume_probes_each_target_once(tmp_path):
+    probed = []
+
+    def stub(scanner, stop=None):
+        async def scan_server(host, port, edition="java", hostname=None):
+            if stop is not None and len(probed) == 100:
+                # 第 101 个目标探测到一半时扫描被中断
+                stop.set()
+                await asyncio.Event().wait()
+            await asyncio.sleep(0)
+            probed.append((host, port))
+        scanner.scan_server = scan_server
+        scanner.concurrency = 4
+
+    async def interrupted():
+        scanner = make_scanner(tmp_path)
+        stop = asyncio.Event()
+        stub(scanner, stop)
+        task = asyncio.ensure_future(scanner.scan_country("ZZ"))
+        await stop.wait()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        scanner.close_sink()
+
+    asyncio.run(interrupted())
+    with open(tmp_path / "checkpoint.json", encoding="utf-8") as f:
+        state = json.load(f)
+    assert not state["completed"] and state["cursor"] > 0
+    assert not (tmp_path / "checkpoint.json.tmp").exists()
+    first_run = len(probed)
+
+    # 不指定种子继续扫描：沿用检查点中的种子和位置
+    scanner = make_scanner(tmp_path, seed=None)
+    scanner.resume = True
+    stub(scanner)
+    asyncio.run(scanner.scan_country("ZZ"))
+    scanner.close_sink()
+    assert scanner.seed == 7
+    assert 0 < first_run < len(probed)
+    assert len(probed) == len(set(probed)) == 256
+    assert Checkpoint(str(tmp_path / "checkpoint.json")).load()["completed"]
@@ -0,0 +1,85 @@
+import json
+
+from delta import DeltaTracker, ResponsiveMap, incremental_targets
+from targets import TargetSpace, ip_to_int
+
+
+def record(host: str, port: int = 25565, **fields):
+    return dict({"host": host, "port": port, "version": "1.20.4", "protocol": 765, "players_online": 1,
+                 "players_max": 20, "description": "motd", "timestamp": "2024-01-01T00:00:00"}, **fields)
+
+
+def read_events(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_delta_tracker(tmp_path):
+    previous = {(r["host"], r["port"]): r for r in [
+        record("1.1.1.1"), record("1.1.1.2"), record("1.1.1.3"), record("1.1.1.4"), record("1.1.1.5")]}
+    path = str(tmp_path / "delta.jsonl")
+    responsive = ResponsiveMap()
+    tracker = DeltaTracker(previous, path, responsive)
+    tracker.attempted.update([("1.1.1.1", 25565), ("1.1.1.2", 25565), ("1.1.1.3", 25565), ("1.1.1.4", 25565)])
+
+    # 在线人数变化不算变化
+    assert not tracker.observe(record("1.1.1.1", players_online=15))
+    assert tracker.observe(record("1.1.1.2", version="1.21"))
+    assert tracker.observe(record("2.2.2.2"))
+    assert tracker.observe(record("1.1.1.3", port=25566))
+    # 1.1.1.3:25565 和 1.1.1.4 复查过但没有响应；1.1.1.5 没有复查，不算消失
+    assert tracker.finish() == {("1.1.1.3", 25565), ("1.1.1.4", 25565)}
+
+    assert dict(tracker.counts) == {"unchanged": 1, "changed": 1, "new": 2, "gone": 2}
+    events = read_events(path)
+    changed = [e for e in events if e["change"] == "changed"]
+    assert changed[0]["fields"] == {"version": ["1.20.4", "1.21"]}
+    assert sorted((e["host"], e["port"]) for e in events if e["change"] == "new") == [
+        ("1.1.1.3", 25566), ("2.2.2.2", 25565)]
+    gone = [e for e in events if e["change"] == "gone"]
+    assert [(e["host"], e["last_seen"]) for e in gone] == [("1.1.1.3", "2024-01-01T00:00:00"),
+                                                          ("1.1.1.4", "2024-01-01T00:00:00")]
+    # 响应的服务器标记到位图
+    assert ip_to_int("2.2.2.2") >> 8 in responsive
+    assert ip_to_int("1.1.1.4") >> 8 in responsive
+
+
+def test_responsive_map_round_trip(tmp_path):
+    responsive = ResponsiveMap()
+    for host in ("0.0.0.1", "1.2.3.4", "1.2.3.200", "1.2.5.1", "255.255.255.255"):
+        responsive.mark(ip_to_int(host))
+    path = str(tmp_path / "responsive.bin")
+    responsive.save(path)
+    loaded = ResponsiveMap.load(path)
+    assert loaded.bits == responsive.bits
+    assert len(loaded) == 4
+    assert list(loaded.prefixes()) == [0, ip_to_int("1.2.3.0") >> 8, ip_to_int("1.2.5.0") >> 8, (1 << 24) - 1]
+    assert loaded.intervals()[1] == (ip_to_int("1.2.3.0"), ip_to_int("1.2.3.255"))
+    expanded = loaded.expanded(1)
+    # 相邻网段合并：{0, 1}、1.2.2 到 1.2.6、最后两个 /24
+    assert ip_to_int("1.2.4.0") >> 8 in expanded and len(expanded) == 2 + 5 + 2
+
+
+def test_responsive_map_load_missing_or_corrupt(tmp_path):
+    assert len(ResponsiveMap.load(str(tmp_path / "missing.bin"))) == 0
+    corrupt = tmp_path / "corrupt.bin"
+    corrupt.write_bytes(b"not zlib")
+    assert len(ResponsiveMap.load(str(corrupt))) == 0
+
+
+def test_incremental_targets():
+    space = TargetSpace([(ip_to_int("10.0.0.0"), ip_to_int("10.0.3.255"))], [])
+    known = [ip_to_int("10.0.1.7"), ip_to_int("10.0.1.7"), ip_to_int("192.168.0.1")]
+    covered = ResponsiveMap()
+    covered.mark(ip_to_int("10.0.1.7"))
+    targets, total = incremental_targets(space, 25565, known, covered, 0.5, seed=1)
+    targets = list(targets)
+    # 先是已知服务器（空间外的忽略），然后是热点网段中的其余地址，最后是冷空间抽样
+    assert targets[0] == (ip_to_int("10.0.1.7"), 25565)
+    assert targets[1:256] == [(ip, 25565) for ip in range(ip_to_int("10.0.1.0"), ip_to_int("10.0.2.0"))
+                              if ip != ip_to_int("10.0.1.7")]
+    ips = [ip for ip, _ in targets]
+    assert len(ips) == len(set(ips))
+    assert all(ip in space for ip in ips)
+    assert all(ip >> 8 != ip_to_int("10.0.1.0") >> 8 for ip in ips[256:])
+    assert len(ips) <= total == 256 + 512
@@ -0,0 +1,25 @@
+import time
+
+import pytest
+
+from probes import parse_port_set
+
+
+def test_parse_port_set():
+    assert parse_port_set("25565-25567, bedrock:19132,java:25566") == [
+        ("java", 25565), ("java", 25566), ("java", 25567), ("bedrock", 19132)]
+
+
+def test_full_range_is_fast_and_ordered():
+    start = time.perf_counter()
+    port_set = parse_port_set("1-65535,bedrock:19132-19133,java:25565")
+    assert time.perf_counter() - start < 1
+    assert len(port_set) == 65535 + 2
+    assert port_set[:65535] == [("java", port) for port in range(1, 65536)]
+    assert port_set[65535:] == [("bedrock", 19132), ("bedrock", 19133)]
+
+
+@pytest.mark.parametrize("spec", ["", ",", "0", "25566-25565", "65536", "pocket:19132", "abc"])
+def test_invalid_port_set(spec):
+    with pytest.raises(ValueError):
+        parse_port_set(spec)
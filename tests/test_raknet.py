@@ -0,0 +1,78 @@
+import asyncio
+import socket
+
+import pytest
+
+from fake_server import DEFAULT_BEDROCK_STATUS, FakeBedrockServer
+from raknet import MAGIC, BedrockEndpoint, RakNetError, pack_pong, parse_pong_text, unpack_pong
+
+
+def has_ipv6() -> bool:
+    try:
+        with socket.socket(socket.AF_INET6, socket.SOCK_DGRAM) as sock:
+            sock.bind(("::1", 0))
+        return True
+    except OSError:
+        return False
+
+
+def run_query(status=None, server_host="127.0.0.1", host="127.0.0.1"):
+    async def main():
+        endpoint = BedrockEndpoint(("127.0.0.1", 0), ("::1", 0))
+        try:
+            async with FakeBedrockServer(server_host, status=status) as server:
+                info = await asyncio.wait_for(endpoint.query(host, server.port), timeout=5)
+                return info, server.pings
+        finally:
+            endpoint.close()
+    return asyncio.run(main())
+
+
+def test_query():
+    info, pings = run_query()
+    s = DEFAULT_BEDROCK_STATUS
+    assert info["version"] == s["version"]
+    assert info["protocol"] == s["protocol"]
+    assert (info["players_online"], info["players_max"]) == (s["online"], s["max"])
+    assert info["description"] == s["motd"] + "\n" + s["sub_motd"]
+    assert info["gamemode"] == s["gamemode"]
+    assert info["latency"] >= 0
+    assert pings == 1
+
+
+def test_query_utf8_motd():
+    info, _ = run_query(dict(DEFAULT_BEDROCK_STATUS, motd="§a基岩版服务器", sub_motd=""))
+    assert info["description"] == "§a基岩版服务器"
+
+
+@pytest.mark.skipif(not has_ipv6(), reason="需要 IPv6")
+@pytest.mark.parametrize("host", ["::1", "0:0::1"])
+def test_query_ipv6(host):
+    info, pings = run_query(server_host="::1", host=host)
+    assert info["version"] == DEFAULT_BEDROCK_STATUS["version"]
+    assert pings == 1
+
+
+def test_pong_roundtrip():
+    token, guid, text = unpack_pong(pack_pong(42, 7, "MCPE;motd;622;1.20.40;0;10;7;;Survival;1;19132;19133;"))
+    assert (token, guid) == (42, 7)
+    assert parse_pong_text(text)["players_max"] == 10
+
+
+@pytest.mark.parametrize("data", [
+    b"",
+    b"\x01" + bytes(40),  # 不是 Pong
+    pack_pong(1, 2, "MCPE;x;1;1.0;0;1;")[:-3],  # 服务器信息被截断
+    pack_pong(1, 2, "MCPE;x;1;1.0;0;1;").replace(MAGIC, bytes(16)),
+    pack_pong(1, 2, "MCPE;x;1;1.0;0;1;")[:35] + b"\xff\xfe",
+])
+def test_unpack_malformed(data):
+    with pytest.raises(RakNetError):
+        unpack_pong(data)
+
+
+@pytest.mark.parametrize("text", ["", "MCPE;x;1", "JAVA;x;1;1.0;0;1;", "MCPE;x;new;1.0;0;1;"])
+def test_parse_invalid_text(text):
+    with pytest.raises(RakNetError):
+        parse_pong_text(text)
+
@@ -0,0 +1,56 @@
+from rate_control import AIMDController
+from telemetry import Telemetry
+
+
+def step(controller, status_timeout=1.0, status_ceiling=5.0):
+    return controller.step(500, 1.0, status_timeout, 1.0, status_ceiling)
+
+
+def observe_status(telemetry, count, seconds=0.2, timeouts=0):
+    for _ in range(count):
+        telemetry.observe("status", seconds)
+    telemetry.incr("timeouts", timeouts)
+
+
+def test_timeout_shrinks_without_timeouts():
+    telemetry = Telemetry()
+    controller = AIMDController(telemetry)
+    observe_status(telemetry, 100)
+    # p99 落在 0.25 的桶，超时时间变为 2 倍
+    assert step(controller)["status_timeout"] == 0.5
+
+
+def test_timed_out_attempts_grow_timeout():
+    telemetry = Telemetry()
+    controller = AIMDController(telemetry)
+    observe_status(telemetry, 100)
+    timeout = step(controller)["status_timeout"]
+    # 超时时间缩短后有 5% 的查询超时：它们的往返时间至少是当前超时，p99 不能再只看完成的查询
+    observe_status(telemetry, 95, timeouts=5)
+    grown = step(controller, status_timeout=timeout)["status_timeout"]
+    assert grown > timeout
+    observe_status(telemetry, 90, timeouts=10)
+    assert step(controller, status_timeout=grown)["status_timeout"] > grown
+
+
+def test_negligible_timeouts_still_shrink():
+    telemetry = Telemetry()
+    controller = AIMDController(telemetry)
+    observe_status(telemetry, 1000, timeouts=5)
+    assert step(controller)["status_timeout"] == 0.5
+
+
+def test_timeout_capped_at_ceiling():
+    telemetry = Telemetry()
+    controller = AIMDController(telemetry)
+    observe_status(telemetry, 0, timeouts=50)
+    assert step(controller, status_timeout=4.0)["status_timeout"] == 5.0
+
+
+def test_connect_timeouts_counted():
+    telemetry = Telemetry()
+    controller = AIMDController(telemetry)
+    for _ in range(50):
+        telemetry.observe("connect", 0.01)
+    telemetry.incr("connect_timeouts", 50)
+    assert controller.step(500, 0.3, 1.0, 1.0, 5.0)["connect_timeout"] == 1.0
@@ -0,0 +1,76 @@
+import asyncio
+
+from fake_server import FakeDNSServer
+from resolver import TYPE_A, TYPE_AAAA, TYPE_SRV, Resolver
+
+RECORDS = {
+    ("_minecraft._tcp.mc.example.com", TYPE_SRV): [(300, (10, 5, 25570, "play.example.com")),
+                                                    (300, (20, 100, 25580, "backup.example.com"))],
+    ("play.example.com", TYPE_A): [(300, "10.1.2.3")],
+    ("backup.example.com", TYPE_A): [(300, "10.9.9.9")],
+    ("alias.example.com", TYPE_A): [(300, "10.1.2.3")],
+    ("v6.example.com", TYPE_AAAA): [(300, "2001:db8::1")],
+}
+
+
+def run(func, records=RECORDS):
+    """启动假 DNS 服务器，用指向它的解析器执行 func(resolver)，返回 (结果, 服务器收到的查询)"""
+    async def main():
+        async with FakeDNSServer(records) as server:
+            resolver = Resolver([f"127.0.0.1:{server.port}"], timeout=1, retries=0)
+            try:
+                return await asyncio.wait_for(func(resolver), timeout=5), server.queries
+            finally:
+                resolver.close()
+    return asyncio.run(main())
+
+
+def test_srv_lookup():
+    endpoint, queries = run(lambda r: r.resolve("mc.example.com"))
+    # 使用优先级数值最小的 SRV 记录
+    assert endpoint == ("10.1.2.3", 25570)
+    assert queries == [("_minecraft._tcp.mc.example.com", TYPE_SRV), ("play.example.com", TYPE_A)]
+
+
+def test_explicit_port_skips_srv():
+    endpoint, queries = run(lambda r: r.resolve("play.example.com", 25566))
+    assert endpoint == ("10.1.2.3", 25566)
+    assert queries == [("play.example.com", TYPE_A)]
+
+
+def test_no_srv_uses_default_port_and_aaaa():
+    endpoint, queries = run(lambda r: r.resolve("v6.example.com"))
+    assert endpoint == ("2001:db8::1", 25565)
+    assert ("v6.example.com", TYPE_A) in queries
+
+
+def test_ip_literal_not_queried():
+    endpoint, queries = run(lambda r: r.resolve("192.0.2.1"))
+    assert endpoint == ("192.0.2.1", 25565)
+    assert queries == []
+
+
+def test_nxdomain_negative_cache():
+    async def resolve_twice(resolver):
+        first = await resolver.resolve("missing.example.com", 25565)
+        second = await resolver.resolve("missing.example.com", 25565)
+        return first, second, resolver.cache[("missing.example.com", TYPE_A)][1]
+
+    (first, second, cached), queries = run(resolve_twice)
+    assert first is None and second is None
+    assert cached == []
+    # 第二次解析直接使用缓存的“不存在”
+    assert queries.count(("missing.example.com", TYPE_A)) == 1
+
+
+def test_resolve_all_dedup():
+    servers = [("play.example.com", 25565), ("play.example.com", 25565), ("alias.example.com", 25565),
+               ("PLAY.example.com.", 25565), ("mc.example.com", None), ("missing.example.com", None)]
+    (endpoints, failed), queries = run(lambda r: r.resolve_all(servers))
+    # 指向同一地址的名字合并为一个目标；同一个名字只查询一次
+    assert {endpoint: sorted(names) for endpoint, names in endpoints.items()} == {
+        ("10.1.2.3", 25565): ["PLAY.example.com.", "alias.example.com", "play.example.com"],
+        ("10.1.2.3", 25570): ["mc.example.com"],
+    }
+    assert failed == ["missing.example.com"]
+    assert len(queries) == len(set(queries))
@@ -0,0 +1,30 @@
+import os
+
+import pytest
+
+from result_sink import JsonlSink, ResultSinkError, SqliteSink, iter_results
+
+RECORD = {"host": "1.2.3.4", "port": 25565, "version": "1.20.4"}
+
+
+def test_open_error_raised_immediately(tmp_path):
+    with pytest.raises(ResultSinkError):
+        JsonlSink(str(tmp_path / "missing" / "results.jsonl"))
+
+
+@pytest.mark.parametrize("sink_class, name", [(JsonlSink, "results.jsonl"), (SqliteSink, "results.db")])
+def test_write_and_close(tmp_path, sink_class, name):
+    path = str(tmp_path / name)
+    sink = sink_class(path)
+    sink.write(RECORD)
+    sink.close()
+    assert sink.written == 1
+    assert list(iter_results(path)) == [RECORD]
+
+
+@pytest.mark.skipif(not os.path.exists("/dev/full"), reason="需要 /dev/full")
+def test_write_error_raised_on_close():
+    sink = JsonlSink("/dev/full")
+    sink.write(RECORD)
+    with pytest.raises(ResultSinkError):
+        sink.close()
@@ -0,0 +1,135 @@
+import json
+
+import pytest
+
+from result_store import InvalidCursor, ResultSnapshot, ResultStore
+
+US = {"code": "US", "name": "United States", "name_zh": "美国"}
+DE = {"code": "DE", "name": "Germany", "name_zh": "德国"}
+
+
+def server(i: int, **fields):
+    record = {"host": f"10.0.0.{i}", "port": 25565, "version": "Paper 1.20.4", "protocol": 765,
+              "players_online": i, "players_max": 100, "description": f"server {i}", "country": US,
+              "timestamp": f"2024-01-01T00:00:{i:02d}"}
+    record.update(fields)
+    return record
+
+
+def test_fold_copies_groups_before_changing_them():
+    snapshot = ResultSnapshot([server(i) for i in range(1, 6)], "v1")
+    us, versions = snapshot.by_country["US"], snapshot.by_version["Paper 1.20.4"]
+    motd = snapshot.search_index.postings["motd:3"]
+    before = list(us), list(versions), list(motd)
+
+    changes = snapshot.fold([server(3, country=DE, version="Paper 1.21", description="moved"), server(6)])
+    assert len(changes["added"]) == 1 and len(changes["updated"]) == 1
+    # 读者之前拿到的数组不变
+    assert (list(us), list(versions), list(motd)) == before
+    assert list(snapshot.by_country["US"]) == [0, 1, 3, 4, 5]
+    assert list(snapshot.by_country["DE"]) == [2]
+    assert list(snapshot.by_version["Paper 1.21"]) == [2]
+    assert snapshot.search_index.match(["motd:3"]) == set()
+    assert snapshot.search_index.match(["motd:moved"]) == {2}
+
+    # 分组的最后一个服务器移走后分组被删除
+    snapshot.fold([server(3)])
+    assert "DE" not in snapshot.by_country
+    assert list(snapshot.by_country["US"]) == [0, 1, 2, 3, 4, 5]
+
+
+def pages(snapshot, between=None, **kwargs):
+    """逐页读取全部结果；between(页码) 在取下一页之前调用"""
+    hosts, cursor, page = [], None, 0
+    while True:
+        result = snapshot.query(cursor=cursor, **kwargs)
+        hosts.extend(item["host"] for item in result["items"])
+        cursor = result["next_cursor"]
+        if cursor is None:
+            return hosts
+        if between:
+            between(page)
+        page += 1
+
+
+@pytest.mark.parametrize("sort, order", [("players", "desc"), ("players", "asc"), ("host", "asc")])
+def test_cursor_stable_when_records_appended(sort, order):
+    # 人数有重复，翻页要靠 (排序键, 行号) 定位
+    snapshot = ResultSnapshot([server(i, players_online=i // 3) for i in range(1, 31)], "v1")
+    expected = pages(snapshot, sort=sort, order=order, limit=7)
+    assert len(expected) == len(set(expected)) == 30
+
+    added = iter(range(31, 100))
+
+    def append(page):
+        # 每翻一页都加入排在已翻过部分之前和之后的服务器
+        snapshot.fold([server(next(added), players_online=players) for players in (0, 5, 100)])
+
+    hosts = pages(snapshot, append, sort=sort, order=order, limit=7)
+    assert len(hosts) == len(set(hosts))
+    assert set(expected) <= set(hosts)
+    # 加入的服务器只会在还没翻到的部分出现，已经出现过的顺序不变
+    assert [host for host in hosts if host in expected] == expected
+
+
+def test_cursor_after_reload():
+    snapshot = ResultSnapshot([server(i) for i in range(1, 11)], "v1")
+    cursor = snapshot.query(limit=3)["next_cursor"]
+    assert [item["players_online"] for item in snapshot.query(limit=3, cursor=cursor)["items"]] == [7, 6, 5]
+    with pytest.raises(InvalidCursor):
+        ResultSnapshot([server(i) for i in range(1, 11)], "v2").query(limit=3, cursor=cursor)
+    with pytest.raises(ValueError):
+        snapshot.query(cursor="not-a-cursor")
+
+
+def write_results(path, records, mode="w"):
+    with open(path, mode, encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    pytest.importorskip("flask")
+    import web
+    path = tmp_path / "scan_results.jsonl"
+    write_results(path, [server(i) for i in range(1, 11)])
+    monkeypatch.setattr(web, "store", ResultStore(lambda: str(path), reload_interval=0))
+    return web.app.test_client(), path
+
+
+def test_etag_not_modified(client):
+    client, path = client
+    first = client.get("/api/stats")
+    etag = first.headers["ETag"]
+    assert first.status_code == 200 and first.get_json()["total_servers"] == 10
+
+    cached = client.get("/api/stats", headers={"If-None-Match": etag})
+    assert cached.status_code == 304 and cached.data == b""
+    assert cached.headers["ETag"] == etag
+    # 不同的查询参数使用不同的 ETag
+    page = client.get("/api/servers?limit=2")
+    assert page.headers["ETag"] != client.get("/api/servers?limit=3").headers["ETag"]
+    assert client.get("/api/servers?limit=2", headers={"If-None-Match": page.headers["ETag"]}).status_code == 304
+
+    # 追加结果后缓存失效
+    write_results(path, [server(11)], "a")
+    changed = client.get("/api/stats", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.get_json()["total_servers"] == 11
+    assert changed.headers["ETag"] != etag
+    assert client.get("/api/servers?limit=2", headers={"If-None-Match": page.headers["ETag"]}).status_code == 200
+
+
+def test_paging_across_file_changes(client):
+    client, path = client
+    first = client.get("/api/servers?limit=4").get_json()
+    write_results(path, [server(11, players_online=100), server(12, players_online=0)], "a")
+    second = client.get("/api/servers?limit=4&cursor=" + first["next_cursor"]).get_json()
+    assert second["total"] == 12
+    assert [item["players_online"] for item in first["items"] + second["items"]] == [10, 9, 8, 7, 6, 5, 4, 3]
+
+    # 结果文件被替换后旧游标失效
+    write_results(path, [server(i) for i in range(1, 6)])
+    response = client.get("/api/servers?limit=4&cursor=" + second["next_cursor"])
+    assert response.status_code == 409
+    assert client.get("/api/servers?cursor=bad").status_code == 400
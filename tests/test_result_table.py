@@ -0,0 +1,82 @@
+import math
+
+import pytest
+
+import result_table
+from result_table import MISSING, ResultTable, column_sum, group_counts, group_sums
+
+US = {"code": "US", "name": "United States", "name_zh": "美国"}
+DE = {"code": "DE", "name": "Germany", "name_zh": "德国"}
+
+RECORDS = [
+    {"host": "1.2.3.4", "port": 25565, "online": True, "edition": "java", "version": "Paper 1.20.4",
+     "protocol": 765, "players_online": 3, "players_max": 20, "description": "§aHello", "latency": 12.345678901234,
+     "timestamp": "2024-01-02T03:04:05.123456", "country": US, "player_list": ["Steve"], "mods": []},
+    {"host": "mc.example.com", "port": 25566, "online": True, "edition": "bedrock", "version": "1.20.40",
+     "protocol": 622, "players_online": 0, "players_max": 10, "latency": 40, "timestamp": "2024-01-02T03:04:05",
+     "country": DE, "hostname": "mc.example.com"},
+    {"host": "2a00:1450::1", "port": 19132, "online": True, "country": US},
+    # 不能放进列中的值按原样保存在 extras 中
+    {"host": "001.2.3.4", "port": 1, "online": False, "protocol": "765", "players_online": 1 << 40,
+     "players_max": True, "description": {"text": "json"}, "latency": None,
+     "timestamp": "2024-01-02T03:04:05+08:00", "country": "XX"},
+    {"host": "5.6.7.8", "port": 65535, "online": True, "players_online": -1, "timestamp": "yesterday",
+     "latency": False},
+]
+
+
+@pytest.fixture(params=["python", "numpy"])
+def backend(request, monkeypatch):
+    """分别在安装和没有安装 numpy 的情况下测试"""
+    if request.param == "numpy":
+        monkeypatch.setattr(result_table, "numpy", pytest.importorskip("numpy"))
+    else:
+        monkeypatch.setattr(result_table, "numpy", None)
+    return request.param
+
+
+def test_round_trip():
+    table = ResultTable(RECORDS)
+    assert len(table) == len(RECORDS)
+    assert list(table) == RECORDS
+    assert table[-1] == RECORDS[-1] and table[1:3] == RECORDS[1:3]
+    assert table.hosts == {1: "mc.example.com", 2: "2a00:1450::1", 3: "001.2.3.4"}
+    assert [table.key(row) for row in range(len(table))] == [ResultTable.record_key(r) for r in RECORDS]
+    # 延迟用双精度保存，原样还原
+    assert table.record(0)["latency"] == 12.345678901234
+    assert math.isnan(table.latency[2])
+    # 文本字段和国家为 None 时与没有这个字段相同
+    assert ResultTable([dict(RECORDS[0], version=None, country=None)]).record(0) == {
+        key: value for key, value in RECORDS[0].items() if key not in ("version", "country")}
+
+
+def test_update_and_matches():
+    table = ResultTable(RECORDS)
+    for row, record in enumerate(RECORDS):
+        assert table.matches(row, record)
+    changed = dict(RECORDS[0], players_online=4, player_list=None)
+    assert not table.matches(0, changed)
+    table.update(0, changed)
+    assert table.matches(0, changed) and table.record(0) == changed
+    table.update(3, RECORDS[4])
+    assert table.record(3) == RECORDS[4] and 3 not in table.hosts
+
+
+def test_aggregates(backend):
+    table = ResultTable(RECORDS)
+    size = len(table.country_codes)
+    assert group_counts(table.country, size) == [2, 2, 1]
+    assert group_sums(table.country, table.players_online, size) == [-1, 3, 0]
+    assert group_sums(table.country, table.players_max, size) == [0, 20, 10]
+    assert column_sum(table.players_online) == 3 + 0 - 1
+    assert table.players_online.count(MISSING) == 2
+    assert group_counts(ResultTable().country, 1) == [0]
+
+
+def test_arrow_export():
+    pytest.importorskip("pyarrow")
+    arrow = ResultTable(RECORDS).to_arrow()
+    assert arrow.num_rows == len(RECORDS)
+    assert arrow.column("players_online").to_pylist() == [3, 0, None, None, -1]
+    assert arrow.column("latency").to_pylist()[:3] == [12.345678901234, 40.0, None]
+    assert arrow.column("country").to_pylist() == ["US", "DE", "US", None, None]
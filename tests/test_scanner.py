@@ -0,0 +1,64 @@
+import asyncio
+import json
+
+import pytest
+
+from mc_scanner import MinecraftServerScanner
+from targets import TargetSpace, ip_to_int
+
+
+@pytest.mark.parametrize("handler", ["scan_ip", "scan_host"])
+def test_port_set_concurrency_counts_probes(handler):
+    scanner = MinecraftServerScanner()
+    scanner.concurrency = 8
+    scanner.port_set = [("java", port) for port in range(25565, 25569)]
+    active = peak = 0
+
+    async def scan_server(host, port, edition="java", hostname=None):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+
+    scanner.scan_server = scan_server
+    targets = [(i + 1, None) if handler == "scan_ip" else (f"10.0.0.{i + 1}", None) for i in range(20)]
+    asyncio.run(scanner.run_engine(targets, total=len(targets), handler=getattr(scanner, handler)))
+    assert scanner.engine.limit == 2
+    assert scanner.total_targets == 80
+    assert peak == 8
+
+
+def test_incremental_port_set(tmp_path):
+    previous = [
+        {"host": "10.0.0.1", "port": 25565, "edition": "java"},
+        # 本次只探测 bedrock:19132，Java 版的旧结果不算复查过
+        {"host": "10.0.0.2", "port": 19132, "edition": "java"},
+        {"host": "10.0.0.3", "port": 19132, "edition": "bedrock"},
+    ]
+    scanner = MinecraftServerScanner()
+    scanner.output_file = str(tmp_path / "results.jsonl")
+    scanner.responsive_map_path = str(tmp_path / "responsive.bin")
+    scanner.delta_output = str(tmp_path / "delta.jsonl")
+    with open(scanner.output_file, "w", encoding="utf-8") as f:
+        f.writelines(json.dumps(record) + "\n" for record in previous)
+    scanner.concurrency = 8
+    scanner.port_set = [("java", 25565), ("bedrock", 19132)]
+    active = peak = 0
+
+    async def scan_server(host, port, edition="java", hostname=None):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.001)
+        active -= 1
+
+    scanner.scan_server = scan_server
+    space = TargetSpace([(ip_to_int("10.0.0.0"), ip_to_int("10.0.0.255"))], [])
+    asyncio.run(scanner.run_incremental(space, 25565))
+    assert scanner.fanout == 2
+    assert scanner.engine.limit == 4
+    assert peak <= 8
+    with open(scanner.delta_output, encoding="utf-8") as f:
+        gone = sorted((event["host"], event["port"]) for event in map(json.loads, f) if event["change"] == "gone")
+    assert gone == [("10.0.0.1", 25565), ("10.0.0.3", 19132)]
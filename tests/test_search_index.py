@@ -0,0 +1,109 @@
+import pytest
+
+import search_index
+from search_index import SearchIndex, SearchQueryError, parse_query, parse_version
+
+US = {"code": "US", "name": "United States", "name_zh": "美国"}
+DE = {"code": "DE", "name": "Germany", "name_zh": "德国"}
+
+RECORDS = [
+    {"description": "§6Sky§lblock §rNetwork", "version": "Paper 1.20.4", "protocol": 765, "country": US,
+     "edition": "java", "player_list": ["Steve"]},
+    {"description": "Skywars and Bedwars", "version": "Paper 1.20.1", "protocol": 763, "country": US,
+     "edition": "java", "mod_loader": "Forge", "mods": ["JEI"]},
+    {"description": "survival", "version": "BungeeCord 1.8.x-1.20.x", "protocol": 47, "country": DE,
+     "edition": "java"},
+    {"description": "skyblock", "version": "1.20.40", "protocol": 622, "country": US, "edition": "bedrock"},
+]
+
+
+def build(records=RECORDS) -> SearchIndex:
+    index = SearchIndex()
+    index.add_many(records)
+    return index
+
+
+@pytest.fixture(params=["python", "numpy"])
+def backend(request, monkeypatch):
+    if request.param == "numpy":
+        monkeypatch.setattr(search_index, "numpy", pytest.importorskip("numpy"))
+    else:
+        monkeypatch.setattr(search_index, "numpy", None)
+    return request.param
+
+
+def test_parse_query():
+    assert parse_query("§aSky§lBlock version:1.20.x software:Paper", {"country": "US", "edition": ""}) == [
+        "motd:skyblock", "version:1.20", "software:paper", "country:us"]
+    assert parse_query("sky*") == ["motd:sky*"]
+    assert parse_query("VERSION:1.8.*") == ["version:1.8"]
+
+
+@pytest.mark.parametrize("text, filters", [("ip:1.2.3.4", None), ("motd:x host:y", None), ("", {"port": "25565"})])
+def test_parse_query_unknown_field(text, filters):
+    with pytest.raises(SearchQueryError) as error:
+        parse_query(text, filters)
+    assert isinstance(error.value, ValueError)
+
+
+def test_parse_version():
+    assert parse_version("Paper 1.20.4") == ({"1.20", "1.20.4"}, "1.20", "paper")
+    assert parse_version("BungeeCord 1.8.x-1.20.x") == ({"1.8", "1.20"}, "1.8", "bungeecord")
+
+
+def test_match():
+    index = build()
+    assert index.match([]) is None
+    assert index.match(parse_query("skyblock")) == {0, 3}
+    assert index.match(parse_query("version:1.20 edition:java")) == {0, 1, 2}
+    assert index.match(parse_query("mod:jei loader:forge player:steve")) == set()
+    assert index.match(parse_query("player:STEVE")) == {0}
+
+
+def test_prefix_query():
+    index = build()
+    assert index.match(parse_query("sky*")) == {0, 1, 3}
+    assert index.match(parse_query("sky* country:us software:paper")) == {0, 1}
+    assert index.match(parse_query("zzz*")) == set()
+    # 前缀只匹配同一字段的词项
+    assert index.match(["version:1.2*"]) == {0, 1, 2, 3}
+    # 加入新词项后前缀查询看到新的词表
+    index.add(4, {"description": "skyrealm"})
+    assert index.match(parse_query("skyr*")) == {4}
+
+
+def test_update_keeps_postings_sorted():
+    index = build()
+    for row in (4, 5, 6):
+        index.add(row, {"description": "filler"})
+    shared = index.postings["motd:skyblock"]
+
+    index.update(2, RECORDS[2], dict(RECORDS[2], description="skyblock"))
+    index.update(6, {"description": "filler"}, {"description": "skyblock"})
+    index.update(0, RECORDS[0], dict(RECORDS[0], description="new"))
+    assert list(index.postings["motd:skyblock"]) == [2, 3, 6]
+    assert list(index.postings["motd:filler"]) == [4, 5]
+    assert list(index.postings["motd:new"]) == [0]
+    # 修改的是副本
+    assert list(shared) == [0, 3]
+    for term, rows in index.postings.items():
+        assert list(rows) == sorted(rows), term
+    assert index.facet_counts(rows=[2])["country"] == {"DE": 1}
+
+
+def test_facet_counts(backend):
+    index = build()
+    counts = index.facet_counts()
+    assert counts["version"] == {"1.20": 3, "1.8": 1}
+    assert counts["software"] == {"paper": 2, "bungeecord": 1}
+    assert counts["loader"] == {"forge": 1}
+    assert counts["edition"] == {"java": 3, "bedrock": 1}
+    assert counts["country"] == {"US": 3, "DE": 1}
+
+    matched = index.match(parse_query("sky*"))
+    counts = index.facet_counts(matched)
+    assert counts["country"] == {"US": 3}
+    assert counts["software"] == {"paper": 2}
+    assert index.facet_counts(set())["country"] == {}
+    assert list(index.facet_counts(limit=1)["edition"]) == ["java"]
+    assert SearchIndex().facet_counts()["version"] == {}
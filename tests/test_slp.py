@@ -0,0 +1,71 @@
+import asyncio
+import json
+
+import pytest
+
+import slp
+from fake_server import DEFAULT_STATUS, FakeMinecraftServer
+
+
+def run_query(mode: str = "modern", status=None, **kwargs):
+    async def main():
+        async with FakeMinecraftServer(mode=mode, status=status) as server:
+            return await asyncio.wait_for(slp.query("127.0.0.1", server.port, **kwargs), timeout=5)
+    return asyncio.run(main())
+
+
+def padded_status(json_length: int):
+    """MOTD 补齐到状态 JSON 正好 json_length 字节"""
+    status = dict(DEFAULT_STATUS, description="")
+    padding = json_length - len(json.dumps(status))
+    return dict(status, description="x" * padding)
+
+
+def test_modern():
+    info = run_query("modern", ping=True)
+    assert info["version"] == "1.20.4"
+    assert info["protocol"] == 765
+    assert (info["players_online"], info["players_max"]) == (3, 20)
+    assert info["description"] == "§aA Minecraft Server§l!"
+    assert info["player_list"] == ["Steve"]
+    assert info["latency"] >= 0
+
+
+@pytest.mark.parametrize("json_length", [379, 380, 381, 124 + 128 * 10])
+def test_modern_length_with_0xff_first_byte(json_length):
+    # 包长度 = 包ID(1) + 字符串长度(2) + JSON；380 时包长度 383 的 VarInt 第一个字节是 0xFF
+    status = padded_status(json_length)
+    info = run_query("modern", status=status, legacy=False)
+    assert info["description"] == status["description"]
+
+
+def test_legacy_1_6():
+    info = run_query("legacy")
+    assert info["version"] == "1.20.4"
+    assert info["protocol"] == 765
+    assert (info["players_online"], info["players_max"]) == (3, 20)
+    assert info["description"] == "A Minecraft Server"
+
+
+def test_legacy_kick_not_accepted_as_modern():
+    with pytest.raises((slp.SLPError, asyncio.IncompleteReadError)):
+        run_query("legacy", legacy=False)
+
+
+def test_pre_1_4():
+    info = run_query("beta")
+    assert info["version"] == "<1.4"
+    assert info["protocol"] == -1
+    assert (info["players_online"], info["players_max"]) == (3, 20)
+    assert info["description"] == "A Minecraft Server"
+
+
+def test_malformed():
+    with pytest.raises(slp.SLPError):
+        run_query("malformed")
+
+
+def test_varint_roundtrip():
+    for value in (0, 1, 127, 128, 255, 383, 2 ** 21, 2 ** 31 - 1, -1):
+        encoded = slp.pack_varint(value)
+        assert slp.unpack_varint(encoded) == (value, len(encoded))
@@ -0,0 +1,190 @@
+import bz2
+import gzip
+import ipaddress
+import lzma
+
+import pytest
+
+from targets import (DEFAULT_EXCLUDES, DEFAULT_EXCLUDES_V6, BloomFilter, CyclicPermutation, ExcludeSet, TargetFile,
+                     TargetSpace, ip_to_int, merge_intervals, parse_target, subtract_intervals)
+
+
+@pytest.mark.parametrize("size", [0, 1, 2, 10, 100, 1021, 1022, 4096])
+@pytest.mark.parametrize("seed", [0, 1, 12345])
+def test_permutation_visits_each_index_once(size, seed):
+    values = list(CyclicPermutation(size, seed))
+    assert sorted(values) == list(range(size))
+
+
+def test_permutation_depends_on_seed():
+    assert list(CyclicPermutation(1000, 1)) != list(CyclicPermutation(1000, 2))
+
+
+@pytest.mark.parametrize("size, shards", [(1000, 3), (1000, 4), (997, 7), (5, 8)])
+def test_shards_are_disjoint_and_cover_space(size, shards):
+    parts = [list(CyclicPermutation(size, 42, shard, shards)) for shard in range(shards)]
+    values = [value for part in parts for value in part]
+    assert len(values) == len(set(values))
+    assert sorted(values) == list(range(size))
+
+
+@pytest.mark.parametrize("shard, shards", [(0, 1), (1, 3)])
+def test_resume_continues_same_sequence(shard, shards):
+    permutation = CyclicPermutation(1000, 9, shard, shards)
+    full = list(permutation.iter_from(0))
+    assert [position for position, _ in full] == sorted(position for position, _ in full)
+    for cursor in (0, 1, 57, full[100][0], full[-1][0], permutation.steps):
+        # 同样的参数重新构造（相当于进程重启后继续扫描）
+        resumed = list(CyclicPermutation(1000, 9, shard, shards).iter_from(cursor))
+        assert resumed == [item for item in full if item[0] >= cursor]
+
+
+@pytest.mark.parametrize("shard, shards", [(-1, 2), (2, 2), (0, 0)])
+def test_invalid_shard(shard, shards):
+    with pytest.raises(ValueError):
+        CyclicPermutation(100, 0, shard, shards)
+
+
+def test_merge_overlapping_and_adjacent():
+    assert merge_intervals([(10, 20), (0, 5), (6, 8), (15, 30), (40, 40)]) == [(0, 8), (10, 30), (40, 40)]
+
+
+@pytest.mark.parametrize("ranges, excludes, expected", [
+    ([(0, 99)], [], [(0, 99)]),
+    ([(0, 99)], [(10, 19), (15, 29)], [(0, 9), (30, 99)]),  # 重叠的排除区间
+    ([(0, 99)], [(10, 19), (20, 29)], [(0, 9), (30, 99)]),  # 相邻的排除区间
+    ([(0, 99)], [(0, 0), (99, 99)], [(1, 98)]),  # 排除两端
+    ([(0, 99)], [(0, 99)], []),  # 排除整个范围
+    ([(10, 20)], [(0, 1000)], []),
+    ([(0, 9), (20, 29), (40, 49)], [(5, 25), (45, 100)], [(0, 4), (26, 29), (40, 44)]),  # 跨多个区间
+    ([(10, 20)], [(0, 5), (30, 40)], [(10, 20)]),  # 不相交
+])
+def test_subtract_intervals(ranges, excludes, expected):
+    # subtract_intervals 要求输入已经合并
+    assert subtract_intervals(ranges, merge_intervals(excludes)) == expected
+
+
+def test_target_space_excludes():
+    space = TargetSpace.from_cidrs(["10.0.0.0/24"], ["10.0.0.0/28", "10.0.0.8/29", "10.0.0.16/28", "10.0.0.255/32"])
+    assert space.intervals == [(ip_to_int("10.0.0.32"), ip_to_int("10.0.0.254"))]
+    assert len(space) == 223
+    assert ip_to_int("10.0.0.31") not in space and ip_to_int("10.0.0.32") in space
+    assert ip_to_int("10.0.0.255") not in space
+
+
+def test_target_space_excluded_entirely():
+    space = TargetSpace.from_cidrs(["192.168.1.0/24"], ["192.168.0.0/16"])
+    assert len(space) == 0
+    assert list(space) == []
+    assert sorted(space.permuted(3)) == []
+
+
+def test_target_space_index_round_trip():
+    space = TargetSpace([(0, 9), (20, 24), (100, 100), (200, 299)], ["0.0.0.5/32", "0.0.1.0/26"])
+    addresses = list(space)
+    assert len(space) == len(addresses) == 9 + 5 + 1 + 56
+    assert [space.nth(i) for i in range(len(space))] == addresses
+    assert all(address in space for address in addresses)
+    assert not any(value in space for value in set(range(320)) - set(addresses))
+    assert sorted(space.permuted(5)) == addresses
+
+
+TARGETS = """# 目标列表
+1.2.3.4
+1.2.3.4:25566  第一列之后的内容忽略
+[2a00:1450::1]:19132
+mc.example.com
+1.2.3.4
+5.6.7.0/30  # 网段
+"""
+EXPECTED = [("1.2.3.4", None), ("1.2.3.4", 25566), ("2a00:1450::1", 19132), ("mc.example.com", None),
+            ("5.6.7.0", None), ("5.6.7.1", None), ("5.6.7.2", None), ("5.6.7.3", None)]
+
+
+def read_targets(path, dedup=True, **kwargs):
+    reader = TargetFile(str(path), ExcludeSet(DEFAULT_EXCLUDES + DEFAULT_EXCLUDES_V6),
+                        BloomFilter(1000) if dedup else None, **kwargs)
+    return list(reader), reader.counts
+
+
+@pytest.mark.parametrize("suffix, opener", [("", open), (".gz", gzip.open), (".bz2", bz2.open), (".xz", lzma.open)])
+def test_read_compressed(tmp_path, suffix, opener):
+    # 按文件头识别压缩格式，与扩展名无关
+    path = tmp_path / "targets"
+    with opener(path, "wt", encoding="utf-8") as f:
+        f.write(TARGETS)
+    targets, counts = read_targets(path)
+    assert targets == EXPECTED
+    assert (counts["lines"], counts["targets"], counts["duplicates"]) == (6, 8, 1)
+
+
+def test_default_port(tmp_path):
+    path = tmp_path / "targets.txt"
+    path.write_text("1.2.3.4\n1.2.3.4:25566\n", encoding="utf-8")
+    assert read_targets(path, default_port=25565)[0] == [("1.2.3.4", 25565), ("1.2.3.4", 25566)]
+
+
+def test_duplicates(tmp_path):
+    path = tmp_path / "targets.txt"
+    # 同一地址的不同写法、网段中已经出现过的地址都算重复；端口不同不算
+    path.write_text("8.8.8.8\n8.8.8.8\n8.8.8.8/30\n8.8.8.8:25566\n2a00:1450::1\n2a00:1450:0::1\n"
+                    "MC.Example.com.\nmc.example.com\n", encoding="utf-8")
+    targets, counts = read_targets(path)
+    assert targets == [("8.8.8.8", None), ("8.8.8.9", None), ("8.8.8.10", None), ("8.8.8.11", None),
+                       ("8.8.8.8", 25566), ("2a00:1450::1", None), ("mc.example.com", None)]
+    assert counts["duplicates"] == 4
+    assert len(read_targets(path, dedup=False)[0]) == 11
+
+
+def test_malformed_lines(tmp_path):
+    path = tmp_path / "targets.txt"
+    lines = ["1.2.3", "1.2.3.4:0", "1.2.3.4:65536", "1.2.3.4:http", "[2a00:1450::1", "[2a00:1450::1]x",
+             "not_valid!!", "-bad.example.com", "1.2.3.0/33", "a" * 64 + ".com", "9.9.9.9"]
+    path.write_bytes(("\n".join(lines) + "\n").encode("utf-8") + b"\xff\xfe\n")
+    targets, counts = read_targets(path)
+    assert targets == [("9.9.9.9", None)]
+    assert counts["invalid"] == len(lines) - 1 + 1
+    assert counts["lines"] == len(lines) + 1
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("1.2.3.4", (ipaddress.ip_address("1.2.3.4"), None)),
+    ("[::1]:25565", (ipaddress.ip_address("::1"), 25565)),
+    ("2a00:1450::/120", (ipaddress.ip_network("2a00:1450::/120"), None)),
+    ("Play.Example.COM.:25570", ("play.example.com", 25570)),
+])
+def test_parse_target(text, expected):
+    assert parse_target(text) == expected
+
+
+def test_v6_excludes(tmp_path):
+    path = tmp_path / "targets.txt"
+    path.write_text("::1\nfe80::1\n2001:db8::1\n::ffff:1.2.3.4\n2a00:1450::1\n"
+                    "2a00:1450::/126\nfd00::/126\n2a00:1450::/64\n", encoding="utf-8")
+    targets, counts = read_targets(path, dedup=False)
+    assert [host for host, _ in targets] == ["2a00:1450::1", "2a00:1450::", "2a00:1450::1", "2a00:1450::2",
+                                             "2a00:1450::3"]
+    # 4 个单独的地址 + fd00::/126 的 4 个地址
+    assert counts["excluded"] == 8
+    # 超过 MAX_CIDR_SIZE 的网段不展开
+    assert counts["oversized"] == 1
+
+
+def test_v4_excludes_in_cidr(tmp_path):
+    path = tmp_path / "targets.txt"
+    path.write_text("10.0.0.1\n127.0.0.0/30\n", encoding="utf-8")
+    excludes = ExcludeSet(DEFAULT_EXCLUDES + DEFAULT_EXCLUDES_V6 + ["8.8.8.0/31"])
+    reader = TargetFile(str(path), excludes)
+    assert list(reader) == []
+    assert reader.counts["excluded"] == 5
+    path.write_text("8.8.8.0/30\n", encoding="utf-8")
+    assert list(TargetFile(str(path), excludes)) == [("8.8.8.2", None), ("8.8.8.3", None)]
+
+
+def test_bloom_filter():
+    bloom = BloomFilter(10000, 0.01)
+    # 加入过的元素一定判为重复；没有加入过的误判率约为 error_rate
+    assert sum(bloom.add(str(i).encode()) for i in range(10000)) < 100
+    assert all(bloom.add(str(i).encode()) for i in range(10000))
+    # add 同时会加入元素，只看刚超过容量时的误判
+    assert sum(bloom.add(f"x{i}".encode()) for i in range(1000)) < 40
@@ -0,0 +1,28 @@
+import queue
+import signal
+import sys
+import threading
+
+import workers
+
+
+def test_configure_error_reported(monkeypatch):
+    # _worker_main 会替换标准输出和 SIGINT 处理函数，测试结束后恢复
+    monkeypatch.setattr(sys, "stdout", sys.stdout)
+    monkeypatch.setattr(workers, "uvloop", None)
+    previous = signal.getsignal(signal.SIGINT)
+    channel = queue.Queue()
+
+    def configure(scanner, args):
+        raise ValueError("无法打开结果文件")
+
+    async def run(scanner, args):
+        raise AssertionError("配置失败后不应该开始扫描")
+
+    try:
+        workers._worker_main(3, None, channel, threading.Event(), configure, run)
+    finally:
+        sys.stdout.close()
+        signal.signal(signal.SIGINT, previous)
+    messages = [channel.get_nowait() for _ in range(channel.qsize())]
+    assert messages == [("error", 3, "无法打开结果文件"), ("done", 3, None)]
@@ -1,93 +1,238 @@
-from flask import Flask, render_template, jsonify, request
-import json
-import geoip2.database
-from collections import defaultdict
+from flask import Flask, render_template, jsonify, request, Response, g
+import argparse
+import atexit
+import cProfile
+import queue
+import zlib
 from datetime import datetime
 import os
-from mc_scanner import MinecraftServerScanner
+from result_sink import load_results
+from result_store import InvalidCursor, ResultStore
+from search_index import FIELDS as SEARCH_FIELDS
+from profiling import SAMPLERS, profiler
+from live import DEFAULT_EVENTS_SOCKET, EventBroadcaster, EventListener
 
 app = Flask(__name__)
 
-# GeoIP数据库路径
-GEOIP_DB = "GeoLite2-Country.mmdb"
+# 扫描结果文件，按顺序使用第一个存在的文件
+RESULT_FILES = ["scan_results.jsonl", "scan_results.db", "scan_results.json"]
+
+def get_results_file():
+    """获取扫描结果文件路径"""
+    for path in RESULT_FILES:
+        if os.path.exists(path):
+            return path
+    return RESULT_FILES[-1]
 
 def load_scan_results():
     """加载扫描结果"""
-    try:
-        with open("scan_results.json", "r", encoding="utf-8") as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return []
+    return load_results(get_results_file())
 
-def get_country_info(ip):
-    """获取IP的国家信息"""
-    try:
-        with geoip2.database.Reader(GEOIP_DB) as reader:
-            response = reader.country(ip)
-            return {
-                "code": response.country.iso_code,
-                "name": response.country.name,
-                "name_zh": response.country.names.get("zh-CN", response.country.name)
-            }
-    except:
-        return {
-            "code": "UN",
-            "name": "Unknown",
-            "name_zh": "未知"
-        }
+# 实时结果：结果变化时推送给通过 /api/stream 连接的浏览器
+broadcaster = EventBroadcaster()
+STREAM_KEEPALIVE = 15  # 没有变化时发送注释行的间隔（秒），避免代理断开空闲连接
+
+def broadcast_changes(snapshot, changes):
+    """把快照的变化（新增 / 更新的服务器或整体重新加载）推送给浏览器"""
+    data = {"revision": snapshot.revision, "stats": snapshot.stats}
+    if changes.get("reset"):
+        data["reset"] = True
+    else:
+        data["added"] = changes["added"]
+        data["updated"] = changes["updated"]
+    broadcaster.publish("changes", data, snapshot.revision)
+
+# 结果缓存：结果文件没有变化时直接使用已经建好的聚合数据和索引
+store = ResultStore(get_results_file, on_change=broadcast_changes)
+
+def receive_events(events):
+    """处理扫描器通过事件套接字发布的一批结果；没有事件时检查结果文件的变化"""
+    hits = [event["server"] for event in events if event.get("type") == "hit"]
+    updates = [event["server"] for event in events if event.get("type") == "update"]
+    if hits or updates:
+        store.publish(hits, updates)
+    else:
+        store.snapshot()
 
 def process_results():
     """处理扫描结果，按国家分组"""
-    results = load_scan_results()
-    servers_by_country = defaultdict(list)
-    
-    for server in results:
-        country_info = get_country_info(server["host"])
-        server["country"] = country_info
-        servers_by_country[country_info["code"]].append(server)
-    
-    # 统计信息
-    stats = {
-        "total_servers": len(results),
-        "total_countries": len(servers_by_country),
-        "total_players": sum(s["players_online"] for s in results),
-        "max_players": sum(s["players_max"] for s in results),
-        "countries": {
-            code: {
-                "name": servers[0]["country"]["name"],
-                "name_zh": servers[0]["country"]["name_zh"],
-                "count": len(servers),
-                "players": sum(s["players_online"] for s in servers),
-                "max_players": sum(s["players_max"] for s in servers)
-            }
-            for code, servers in servers_by_country.items()
-        }
+    # 国家信息在扫描时已经写入结果，旧结果可以用 python geo.py <结果文件> 补充
+    snapshot = store.snapshot()
+    return snapshot.servers_by_country, snapshot.stats
+
+def cached_response(etag: str, build):
+    """带 ETag 的响应：客户端缓存仍然有效时返回 304"""
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = build()
+    response.set_etag(etag)
+    return response
+
+def query_args():
+    """解析分页查询参数"""
+    args = request.args
+    return {
+        "country": args.get('country') or None,
+        "version": args.get('version') or None,
+        "min_players": args.get('min_players', type=int),
+        "sort": args.get('sort', 'players'),
+        "order": args.get('order', 'desc'),
+        "cursor": args.get('cursor') or None,
+        "limit": args.get('limit', 50, type=int),
     }
-    
-    return servers_by_country, stats
 
 @app.route('/')
 def index():
     """主页"""
     # 从查询参数获取 CDN 选择，默认不使用 JSDelivr
     use_jsdelivr = request.args.get('use_jsdelivr', '').lower() == 'true'
-    servers_by_country, stats = process_results()
-    return render_template('index.html', 
-                         servers_by_country=servers_by_country,
-                         stats=stats,
-                         now=datetime.now,
-                         use_jsdelivr=use_jsdelivr)
+    snapshot = store.snapshot()
+    page_key = f"index-{int(use_jsdelivr)}-{datetime.now().year}"
+
+    def build():
+        if page_key not in snapshot.rendered:
+            # 页面只包含统计信息，各国家的服务器由浏览器通过 /api/servers 分页加载
+            countries = sorted(snapshot.stats["countries"].items(), key=lambda item: -item[1]["count"])
+            with profiler.stage("render"):
+                snapshot.rendered[page_key] = render_template('index.html',
+                                                              countries=countries,
+                                                              stats=snapshot.stats,
+                                                              now=datetime.now,
+                                                              use_jsdelivr=use_jsdelivr)
+        return Response(snapshot.rendered[page_key])
+    return cached_response(f"{snapshot.revision}-{page_key}", build)
+
+@app.route('/api/stats')
+def get_stats():
+    """API端点：获取统计信息"""
+    snapshot = store.snapshot()
+    return cached_response(snapshot.revision, lambda: jsonify(snapshot.stats))
 
 @app.route('/api/servers')
 def get_servers():
-    """API端点：获取所有服务器信息"""
-    servers_by_country, stats = process_results()
-    return jsonify({
-        "stats": stats,
-        "servers": servers_by_country
-    })
+    """API端点：获取服务器信息
+
+    不带参数时返回按国家分组的全部服务器；带 country / version / min_players / sort / order /
+    cursor / limit 参数时返回分页结果，下一页使用响应中的 next_cursor。
+    """
+    snapshot = store.snapshot()
+    if not request.args:
+        def build_full():
+            if "servers" not in snapshot.rendered:
+                with profiler.stage("render"):
+                    snapshot.rendered["servers"] = snapshot.servers_json()
+            return Response(snapshot.rendered["servers"], mimetype='application/json')
+        return cached_response(snapshot.revision, build_full)
+
+    etag = f"{snapshot.revision}-{zlib.crc32(request.query_string):08x}"
+    try:
+        return cached_response(etag, lambda: jsonify(snapshot.query(**query_args())))
+    except InvalidCursor as e:
+        return jsonify({"error": str(e)}), 409
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/api/search')
+def search():
+    """API端点：搜索服务器
+
+    q 为搜索语句，例如 "skyblock version:1.20.x"（普通单词匹配 MOTD，以 * 结尾按前缀匹配），
+    也可以用 version / protocol / software / loader / mod / player / edition / country 参数过滤；
+    返回分页结果和 facets（版本、服务端、模组加载器、客户端版本、国家的计数）。
+    """
+    snapshot = store.snapshot()
+    args = request.args
+    filters = {field: args.get(field) for field in SEARCH_FIELDS if field != 'motd'}
+    etag = f"{snapshot.revision}-{zlib.crc32(request.query_string):08x}"
+    try:
+        return cached_response(etag, lambda: jsonify(snapshot.search(
+            args.get('q', ''), filters, sort=args.get('sort', 'players'), order=args.get('order', 'desc'),
+            cursor=args.get('cursor') or None, limit=args.get('limit', 50, type=int))))
+    except InvalidCursor as e:
+        return jsonify({"error": str(e)}), 409
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/api/stream')
+def stream():
+    """API端点：实时结果（Server-Sent Events）
+
+    连接后先发送一次 stats 事件，之后每当有新发现或更新的服务器时发送 changes 事件
+    （包含 added / updated 的服务器和最新的统计信息；结果文件重新加载时为 reset，需要重新获取数据）。
+    """
+    subscriber = broadcaster.subscribe()
+    snapshot = store.snapshot()
+    first = broadcaster.format("stats", {"revision": snapshot.revision, "stats": snapshot.stats}, snapshot.revision)
+
+    def generate():
+        try:
+            yield first
+            while True:
+                try:
+                    yield subscriber.get(timeout=STREAM_KEEPALIVE)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+        finally:
+            broadcaster.unsubscribe(subscriber)
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def start_request_profile():
+    """每个请求作为一个阶段统计耗时；处于 cProfile 窗口时同时对这个请求做 cProfile"""
+    rule = request.url_rule.rule if request.url_rule else "<404>"
+    g.profile_stage = profiler.stage(f"{request.method} {rule}")
+    g.profile_stage.__enter__()
+    g.profile_window = profiler.cprofile_window()
+    if g.profile_window is not None:
+        g.cprofile = cProfile.Profile()
+        g.cprofile.enable()
+
+def finish_request_profile(exc):
+    cprofile = g.pop('cprofile', None)
+    if cprofile is not None:
+        cprofile.disable()
+        profiler.add_profile(g.profile_window, cprofile)
+    stage = g.pop('profile_stage', None)
+    if stage is not None:
+        stage.__exit__(None, None, None)
+
+def enable_profiling(prefix, sampler=None, interval=10):
+    """开启性能分析：统计每个路由的耗时，退出时写入结果文件（见 profiling.Profiler）"""
+    profiler.enable(prefix, "web", sampler, interval)
+    app.before_request(start_request_profile)
+    app.teardown_request(finish_request_profile)
+    profiler.start()
+    atexit.register(profiler.stop)
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Minecraft服务器扫描结果的Web界面')
+    parser.add_argument('--host', default='0.0.0.0', help='监听地址')
+    parser.add_argument('--port', type=int, default=5000, help='监听端口')
+    parser.add_argument('--events-socket', default=DEFAULT_EVENTS_SOCKET,
+                        help=f'接收扫描器实时结果的 Unix 套接字（与 scan.py 的 --events-socket 相同，默认: {DEFAULT_EVENTS_SOCKET}）')
+    parser.add_argument('--no-events', action='store_true',
+                        help='不接收实时结果（只在结果文件变化时更新）')
+    parser.add_argument('--profile', nargs='?', const='web_profile', metavar='PREFIX',
+                        help='开启性能分析：记录每个路由和加载结果、渲染页面的耗时，退出时写入 PREFIX.json 和'
+                             '火焰图格式的 PREFIX.*.folded（默认前缀 web_profile；开启时关闭调试模式）')
+    parser.add_argument('--profile-sampler', choices=SAMPLERS,
+                        help='性能分析时额外采样：stack=调用栈采样，cprofile=定期对请求开启 cProfile，tracemalloc=定期记录内存分配快照')
+    parser.add_argument('--profile-interval', type=float, default=10,
+                        help='cProfile 窗口和内存快照的间隔，单位秒（每个 cProfile 窗口 1 秒）')
+    args = parser.parse_args()
+
     # 确保模板目录存在
     os.makedirs('templates', exist_ok=True)
-    app.run(host='0.0.0.0', port=5000, debug=True) 
\ No newline at end of file
+    if args.profile:
+        # 调试模式的自动重载会启动两个进程，统计的耗时也不准确
+        enable_profiling(args.profile, args.profile_sampler, args.profile_interval)
+    debug = not args.profile
+    # 调试模式下由重载器启动的子进程提供服务，只在子进程中接收实时结果
+    if not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        # 没有实时结果时也定期检查结果文件，浏览器可以收到结果文件的变化
+        listener = EventListener(None if args.no_events else args.events_socket, receive_events)
+        listener.start()
+        atexit.register(listener.close)
+    app.run(host=args.host, port=args.port, debug=debug, threaded=True) 
\ No newline at end of file
@@ -0,0 +1,224 @@
+import asyncio
+import multiprocessing
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, List, Tuple
+
+from mc_scanner import MinecraftServerScanner
+from profiling import profiler
+from telemetry import Histogram, Reporter
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+
+def worker_shard(shard: Tuple[int, int], index: int, workers: int) -> Tuple[int, int]:
+    """把分片 shard 再拆成 workers 份，返回第 index 个工作进程的分片"""
+    return shard[0] * workers + index, shard[1] * workers
+
+
+def worker_checkpoint_path(path: str, index: int) -> str:
+    """每个工作进程单独保存检查点：scan_checkpoint.json -> scan_checkpoint.3.json"""
+    base, ext = os.path.splitext(path)
+    return f"{base}.{index}{ext}"
+
+
+class ChannelSink:
+    """工作进程中的结果写入器：攒一批结果后发给父进程，由父进程统一写入文件"""
+
+    def __init__(self, index: int, channel, batch_size: int = 100):
+        self.index = index
+        self.channel = channel
+        self.batch_size = batch_size
+        self._buffer = []
+
+    def write(self, record: Dict):
+        self._buffer.append(record)
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            self.channel.put(("results", self.index, self._buffer))
+            self._buffer = []
+
+    def close(self):
+        self.flush()
+
+
+class WorkerScanner(MinecraftServerScanner):
+    """工作进程中的扫描器：不打印进度，而是把计数器定期发给父进程"""
+
+    def __init__(self, index: int, channel):
+        super().__init__()
+        self.index = index
+        self.channel = channel
+
+    def set_output(self, path: str):
+        self.output_file = path
+        self.sink = ChannelSink(self.index, self.channel)
+
+    def print_progress(self, total_ips: int = None):
+        self.sink.flush()
+        self.channel.put(("stats", self.index, self.worker_stats()))
+
+    def worker_stats(self) -> Dict:
+        return {
+            "scan_count": self.scan_count,
+            "open_count": self.open_count,
+            "found_count": self.found_count,
+            "total_targets": self.total_targets or 0,
+            "concurrency": self.engine.limit if self.engine else self.concurrency,
+            "counters": dict(self.telemetry.counters),
+            "histograms": {stage: (h.counts, h.sum) for stage, h in self.telemetry.histograms.items()},
+        }
+
+
+def _worker_main(index: int, args, channel, stop, configure: Callable, run: Callable):
+    """工作进程入口：在独立的事件循环（安装了 uvloop 时使用 uvloop）中扫描自己的分片"""
+    # 各工作进程的提示信息不输出，进度由父进程统一显示
+    sys.stdout = open(os.devnull, "w")
+    # Ctrl+C 由父进程处理，再通过 stop 通知工作进程停止，保证结果和检查点都能保存
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if uvloop is not None:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+
+    async def main():
+        scanner = WorkerScanner(index, channel)
+        try:
+            # 参数无效、结果文件打不开等配置错误同样报告给父进程
+            configure(scanner, args)
+            task = asyncio.ensure_future(run(scanner, args))
+            async with profiler.session():
+                while not task.done():
+                    if stop.is_set():
+                        task.cancel()
+                    await asyncio.wait({task}, timeout=0.2)
+                await task
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            channel.put(("error", index, str(e)))
+        finally:
+            if scanner.sink:
+                scanner.print_progress()
+            scanner.close_probes()
+            scanner.close_sink()
+
+    try:
+        asyncio.run(main())
+    finally:
+        channel.put(("done", index, None))
+
+
+class WorkerPool:
+    """多进程扫描：每个工作进程扫描一个分片，结果和计数器汇总到父进程的扫描器"""
+
+    def __init__(self, scanner: MinecraftServerScanner, workers: int):
+        self.scanner = scanner
+        self.workers = workers
+        self.stats = {}  # 工作进程编号 -> 最近一次上报的计数器
+        self.errors = []
+        self._context = multiprocessing.get_context("spawn")
+        self._channel = self._context.Queue()
+        self._stop = self._context.Event()
+        self._processes = []
+        self._done = set()
+        self._lock = threading.Lock()
+
+    def _handle(self, message):
+        kind, index, payload = message
+        if kind == "results":
+            for record in payload:
+                if self.scanner.sink:
+                    self.scanner.sink.write(record)
+                else:
+                    self.scanner.results.append(record)
+        elif kind == "stats":
+            self.stats[index] = payload
+            self._merge()
+        elif kind == "error":
+            self.errors.append(f"工作进程 {index}: {payload}")
+        elif kind == "done":
+            self._done.add(index)
+            self._merge()
+
+    def _merge(self):
+        """把各工作进程的计数器合并到父进程的扫描器，用于进度显示和统计导出"""
+        scanner = self.scanner
+        stats = list(self.stats.values())
+        scanner.scan_count = sum(s["scan_count"] for s in stats)
+        scanner.open_count = sum(s["open_count"] for s in stats)
+        scanner.found_count = sum(s["found_count"] for s in stats)
+        scanner.total_targets = sum(s["total_targets"] for s in stats) or None
+        counters = Counter()
+        histograms = {}
+        for s in stats:
+            counters.update(s["counters"])
+            for stage, (counts, total) in s["histograms"].items():
+                histogram = histograms.setdefault(stage, Histogram())
+                histogram.counts = [a + b for a, b in zip(histogram.counts, counts)]
+                histogram.sum += total
+        for histogram in histograms.values():
+            histogram.count = sum(histogram.counts)
+        scanner.telemetry.counters = counters
+        scanner.telemetry.histograms = histograms
+        scanner.telemetry.gauges["workers"] = len(self._processes) - len(self._done)
+        scanner.telemetry.gauges["worker_concurrency"] = sum(s["concurrency"] for s in stats)
+
+    def _drain(self, timeout: float) -> bool:
+        """处理一条工作进程发来的消息，超时返回 False"""
+        try:
+            message = self._channel.get(timeout=timeout)
+        except queue.Empty:
+            return False
+        # 被取消的等待仍可能在线程池里收到消息，和父进程收尾时的处理串行执行
+        with self._lock:
+            self._handle(message)
+        return True
+
+    def _alive(self) -> bool:
+        return any(i not in self._done and p.is_alive() for i, p in enumerate(self._processes))
+
+    async def run(self, args_list: List, configure: Callable, run: Callable):
+        """启动工作进程（每个进程使用 args_list 中对应的参数）并等待全部完成"""
+        scanner = self.scanner
+        scanner.start_time = time.time()
+        for index, args in enumerate(args_list):
+            process = self._context.Process(target=_worker_main, name=f"scan-worker-{index}",
+                                            args=(index, args, self._channel, self._stop, configure, run))
+            process.start()
+            self._processes.append(process)
+
+        reporter = Reporter(scanner.telemetry, scanner.print_progress, scanner.scan_stats,
+                            scanner.progress_interval, scanner.stats_file)
+        reporter_task = asyncio.ensure_future(reporter.run())
+        metrics_server = None
+        if scanner.metrics_port:
+            metrics_server = await scanner.telemetry.serve_metrics(port=scanner.metrics_port)
+        loop = asyncio.get_running_loop()
+        try:
+            while self._alive():
+                await loop.run_in_executor(None, self._drain, 0.2)
+        finally:
+            # 中断时通知工作进程停止（它们会保存检查点），然后收完剩余的结果
+            self._stop.set()
+            while self._alive():
+                self._drain(0.2)
+            while self._drain(0):
+                pass
+            for process in self._processes:
+                process.join()
+            reporter_task.cancel()
+            if metrics_server:
+                metrics_server.close()
+            reporter.tick()
+            for error in self.errors:
+                print(f"\n{error}")